@@ -0,0 +1,227 @@
+"""
+Kiểm tra 13 lớp đặc trưng có cùng lưới (CRS, transform, kích thước) hay không
+
+Chỉ đọc header của từng file (song song), báo cáo lệch lưới tới mức dưới 1 pixel.
+Tùy chọn tạo file VRT ảo căn chỉnh các lớp bị lệch về lưới tham chiếu,
+để lấy mẫu mà không phải ghi lại file TIFF.
+"""
+
+import os
+import numpy as np
+import pandas as pd
+import rasterio
+import rasterio.shutil
+from rasterio.crs import CRS
+from rasterio.vrt import WarpedVRT
+from rasterio.warp import transform as transform_coords
+from rasterio.enums import Resampling
+from concurrent.futures import ThreadPoolExecutor
+from collections import Counter
+
+from raster_io import FEATURE_NAMES, CATEGORICAL_FEATURES, find_feature_files
+
+# Sai lệch gốc tọa độ cho phép (phần pixel) và sai lệch độ phân giải tương đối
+OFFSET_TOLERANCE = 1e-3
+RES_TOLERANCE = 1e-6
+
+
+def read_header(file_path, layer=None):
+    """
+    Đọc thông tin lưới của file TIFF (không đọc dữ liệu pixel)
+
+    Returns:
+        dict: layer, file, crs, transform (6 hệ số), width, height, dtype, nodata, block, bounds
+    """
+    with rasterio.open(file_path) as ds:
+        return {
+            'layer': layer or os.path.splitext(os.path.basename(file_path))[0],
+            'file': file_path,
+            'crs': ds.crs.to_string() if ds.crs else None,
+            'transform': tuple(ds.transform)[:6],
+            'width': ds.width,
+            'height': ds.height,
+            'dtype': ds.dtypes[0],
+            'nodata': ds.nodata,
+            'block': tuple(ds.block_shapes[0]),
+            'bounds': tuple(ds.bounds),
+        }
+
+
+def grid_key(header):
+    """Khóa nhận diện lưới: (crs, transform, kích thước)"""
+    return (header['crs'], header['transform'], header['width'], header['height'])
+
+
+def compare_grid(header, reference):
+    """
+    So sánh lưới của một lớp với lưới tham chiếu
+
+    Returns:
+        dict: same_crs, res_ratio_x/y, offset_x_px/offset_y_px (vị trí gốc theo pixel tham chiếu),
+        subpixel_x/y (phần lẻ), same_shape, aligned, issues
+    """
+    a, _, c, _, e, f = header['transform']
+    ra, _, rc, _, re_, rf = reference['transform']
+    issues = []
+
+    same_crs = header['crs'] == reference['crs'] or (
+        header['crs'] is not None and reference['crs'] is not None
+        and CRS.from_user_input(header['crs']) == CRS.from_user_input(reference['crs']))
+    if not same_crs:
+        issues.append(f"CRS khác ({header['crs']})")
+        # Đưa gốc tọa độ về CRS tham chiếu để vẫn đo được độ lệch
+        xs, ys = transform_coords(header['crs'], reference['crs'], [c, c + a], [f, f + e])
+        c, f = xs[0], ys[0]
+        a, e = xs[1] - xs[0], ys[1] - ys[0]
+
+    res_ratio_x = a / ra
+    res_ratio_y = e / re_
+    if abs(res_ratio_x - 1) > RES_TOLERANCE or abs(res_ratio_y - 1) > RES_TOLERANCE:
+        issues.append(f"độ phân giải khác ({abs(a):.4f} x {abs(e):.4f})")
+
+    offset_x = (c - rc) / ra
+    offset_y = (f - rf) / re_
+    subpixel_x = offset_x - round(offset_x)
+    subpixel_y = offset_y - round(offset_y)
+    if abs(subpixel_x) > OFFSET_TOLERANCE or abs(subpixel_y) > OFFSET_TOLERANCE:
+        issues.append(f"lệch {subpixel_x:+.3f}, {subpixel_y:+.3f} pixel")
+    elif round(offset_x) != 0 or round(offset_y) != 0:
+        issues.append(f"gốc lệch {round(offset_x)}, {round(offset_y)} pixel")
+
+    same_shape = (header['width'], header['height']) == (reference['width'], reference['height'])
+    if not same_shape:
+        issues.append(f"kích thước khác ({header['height']} x {header['width']})")
+
+    return {
+        'same_crs': same_crs,
+        'res_ratio_x': res_ratio_x,
+        'res_ratio_y': res_ratio_y,
+        'offset_x_px': offset_x,
+        'offset_y_px': offset_y,
+        'subpixel_x': subpixel_x,
+        'subpixel_y': subpixel_y,
+        'same_shape': same_shape,
+        'aligned': not issues,
+        'issues': '; '.join(issues),
+    }
+
+
+def check_alignment(feature_dir, feature_names=FEATURE_NAMES, reference=None, max_workers=None):
+    """
+    Kiểm tra tất cả các lớp đặc trưng có cùng lưới hay không
+
+    Args:
+        feature_dir: Thư mục chứa các file đặc trưng
+        feature_names: Danh sách tên lớp
+        reference: Tên lớp làm lưới tham chiếu (None = lưới xuất hiện nhiều nhất)
+        max_workers: Số luồng đọc header
+
+    Returns:
+        (DataFrame báo cáo, header của lưới tham chiếu)
+    """
+    files = find_feature_files(feature_dir, feature_names)
+
+    print(f"{'='*60}")
+    print(f"KIỂM TRA LƯỚI CỦA {len(files)}/{len(feature_names)} LỚP ĐẶC TRƯNG")
+    print(f"{'='*60}")
+    for name in feature_names:
+        if name not in files:
+            print(f"⚠ Không tìm thấy file cho lớp: {name}")
+    if not files:
+        return None, None
+
+    # Chỉ đọc header nên dùng luồng (GDAL nhả GIL khi mở file)
+    with ThreadPoolExecutor(max_workers=max_workers or len(files)) as executor:
+        headers = list(executor.map(lambda item: read_header(item[1], item[0]), files.items()))
+
+    if reference is not None:
+        ref_header = next(h for h in headers if h['layer'] == reference)
+    else:
+        most_common = Counter(grid_key(h) for h in headers).most_common(1)[0][0]
+        ref_header = next(h for h in headers if grid_key(h) == most_common)
+
+    print(f"Lưới tham chiếu: {ref_header['layer']} ({ref_header['crs']}, "
+          f"{ref_header['height']} x {ref_header['width']}, pixel {ref_header['transform'][0]:g})")
+
+    rows = []
+    for header in headers:
+        row = {k: header[k] for k in ('layer', 'file', 'crs', 'width', 'height', 'dtype', 'nodata', 'block')}
+        row.update(compare_grid(header, ref_header))
+        rows.append(row)
+    df = pd.DataFrame(rows)
+
+    for _, row in df.iterrows():
+        if row['aligned']:
+            print(f"✓ {row['layer']:<16} khớp lưới")
+        else:
+            print(f"✗ {row['layer']:<16} {row['issues']}")
+
+    n_bad = int((~df['aligned']).sum())
+    print(f"\n{len(df) - n_bad}/{len(df)} lớp khớp lưới tham chiếu")
+    return df, ref_header
+
+
+def open_aligned(file_path, reference, resampling=Resampling.bilinear):
+    """
+    Mở file TIFF dưới dạng WarpedVRT đã căn về lưới tham chiếu (không ghi file)
+
+    Args:
+        file_path: Đường dẫn file TIFF
+        reference: Header lưới tham chiếu (kết quả read_header)
+        resampling: Phương pháp lấy mẫu lại
+
+    Returns:
+        (dataset gốc, WarpedVRT) - cần đóng cả hai sau khi dùng
+    """
+    src = rasterio.open(file_path)
+    vrt = WarpedVRT(src, crs=reference['crs'], transform=rasterio.Affine(*reference['transform']),
+                    width=reference['width'], height=reference['height'],
+                    resampling=resampling, src_nodata=src.nodata, nodata=src.nodata)
+    return src, vrt
+
+
+def build_aligned_vrts(report, reference, output_dir):
+    """
+    Tạo file .vrt căn chỉnh cho các lớp bị lệch lưới
+
+    Lớp đã khớp lưới giữ nguyên file gốc. Lớp phân loại (lulc, flowDir) dùng nearest,
+    các lớp liên tục dùng bilinear.
+
+    Args:
+        report: DataFrame kết quả check_alignment
+        reference: Header lưới tham chiếu
+        output_dir: Thư mục lưu các file .vrt
+
+    Returns:
+        dict {tên lớp: đường dẫn file dùng để lấy mẫu (.tif gốc hoặc .vrt)}
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    paths = {}
+    for _, row in report.iterrows():
+        if row['aligned']:
+            paths[row['layer']] = row['file']
+            continue
+        resampling = Resampling.nearest if row['layer'] in CATEGORICAL_FEATURES else Resampling.bilinear
+        out_path = os.path.join(output_dir, f"{row['layer']}_aligned.vrt")
+        src, vrt = open_aligned(row['file'], reference, resampling)
+        try:
+            rasterio.shutil.copy(vrt, out_path, driver='VRT')
+        finally:
+            vrt.close()
+            src.close()
+        paths[row['layer']] = out_path
+        print(f"✓ Đã tạo VRT căn chỉnh: {out_path}")
+    return paths
+
+
+if __name__ == "__main__":
+    # Thư mục chứa 13 lớp đặc trưng
+    feature_dir = r"D:\prj\feature"
+
+    report, reference = check_alignment(feature_dir)
+    if report is not None:
+        report.to_csv(r"D:\prj\feature\alignment_report.csv", index=False)
+
+        # Tạo VRT ảo cho các lớp lệch lưới
+        if not report['aligned'].all():
+            build_aligned_vrts(report, reference, r"D:\prj\feature\aligned_vrt")
@@ -0,0 +1,207 @@
+"""
+Phân tích song song toàn bộ 13 lớp đặc trưng (feature stack)
+Mỗi file được xử lý bởi một process riêng, đọc theo khối (block streaming)
+Kết quả là một bảng so sánh ghi ra CSV và JSON
+"""
+
+import os
+import json
+import time
+import numpy as np
+import pandas as pd
+import rasterio
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from raster_io import FEATURE_NAMES, find_feature_files, valid_mask, iter_windows, hist_percentiles
+
+PERCENTILES = [1, 5, 10, 25, 50, 75, 90, 95, 99]
+
+
+def profile_tiff(file_path, layer=None, n_bins=4096):
+    """
+    Tính thống kê của band đầu tiên trong file TIFF, đọc theo khối
+
+    Lượt 1 tính số pixel hợp lệ, min, max, mean, std (tổng có dịch gốc để tránh sai số).
+    Lượt 2 tính các moment trung tâm, histogram cho phân vị và số giá trị ngoại lai.
+
+    Args:
+        file_path: Đường dẫn file TIFF
+        layer: Tên lớp đặc trưng (để ghi vào bảng kết quả)
+        n_bins: Số bin của histogram dùng để tính phân vị
+
+    Returns:
+        dict chứa các thống kê của file
+    """
+    start = time.perf_counter()
+
+    with rasterio.open(file_path) as ds:
+        nodata = ds.nodata
+        total = ds.width * ds.height
+        result = {
+            'layer': layer or os.path.splitext(os.path.basename(file_path))[0],
+            'file': os.path.basename(file_path),
+            'dtype': ds.dtypes[0],
+            'nodata': nodata,
+            'width': ds.width,
+            'height': ds.height,
+            'total_pixels': total,
+        }
+
+        # ===== LƯỢT 1: ĐẾM, MIN/MAX, MEAN/STD =====
+        count = 0
+        nan_count = 0
+        shift = None
+        s1 = 0.0
+        s2 = 0.0
+        vmin = np.inf
+        vmax = -np.inf
+        for window in iter_windows(ds):
+            data = ds.read(1, window=window)
+            if np.issubdtype(data.dtype, np.floating):
+                nan_count += int(np.isnan(data).sum())
+            values = data[valid_mask(data, nodata)].astype(np.float64)
+            if values.size == 0:
+                continue
+            if shift is None:
+                shift = float(values[0])
+            d = values - shift
+            count += values.size
+            s1 += d.sum()
+            s2 += np.dot(d, d)
+            vmin = min(vmin, values.min())
+            vmax = max(vmax, values.max())
+
+        result['valid_pixels'] = count
+        result['valid_pct'] = count / total * 100 if total else 0.0
+        result['nan_pixels'] = nan_count
+        result['nodata_pixels'] = total - count - nan_count
+
+        if count == 0:
+            result['seconds'] = time.perf_counter() - start
+            return result
+
+        mean = shift + s1 / count
+        std = np.sqrt(max(s2 / count - (s1 / count) ** 2, 0.0))
+
+        # ===== LƯỢT 2: MOMENT TRUNG TÂM, HISTOGRAM, NGOẠI LAI =====
+        m3 = 0.0
+        m4 = 0.0
+        outliers_3sigma = 0
+        hist = np.zeros(n_bins, dtype=np.int64)
+        hist_range = (vmin, vmax) if vmax > vmin else (vmin - 0.5, vmax + 0.5)
+        for window in iter_windows(ds):
+            data = ds.read(1, window=window)
+            values = data[valid_mask(data, nodata)].astype(np.float64)
+            if values.size == 0:
+                continue
+            d = values - mean
+            d2 = d * d
+            m3 += np.dot(d2, d)
+            m4 += np.dot(d2, d2)
+            if std > 0:
+                outliers_3sigma += int(np.count_nonzero(np.abs(d) > 3 * std))
+            hist += np.histogram(values, bins=n_bins, range=hist_range)[0]
+
+    edges = np.linspace(hist_range[0], hist_range[1], n_bins + 1)
+    pct_values = hist_percentiles(hist, edges, PERCENTILES)
+
+    # Ngoại lai theo IQR (xấp xỉ theo bin histogram)
+    p25 = pct_values[PERCENTILES.index(25)]
+    p75 = pct_values[PERCENTILES.index(75)]
+    iqr = p75 - p25
+    centers = (edges[:-1] + edges[1:]) / 2
+    outside_iqr = (centers < p25 - 1.5 * iqr) | (centers > p75 + 1.5 * iqr)
+    outliers_iqr = int(hist[outside_iqr].sum())
+
+    result.update({
+        'min': float(vmin),
+        'max': float(vmax),
+        'mean': float(mean),
+        'std': float(std),
+        'skewness': float(m3 / count / std ** 3) if std > 0 else 0.0,
+        'kurtosis': float(m4 / count / std ** 4 - 3) if std > 0 else 0.0,
+    })
+    for p, v in zip(PERCENTILES, pct_values):
+        result[f'p{p}'] = float(v)
+    result.update({
+        'outliers_3sigma': outliers_3sigma,
+        'outliers_3sigma_pct': outliers_3sigma / count * 100,
+        'outliers_iqr': outliers_iqr,
+        'outliers_iqr_pct': outliers_iqr / count * 100,
+        'seconds': time.perf_counter() - start,
+    })
+    return result
+
+
+def profile_feature_stack(feature_dir, output_csv, output_json, feature_names=FEATURE_NAMES, max_workers=None):
+    """
+    Phân tích đồng thời tất cả các lớp đặc trưng, mỗi file một process
+
+    Args:
+        feature_dir: Thư mục chứa các file đặc trưng
+        output_csv: Đường dẫn file CSV kết quả
+        output_json: Đường dẫn file JSON kết quả
+        feature_names: Danh sách tên lớp cần phân tích
+        max_workers: Số process tối đa (mặc định = số lớp, giới hạn bởi số CPU)
+
+    Returns:
+        pandas.DataFrame bảng so sánh các lớp
+    """
+    files = find_feature_files(feature_dir, feature_names)
+    missing = [name for name in feature_names if name not in files]
+
+    print(f"{'='*60}")
+    print(f"PHÂN TÍCH {len(files)}/{len(feature_names)} LỚP ĐẶC TRƯNG")
+    print(f"{'='*60}")
+    for name in missing:
+        print(f"⚠ Không tìm thấy file cho lớp: {name}")
+
+    if not files:
+        print("Không có file nào để phân tích!")
+        return None
+
+    if max_workers is None:
+        max_workers = min(len(files), os.cpu_count() or 1)
+
+    start = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(profile_tiff, path, name): name for name, path in files.items()}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                result = future.result()
+                results.append(result)
+                print(f"✓ {name:<16} {result['valid_pct']:6.2f}% hợp lệ  ({result['seconds']:.1f}s)")
+            except Exception as e:
+                print(f"✗ Lỗi khi phân tích {name}: {e}")
+
+    # Sắp xếp theo thứ tự featureNames
+    order = {name: i for i, name in enumerate(feature_names)}
+    results.sort(key=lambda r: order.get(r['layer'], len(order)))
+
+    df = pd.DataFrame(results)
+    df.to_csv(output_csv, index=False)
+    with open(output_json, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2, default=float)
+
+    print(f"\n{'='*60}")
+    print("BẢNG SO SÁNH")
+    print(f"{'='*60}")
+    columns = [c for c in ['layer', 'dtype', 'nodata', 'valid_pct', 'min', 'max', 'mean', 'std'] if c in df.columns]
+    print(df[columns].to_string(index=False))
+    print(f"\nThời gian: {time.perf_counter() - start:.1f}s với {max_workers} process")
+    print(f"Đã lưu: {output_csv}")
+    print(f"Đã lưu: {output_json}")
+    return df
+
+
+if __name__ == "__main__":
+    # Thư mục chứa 13 lớp đặc trưng
+    feature_dir = r"D:\prj\feature"
+
+    # File kết quả
+    output_csv = r"D:\prj\feature\profile_features.csv"
+    output_json = r"D:\prj\feature\profile_features.json"
+
+    profile_feature_stack(feature_dir, output_csv, output_json)
@@ -0,0 +1,274 @@
+"""
+Bản đồ nền (basemap) offline với bộ nhớ đệm tile trên đĩa
+
+Nguồn tile có thể là:
+  - URL dạng XYZ (vd: OpenStreetMap), tile tải về được lưu vào thư mục cache
+  - Thư mục tile XYZ có sẵn trên máy: {thư mục}/{z}/{x}/{y}.png
+  - File MBTiles (.mbtiles)
+
+Mỗi (nguồn, extent, CRS, zoom) chỉ ghép mosaic một lần, sau đó dùng lại
+cho tất cả các bản đồ trong một lượt vẽ (cache trong bộ nhớ và file .npz).
+"""
+
+import os
+import io
+import math
+import sqlite3
+import hashlib
+import urllib.request
+import numpy as np
+from PIL import Image
+from concurrent.futures import ThreadPoolExecutor
+from pyproj import Transformer
+from rasterio.transform import from_bounds
+from rasterio.warp import reproject
+from rasterio.enums import Resampling
+
+# ===== CẤU HÌNH MẶC ĐỊNH =====
+OSM_URL = "https://tile.openstreetmap.org/{z}/{x}/{y}.png"
+DEFAULT_CACHE_DIR = r"D:\prj\tile_cache"
+USER_AGENT = "GEE-flood-maps/1.0 (tile cache)"
+
+TILE_SIZE = 256
+WEB_MERCATOR_ORIGIN = 20037508.342789244
+MAX_ZOOM = 18
+
+_MOSAIC_CACHE = {}
+_MBTILES_CONNECTIONS = {}
+
+
+def _source_key(source):
+    """Tên thư mục cache cho một nguồn tile"""
+    if source.startswith('http'):
+        return hashlib.sha1(source.encode('utf-8')).hexdigest()[:12]
+    return os.path.splitext(os.path.basename(os.path.normpath(source)))[0]
+
+
+def _to_wgs84(extent, crs):
+    """Chuyển extent [left, right, bottom, top] sang kinh/vĩ độ"""
+    crs_str = crs if isinstance(crs, str) else crs.to_string()
+    if crs_str == 'EPSG:4326':
+        return extent
+    transformer = Transformer.from_crs(crs_str, 'EPSG:4326', always_xy=True)
+    xs, ys = transformer.transform([extent[0], extent[1], extent[0], extent[1]],
+                                   [extent[2], extent[2], extent[3], extent[3]])
+    return [min(xs), max(xs), min(ys), max(ys)]
+
+
+def lonlat_to_tile(lon, lat, zoom):
+    """Chỉ số tile XYZ chứa điểm (lon, lat)"""
+    n = 2 ** zoom
+    lat = max(min(lat, 85.0511), -85.0511)
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tile_range(extent, crs, zoom):
+    """Dải tile (x0, x1, y0, y1) phủ extent ở mức zoom"""
+    lon_min, lon_max, lat_min, lat_max = _to_wgs84(extent, crs)
+    x0, y0 = lonlat_to_tile(lon_min, lat_max, zoom)
+    x1, y1 = lonlat_to_tile(lon_max, lat_min, zoom)
+    return x0, x1, y0, y1
+
+
+def auto_zoom(extent, crs, target_width=2048):
+    """Chọn mức zoom để mosaic rộng khoảng target_width pixel"""
+    lon_min, lon_max, _, _ = _to_wgs84(extent, crs)
+    span = max(lon_max - lon_min, 1e-9)
+    zoom = int(math.floor(math.log2(target_width / TILE_SIZE * 360.0 / span)))
+    return max(0, min(zoom, MAX_ZOOM))
+
+
+def _read_mbtiles(path, z, x, y):
+    """Đọc một tile từ file MBTiles (hàng theo quy ước TMS)"""
+    conn = _MBTILES_CONNECTIONS.get(path)
+    if conn is None:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        _MBTILES_CONNECTIONS[path] = conn
+    row = conn.execute(
+        "SELECT tile_data FROM tiles WHERE zoom_level=? AND tile_column=? AND tile_row=?",
+        (z, x, 2 ** z - 1 - y)
+    ).fetchone()
+    return row[0] if row else None
+
+
+def read_tile(source, z, x, y, cache_dir=DEFAULT_CACHE_DIR, offline=False):
+    """
+    Đọc nội dung (bytes) của một tile
+
+    Args:
+        source: URL XYZ, thư mục tile XYZ hoặc file .mbtiles
+        z, x, y: Chỉ số tile
+        cache_dir: Thư mục cache cho tile tải từ mạng
+        offline: True = chỉ đọc từ cache, không tải
+
+    Returns:
+        bytes của ảnh tile, hoặc None nếu không có
+    """
+    if source.endswith('.mbtiles'):
+        return _read_mbtiles(source, z, x, y)
+
+    if os.path.isdir(source):
+        for ext in ('png', 'jpg', 'jpeg', 'webp'):
+            path = os.path.join(source, str(z), str(x), f"{y}.{ext}")
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    return f.read()
+        return None
+
+    cache_path = os.path.join(cache_dir, _source_key(source), str(z), str(x), f"{y}.png")
+    if os.path.exists(cache_path):
+        with open(cache_path, 'rb') as f:
+            return f.read()
+    if offline:
+        return None
+
+    request = urllib.request.Request(source.format(z=z, x=x, y=y), headers={'User-Agent': USER_AGENT})
+    with urllib.request.urlopen(request, timeout=30) as response:
+        content = response.read()
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    with open(cache_path, 'wb') as f:
+        f.write(content)
+    return content
+
+
+def prefetch_tiles(extent, crs, zooms, source=OSM_URL, cache_dir=DEFAULT_CACHE_DIR, max_workers=4):
+    """
+    Tải trước toàn bộ tile phủ extent vào cache (chạy trên máy có mạng)
+
+    Args:
+        extent: [left, right, bottom, top] theo crs
+        crs: Hệ tọa độ của extent
+        zooms: Danh sách mức zoom cần tải
+        source: URL XYZ của nguồn tile
+        cache_dir: Thư mục cache
+        max_workers: Số luồng tải song song
+
+    Returns:
+        (số tile đã có/tải được, số tile lỗi)
+    """
+    tiles = []
+    for z in zooms:
+        x0, x1, y0, y1 = tile_range(extent, crs, z)
+        tiles.extend((z, x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1))
+
+    print(f"Tải trước {len(tiles)} tile vào: {cache_dir}")
+
+    def fetch(tile):
+        try:
+            return read_tile(source, *tile, cache_dir=cache_dir) is not None
+        except Exception as e:
+            print(f"  ✗ Lỗi tile {tile}: {e}")
+            return False
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(fetch, tiles))
+
+    ok = sum(results)
+    print(f"✓ Có {ok}/{len(tiles)} tile trong cache")
+    return ok, len(tiles) - ok
+
+
+def _mosaic_key(source, extent, crs, zoom):
+    crs_str = crs if isinstance(crs, str) else crs.to_string()
+    text = f"{source}|{crs_str}|{zoom}|" + ",".join(f"{v:.3f}" for v in extent)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+
+def get_basemap(extent, crs, zoom=None, source=OSM_URL, cache_dir=DEFAULT_CACHE_DIR, offline=False):
+    """
+    Trả về ảnh nền RGB đã chiếu về crs của bản đồ, dùng lại nếu đã ghép trước đó
+
+    Args:
+        extent: [left, right, bottom, top] theo crs (extent_original trong tao_ban_do)
+        crs: Hệ tọa độ của bản đồ
+        zoom: Mức zoom, None = tự chọn theo extent
+        source: URL XYZ, thư mục tile XYZ hoặc file .mbtiles
+        cache_dir: Thư mục cache tile và mosaic
+        offline: True = không tải tile từ mạng
+
+    Returns:
+        (ảnh uint8 HxWx3, extent [left, right, bottom, top]) dùng trực tiếp cho imshow
+    """
+    if zoom is None:
+        zoom = auto_zoom(extent, crs)
+
+    key = _mosaic_key(source, extent, crs, zoom)
+    if key in _MOSAIC_CACHE:
+        return _MOSAIC_CACHE[key]
+
+    mosaic_path = os.path.join(cache_dir, 'mosaics', f"{key}.npz")
+    if os.path.exists(mosaic_path):
+        with np.load(mosaic_path) as npz:
+            result = (npz['image'], list(npz['extent']))
+        _MOSAIC_CACHE[key] = result
+        return result
+
+    # ===== GHÉP CÁC TILE THÀNH MOSAIC (WEB MERCATOR) =====
+    x0, x1, y0, y1 = tile_range(extent, crs, zoom)
+    nx, ny = x1 - x0 + 1, y1 - y0 + 1
+    mosaic = np.full((3, ny * TILE_SIZE, nx * TILE_SIZE), 255, dtype=np.uint8)
+    missing = 0
+    for x in range(x0, x1 + 1):
+        for y in range(y0, y1 + 1):
+            try:
+                content = read_tile(source, zoom, x, y, cache_dir=cache_dir, offline=offline)
+            except Exception:
+                content = None
+            if content is None:
+                missing += 1
+                continue
+            tile = np.asarray(Image.open(io.BytesIO(content)).convert('RGB').resize((TILE_SIZE, TILE_SIZE)))
+            r, c = (y - y0) * TILE_SIZE, (x - x0) * TILE_SIZE
+            mosaic[:, r:r + TILE_SIZE, c:c + TILE_SIZE] = tile.transpose(2, 0, 1)
+
+    if missing:
+        print(f"⚠ Thiếu {missing}/{nx * ny} tile (zoom {zoom}) - hãy chạy prefetch_tiles khi có mạng")
+
+    tile_m = 2 * WEB_MERCATOR_ORIGIN / 2 ** zoom
+    src_transform = from_bounds(
+        -WEB_MERCATOR_ORIGIN + x0 * tile_m, WEB_MERCATOR_ORIGIN - (y1 + 1) * tile_m,
+        -WEB_MERCATOR_ORIGIN + (x1 + 1) * tile_m, WEB_MERCATOR_ORIGIN - y0 * tile_m,
+        mosaic.shape[2], mosaic.shape[1]
+    )
+
+    # ===== CHIẾU MOSAIC VỀ CRS CỦA BẢN ĐỒ =====
+    crs_str = crs if isinstance(crs, str) else crs.to_string()
+    width = min(mosaic.shape[2], 4096)
+    height = max(1, int(round(width * (extent[3] - extent[2]) / (extent[1] - extent[0]))))
+    dst_transform = from_bounds(extent[0], extent[2], extent[1], extent[3], width, height)
+    image = np.full((3, height, width), 255, dtype=np.uint8)
+    reproject(mosaic, image, src_transform=src_transform, src_crs='EPSG:3857',
+              dst_transform=dst_transform, dst_crs=crs_str, resampling=Resampling.bilinear,
+              init_dest_nodata=False)
+
+    result = (image.transpose(1, 2, 0).copy(), list(extent))
+    # Chỉ lưu mosaic đầy đủ, mosaic thiếu tile sẽ được ghép lại ở lần sau
+    if missing == 0:
+        os.makedirs(os.path.dirname(mosaic_path), exist_ok=True)
+        np.savez(mosaic_path, image=result[0], extent=np.array(extent, dtype=np.float64))
+        _MOSAIC_CACHE[key] = result
+    return result
+
+
+if __name__ == "__main__":
+    # Chạy trên máy có mạng để tải trước tile cho vùng nghiên cứu,
+    # sau đó chép thư mục cache sang máy vẽ bản đồ
+    import rasterio
+
+    reference_tiff = r"D:\prj\results\map\threshold\rf\flood_susceptibility_pso_RF.tif"
+    cache_dir = DEFAULT_CACHE_DIR
+
+    with rasterio.open(reference_tiff) as ds:
+        bounds = ds.bounds
+        extent = [bounds.left, bounds.right, bounds.bottom, bounds.top]
+        crs = ds.crs.to_string()
+
+    zoom = auto_zoom(extent, crs)
+    print("="*60)
+    print("TẢI TRƯỚC TILE BẢN ĐỒ NỀN")
+    print("="*60)
+    print(f"File tham chiếu: {reference_tiff}")
+    print(f"Zoom: {zoom}")
+    prefetch_tiles(extent, crs, [zoom], source=OSM_URL, cache_dir=cache_dir)
@@ -0,0 +1,250 @@
+"""
+So sánh hai ảnh TIFF theo khối để kiểm tra hồi quy
+(vd: kết quả fill_tiff_nulls, phan_nguong, các bộ lọc trước và sau khi sửa code)
+
+Báo cáo sai khác tuyệt đối lớn nhất/trung bình, số pixel thay đổi, thay đổi vùng NoData,
+bảng nhầm lẫn theo lớp cho ảnh phân loại. Có thể ghi ảnh sai khác và so sánh
+cả hai cây thư mục song song.
+"""
+
+import os
+import time
+import numpy as np
+import pandas as pd
+import rasterio
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from raster_io import valid_mask, iter_windows
+
+# Số lớp tối đa để lập bảng nhầm lẫn (ảnh số nguyên có nhiều giá trị hơn coi là liên tục)
+MAX_CLASSES = 256
+
+
+def _is_categorical(dtype):
+    return np.issubdtype(np.dtype(dtype), np.integer)
+
+
+def compare_rasters(file_a, file_b, diff_tif=None, categorical=None, atol=0.0):
+    """
+    So sánh band đầu tiên của hai file TIFF, đọc theo khối
+
+    Args:
+        file_a: File gốc (kết quả cũ)
+        file_b: File cần so sánh (kết quả mới)
+        diff_tif: Đường dẫn ảnh sai khác b - a (float32, NaN nếu một trong hai là NoData)
+        categorical: True/False, None = tự nhận theo kiểu dữ liệu (số nguyên = phân loại)
+        atol: Ngưỡng sai khác tuyệt đối để coi là pixel thay đổi
+
+    Returns:
+        dict kết quả; với ảnh phân loại có thêm 'confusion' (DataFrame hàng = a, cột = b)
+    """
+    start = time.perf_counter()
+    result = {'file_a': file_a, 'file_b': file_b}
+
+    with rasterio.open(file_a) as src_a, rasterio.open(file_b) as src_b:
+        if (src_a.height, src_a.width) != (src_b.height, src_b.width):
+            result['error'] = f"kích thước khác: {src_a.shape} vs {src_b.shape}"
+            return result
+        if src_a.crs != src_b.crs or not src_a.transform.almost_equals(src_b.transform):
+            result['warning'] = "CRS/transform khác nhau, so sánh theo vị trí pixel"
+
+        if categorical is None:
+            categorical = _is_categorical(src_a.dtypes[0]) and _is_categorical(src_b.dtypes[0])
+
+        dst = None
+        if diff_tif:
+            profile = src_a.profile.copy()
+            profile.update(dtype='float32', nodata=np.nan, count=1, compress='lzw',
+                           tiled=True, blockxsize=256, blockysize=256)
+            profile.pop('photometric', None)
+            dst = rasterio.open(diff_tif, 'w', **profile)
+
+        max_abs = 0.0
+        sum_abs = 0.0
+        changed = 0
+        pattern = np.zeros(4, dtype=np.int64)  # cả hai hợp lệ, chỉ a, chỉ b, cả hai NoData
+        confusion = {'counts': {}, 'lo': None, 'hi': None, 'skipped': False}
+        try:
+            for window in iter_windows(src_a):
+                a = src_a.read(1, window=window)
+                b = src_b.read(1, window=window)
+                va = valid_mask(a, src_a.nodata)
+                vb = valid_mask(b, src_b.nodata)
+                both = va & vb
+                pattern[0] += np.count_nonzero(both)
+                pattern[1] += np.count_nonzero(va & ~vb)
+                pattern[2] += np.count_nonzero(~va & vb)
+                pattern[3] += np.count_nonzero(~va & ~vb)
+
+                diff = b.astype(np.float64) - a.astype(np.float64)
+                abs_diff = np.abs(diff[both])
+                if abs_diff.size:
+                    max_abs = max(max_abs, float(abs_diff.max()))
+                    sum_abs += float(abs_diff.sum())
+                    changed += int(np.count_nonzero(abs_diff > atol))
+
+                if categorical:
+                    _update_confusion(confusion, a[both], b[both])
+
+                if dst is not None:
+                    out = np.where(both, diff, np.nan).astype(np.float32)
+                    dst.write(out, 1, window=window)
+        finally:
+            if dst is not None:
+                dst.close()
+
+    n_both = int(pattern[0])
+    result.update({
+        'categorical': categorical,
+        'valid_both': n_both,
+        'valid_a_only': int(pattern[1]),
+        'valid_b_only': int(pattern[2]),
+        'nodata_both': int(pattern[3]),
+        'nodata_changed': int(pattern[1] + pattern[2]),
+        'max_abs_diff': max_abs,
+        'mean_abs_diff': sum_abs / n_both if n_both else 0.0,
+        'changed_pixels': changed,
+        'changed_pct': changed / n_both * 100 if n_both else 0.0,
+        'identical': changed == 0 and pattern[1] == 0 and pattern[2] == 0,
+    })
+    if categorical:
+        # Bảng chỉ có khi mọi khối đều được đếm
+        result['confusion_skipped'] = confusion['skipped']
+        if not confusion['skipped'] and confusion['counts']:
+            counts = confusion['counts']
+            classes = sorted({c for pair in counts for c in pair})
+            table = pd.DataFrame(0, index=pd.Index(classes, name='a'), columns=pd.Index(classes, name='b'))
+            for (ca, cb), n in counts.items():
+                table.loc[ca, cb] = n
+            result['confusion'] = table
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def _update_confusion(confusion, a, b):
+    """
+    Cộng dồn số cặp (lớp a, lớp b) bằng bincount trên mã cặp
+
+    Khoảng giá trị lớp được theo dõi trên toàn ảnh: khi vượt MAX_CLASSES thì bỏ toàn bộ
+    bảng (skipped = True) thay vì chỉ bỏ qua khối đó, để bảng luôn đầy đủ hoặc không có.
+    """
+    if confusion['skipped'] or a.size == 0:
+        return
+    a = a.astype(np.int64)
+    b = b.astype(np.int64)
+    lo = min(a.min(), b.min())
+    hi = max(a.max(), b.max())
+    if confusion['lo'] is not None:
+        lo, hi = min(lo, confusion['lo']), max(hi, confusion['hi'])
+    if hi - lo + 1 > MAX_CLASSES:
+        confusion.update(skipped=True, counts={})
+        return
+    confusion['lo'], confusion['hi'] = lo, hi
+    n = int(hi - lo + 1)
+    counts = np.bincount((a - lo) * n + (b - lo), minlength=n * n)
+    for code in np.flatnonzero(counts):
+        key = (int(code // n + lo), int(code % n + lo))
+        confusion['counts'][key] = confusion['counts'].get(key, 0) + int(counts[code])
+
+
+def print_result(result):
+    """In kết quả so sánh một cặp file"""
+    name = os.path.basename(result['file_a'])
+    if 'error' in result:
+        print(f"✗ {name}: {result['error']}")
+        return
+    status = "✓ giống nhau" if result['identical'] else "✗ khác nhau"
+    print(f"{status}: {name}")
+    if 'warning' in result:
+        print(f"  ⚠ {result['warning']}")
+    print(f"  Sai khác lớn nhất: {result['max_abs_diff']:.6g}, trung bình: {result['mean_abs_diff']:.6g}")
+    print(f"  Pixel thay đổi: {result['changed_pixels']:,} ({result['changed_pct']:.4f}%)")
+    print(f"  NoData thay đổi: {result['valid_a_only']:,} mất dữ liệu, {result['valid_b_only']:,} có thêm dữ liệu")
+    if result.get('confusion_skipped'):
+        print(f"  ⚠ Không lập bảng nhầm lẫn (khoảng giá trị lớp vượt {MAX_CLASSES})")
+    if 'confusion' in result and not result['identical']:
+        print("  Bảng nhầm lẫn (hàng = cũ, cột = mới):")
+        print('  ' + result['confusion'].to_string().replace('\n', '\n  '))
+
+
+def _find_tiffs_recursive(folder):
+    """Danh sách đường dẫn tương đối của tất cả file TIFF trong cây thư mục"""
+    files = []
+    for root, _, names in os.walk(folder):
+        for name in names:
+            if name.endswith('.tif') or name.endswith('.tiff'):
+                files.append(os.path.relpath(os.path.join(root, name), folder))
+    return sorted(files)
+
+
+def compare_folders(folder_a, folder_b, output_csv=None, diff_dir=None, max_workers=None, **kwargs):
+    """
+    So sánh tất cả file TIFF cùng đường dẫn tương đối trong hai cây thư mục, song song
+
+    Args:
+        folder_a: Thư mục kết quả cũ
+        folder_b: Thư mục kết quả mới
+        output_csv: File CSV tổng hợp (None = không ghi)
+        diff_dir: Thư mục lưu ảnh sai khác (giữ cấu trúc thư mục), None = không ghi
+        max_workers: Số process
+        **kwargs: Tham số truyền cho compare_rasters (categorical, atol)
+
+    Returns:
+        DataFrame tổng hợp
+    """
+    files_a = set(_find_tiffs_recursive(folder_a))
+    files_b = set(_find_tiffs_recursive(folder_b))
+    common = sorted(files_a & files_b)
+
+    print(f"{'='*60}")
+    print(f"SO SÁNH {len(common)} FILE")
+    print(f"{'='*60}")
+    for rel in sorted(files_a - files_b):
+        print(f"⚠ Chỉ có trong {folder_a}: {rel}")
+    for rel in sorted(files_b - files_a):
+        print(f"⚠ Chỉ có trong {folder_b}: {rel}")
+
+    start = time.perf_counter()
+    rows = []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        for rel in common:
+            diff_tif = None
+            if diff_dir:
+                diff_tif = os.path.join(diff_dir, os.path.splitext(rel)[0] + '_diff.tif')
+                os.makedirs(os.path.dirname(diff_tif), exist_ok=True)
+            future = executor.submit(compare_rasters, os.path.join(folder_a, rel),
+                                     os.path.join(folder_b, rel), diff_tif, **kwargs)
+            futures[future] = rel
+        for future in as_completed(futures):
+            rel = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {'file_a': os.path.join(folder_a, rel), 'error': str(e)}
+            print_result(result)
+            row = {k: v for k, v in result.items() if k != 'confusion'}
+            row['file'] = rel
+            rows.append(row)
+
+    df = pd.DataFrame(rows).sort_values('file').reset_index(drop=True)
+    if output_csv:
+        df.to_csv(output_csv, index=False)
+        print(f"\nĐã lưu: {output_csv}")
+
+    n_same = int(df['identical'].fillna(False).astype(bool).sum()) if 'identical' in df else 0
+    print(f"\n{n_same}/{len(common)} file giống nhau ({time.perf_counter() - start:.1f}s)")
+    return df
+
+
+if __name__ == "__main__":
+    # So sánh một cặp file
+    # print_result(compare_rasters(r"D:\prj\results\map\rf\flood_susceptibility_pso_RF.tif",
+    #                              r"D:\prj\results_new\map\rf\flood_susceptibility_pso_RF.tif"))
+
+    # So sánh cả cây thư mục kết quả cũ và mới
+    folder_old = r"D:\prj\results\map"
+    folder_new = r"D:\prj\results_new\map"
+    compare_folders(folder_old, folder_new,
+                    output_csv=r"D:\prj\results_new\compare_report.csv",
+                    diff_dir=r"D:\prj\results_new\diff")
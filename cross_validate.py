@@ -0,0 +1,194 @@
+"""
+Kiểm định chéo cục bộ (k-fold ngẫu nhiên và theo khối không gian) cho RF, XGB, SVM
+
+Các script .js chỉ chia 70/30 một lần theo randomColumn('random', 42), nên các mẫu
+trong vùng đệm của cùng một điểm lũ rơi vào cả tập huấn luyện lẫn kiểm định làm R² bị
+thổi phồng. Ở đây mẫu được gom nhóm trước khi chia fold:
+- 'random': từng mẫu một (giống cách chia của .js)
+- 'point' : theo điểm lũ gốc (point_id), mọi mẫu của một vùng đệm cùng một fold
+- 'block' : theo ô lưới lat/lon kích thước block_size độ
+
+Bảng huấn luyện được đặt một lần vào shared memory, các process chỉ đọc (không sao chép).
+"""
+
+import time
+import numpy as np
+import pandas as pd
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+
+from raster_io import FEATURE_NAMES
+from models import create_model, SEED
+
+N_FOLDS = 5
+# Kích thước ô lưới (độ) khi chia theo khối không gian, ~5.5 km
+BLOCK_SIZE = 0.05
+
+# Bảng dùng chung của mỗi process
+_SHARED = {}
+
+
+def _init_worker(shm_name, shape):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    table = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+    table.flags.writeable = False
+    # Giữ tham chiếu shm để bộ nhớ không bị giải phóng khi process còn chạy
+    _SHARED.update(shm=shm, table=table)
+
+
+def make_groups(df, method='block', block_size=BLOCK_SIZE):
+    """
+    Mã nhóm của từng mẫu: các mẫu cùng nhóm luôn nằm chung một fold
+
+    Args:
+        df: Bảng mẫu (có point_id cho 'point', lat/lon cho 'block')
+        method: 'random', 'point' hoặc 'block'
+        block_size: Kích thước ô lưới (độ) cho 'block'
+
+    Returns:
+        np.ndarray mã nhóm (int64)
+    """
+    if method == 'random':
+        return np.arange(len(df), dtype=np.int64)
+    if method == 'point':
+        return pd.factorize(df['point_id'])[0].astype(np.int64)
+    if method == 'block':
+        cell_y = np.floor(df['lat'].to_numpy() / block_size).astype(np.int64)
+        cell_x = np.floor(df['lon'].to_numpy() / block_size).astype(np.int64)
+        return pd.factorize(pd.MultiIndex.from_arrays([cell_y, cell_x]))[0].astype(np.int64)
+    raise ValueError(f"Cách chia không hỗ trợ: {method}")
+
+
+def assign_folds(groups, n_folds=N_FOLDS, seed=SEED):
+    """
+    Gán nhóm vào fold sao cho số mẫu mỗi fold gần bằng nhau
+
+    Nhóm được xáo trộn theo seed rồi lần lượt đưa vào fold đang ít mẫu nhất
+    (nhóm lớn xếp trước).
+
+    Returns:
+        np.ndarray số thứ tự fold (0..n_folds-1) của từng mẫu
+    """
+    sizes = np.bincount(groups)
+    if np.count_nonzero(sizes) < n_folds:
+        raise ValueError(f"Chỉ có {np.count_nonzero(sizes)} nhóm, không đủ cho {n_folds} fold")
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(sizes))
+    order = order[np.argsort(-sizes[order], kind='stable')]
+    fold_of_group = np.empty(len(sizes), dtype=np.int64)
+    fold_sizes = np.zeros(n_folds, dtype=np.int64)
+    for g in order:
+        k = int(np.argmin(fold_sizes))
+        fold_of_group[g] = k
+        fold_sizes[k] += sizes[g]
+    return fold_of_group[groups]
+
+
+def _fit_fold(fold, model, optimizer, params, n_features):
+    """Huấn luyện trên các fold còn lại, đánh giá trên fold (chạy trong process)"""
+    start = time.perf_counter()
+    table = _SHARED['table']
+    X, y, folds = table[:, :n_features], table[:, n_features], table[:, n_features + 1]
+    test = folds == fold
+    extra = {'n_jobs': 1} if model == 'RF' else {}
+    estimator = create_model(model, optimizer, **params, **extra)
+    estimator.fit(X[~test], y[~test])
+    pred = np.clip(estimator.predict(X[test]), 0, 1)
+    residual = y[test] - pred
+    return {
+        'fold': fold,
+        'n_train': int((~test).sum()),
+        'n_test': int(test.sum()),
+        'r2': float(1 - np.sum(residual ** 2) / np.sum((y[test] - y[test].mean()) ** 2)),
+        'mae': float(np.mean(np.abs(residual))),
+        'rmse': float(np.sqrt(np.mean(residual ** 2))),
+        'seconds': time.perf_counter() - start,
+    }
+
+
+def cross_validate(training, model, optimizer='pso', n_folds=N_FOLDS, method='block', block_size=BLOCK_SIZE,
+                   feature_names=FEATURE_NAMES, target='flood', seed=SEED, max_workers=None, **params):
+    """
+    Kiểm định chéo k-fold một mô hình, các fold huấn luyện song song
+
+    Args:
+        training: Bảng mẫu (vd: kết quả sample_regions)
+        model: 'RF', 'XGB' hoặc 'SVM'
+        optimizer: Bộ tham số trong models.MODEL_CONFIGS ('pso', 'puma', 'rs')
+        n_folds: Số fold
+        method: 'random', 'point' hoặc 'block'
+        block_size: Kích thước ô lưới (độ) cho 'block'
+        max_workers: Số process
+        **params: Tham số ghi đè cho create_model
+
+    Returns:
+        DataFrame kết quả từng fold (fold, n_train, n_test, r2, mae, rmse, seconds)
+    """
+    model = model.upper()
+    n_features = len(feature_names)
+    folds = assign_folds(make_groups(training, method, block_size), n_folds, seed)
+
+    print(f"{'='*60}")
+    print(f"KIỂM ĐỊNH CHÉO {optimizer.upper()} + {model}: {n_folds} fold, chia theo '{method}'")
+    print(f"{'='*60}")
+
+    # Bảng [đặc trưng | target | fold] trong shared memory
+    shape = (len(training), n_features + 2)
+    shm = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)) * 8)
+    try:
+        table = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+        table[:, :n_features] = training[list(feature_names)].to_numpy(dtype=np.float64)
+        table[:, n_features] = training[target].to_numpy(dtype=np.float64)
+        table[:, n_features + 1] = folds
+        del table
+
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                 initargs=(shm.name, shape)) as executor:
+            futures = [executor.submit(_fit_fold, k, model, optimizer, params, n_features)
+                       for k in range(n_folds)]
+            results = [f.result() for f in futures]
+    finally:
+        shm.close()
+        shm.unlink()
+
+    df = pd.DataFrame(results)
+    for r in results:
+        print(f"  Fold {r['fold']}: {r['n_train']:,} huấn luyện / {r['n_test']:,} kiểm định  "
+              f"R²={r['r2']:.4f}  MAE={r['mae']:.4f}  RMSE={r['rmse']:.4f}")
+    print(f"\n✓ Trung bình: R²={df['r2'].mean():.4f} ± {df['r2'].std():.4f}, "
+          f"MAE={df['mae'].mean():.4f}, RMSE={df['rmse'].mean():.4f}")
+    print(f"  Thời gian: {time.perf_counter() - start:.1f}s")
+    return df
+
+
+def compare_methods(training, model, optimizer='pso', methods=('random', 'point', 'block'), **kwargs):
+    """
+    So sánh R² giữa các cách chia fold (chênh lệch cho thấy mức rò rỉ không gian)
+
+    Returns:
+        DataFrame: method, r2_mean, r2_std, mae_mean, rmse_mean
+    """
+    rows = []
+    for method in methods:
+        df = cross_validate(training, model, optimizer, method=method, **kwargs)
+        rows.append({
+            'method': method,
+            'r2_mean': df['r2'].mean(),
+            'r2_std': df['r2'].std(),
+            'mae_mean': df['mae'].mean(),
+            'rmse_mean': df['rmse'].mean(),
+        })
+    summary = pd.DataFrame(rows)
+    print(f"\n{'='*60}")
+    print(f"TÓM TẮT {optimizer.upper()} + {model.upper()}")
+    print(f"{'='*60}")
+    print(summary.to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+    return summary
+
+
+if __name__ == "__main__":
+    training_data = pd.read_csv(r"D:\prj\data\training_data.csv")
+
+    for model in ['RF', 'SVM', 'XGB']:
+        compare_methods(training_data, model, 'pso')
@@ -1,141 +1,320 @@
 """
 Debug script to check TIFF file and shapefile information
+
+Ảnh được đọc theo khối đúng một lần. Với mỗi khối tính:
+- ma trận trong/ngoài ranh giới × có/không có dữ liệu
+- bản đồ lỗi thu nhỏ (tỷ lệ pixel thiếu dữ liệu bên trong ranh giới)
+- số giá trị khác nhau xấp xỉ (KMV sketch, không cần sắp xếp toàn ảnh)
+Kết quả được ghi ra báo cáo JSON.
 """
 
+import os
+import json
+import time
 import numpy as np
 import rasterio
 from rasterio.features import geometry_mask
+from rasterio.windows import transform as window_transform
+from rasterio.transform import Affine
 import geopandas as gpd
 
-# Paths
-tiff_file = r"D:\prj\results\map\cliped\rf\cliped_flood_probability_pso_RF.tif"
-shapefile = r"C:\Users\Admin\Desktop\GL\gl.shp"
-
-print("="*60)
-print("CHECKING TIFF FILE")
-print("="*60)
-
-# Read TIFF
-with rasterio.open(tiff_file) as src:
-    data = src.read(1)
-    profile = src.profile
-    transform = src.transform
-    crs = src.crs
-    nodata = src.nodata
-    
-    print(f"Shape: {data.shape}")
-    print(f"CRS: {crs}")
-    print(f"Transform: {transform}")
-    print(f"NoData value: {nodata}")
-    print(f"Data type: {data.dtype}")
-    print(f"Data min: {np.nanmin(data)}")
-    print(f"Data max: {np.nanmax(data)}")
-    print(f"Data mean: {np.nanmean(data)}")
-    
-    # Check unique values (sample)
-    unique_vals = np.unique(data.flatten())
-    print(f"\nNumber of unique values: {len(unique_vals)}")
-    print(f"First 10 unique values: {unique_vals[:10]}")
-    print(f"Last 10 unique values: {unique_vals[-10:]}")
-    
-    # Check for NaN
-    nan_count = np.sum(np.isnan(data))
-    print(f"\nNaN pixels: {nan_count}")
-    
-    # Check for nodata value
+from raster_io import iter_windows
+
+# Số hash nhỏ nhất giữ lại trong KMV sketch (sai số tương đối ~ 1/sqrt(k))
+KMV_SIZE = 4096
+# Số giá trị nhỏ nhất/lớn nhất in ra
+N_EXTREMES = 10
+
+
+def _hash64(values):
+    """Băm giá trị (theo bit float64) thành uint64 bằng splitmix64"""
+    x = np.ascontiguousarray(values, dtype=np.float64).view(np.uint64)
+    with np.errstate(over='ignore'):
+        x = x + np.uint64(0x9E3779B97F4A7C15)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        x = x ^ (x >> np.uint64(31))
+    return x
+
+
+def _smallest_unique(values, n):
+    """n giá trị khác nhau nhỏ nhất, dùng np.partition thay vì sắp xếp cả mảng"""
+    k = n
+    while k < values.size:
+        part = np.unique(np.partition(values, k - 1)[:k])
+        if part.size >= n:
+            return part[:n]
+        k *= 8
+    return np.unique(values)[:n]
+
+
+class DistinctCounter:
+    """Đếm xấp xỉ số giá trị khác nhau (k minimum values), chính xác khi ít hơn k giá trị"""
+
+    def __init__(self, k=KMV_SIZE):
+        self.k = k
+        self.hashes = np.empty(0, dtype=np.uint64)
+
+    def update(self, values):
+        if values.size == 0:
+            return
+        h = _hash64(values)
+        if self.hashes.size == self.k:
+            h = h[h < self.hashes[-1]]
+            if h.size == 0:
+                return
+        h = _smallest_unique(h, self.k)
+        self.hashes = np.unique(np.concatenate([self.hashes, h]))[:self.k]
+
+    def estimate(self):
+        if self.hashes.size < self.k:
+            return int(self.hashes.size), True
+        kth = float(self.hashes[-1]) / 2.0 ** 64
+        return int(round((self.k - 1) / kth)), False
+
+
+def _update_extremes(current, values, largest=False):
+    """Giữ N_EXTREMES giá trị khác nhau nhỏ nhất (hoặc lớn nhất)"""
+    if values.size == 0:
+        return current
+    if current.size == N_EXTREMES:
+        values = values[values > current[0]] if largest else values[values < current[-1]]
+    values = -_smallest_unique(-values, N_EXTREMES) if largest else _smallest_unique(values, N_EXTREMES)
+    merged = np.unique(np.concatenate([current, values]))
+    return merged[-N_EXTREMES:] if largest else merged[:N_EXTREMES]
+
+
+def load_boundary(shapefile, crs):
+    """Đọc shapefile ranh giới và chuyển về hệ tọa độ của ảnh"""
+    gdf = gpd.read_file(shapefile)
+    print(f"Shapefile CRS: {gdf.crs}")
+    print(f"Number of features: {len(gdf)}")
+    print(f"Geometry type: {gdf.geometry.type.unique()}")
+    print(f"Bounds: {gdf.total_bounds}")
+    if gdf.crs != crs:
+        print(f"\nReprojecting shapefile from {gdf.crs} to {crs}")
+        gdf = gdf.to_crs(crs)
+        print(f"New bounds: {gdf.total_bounds}")
+    return list(gdf.geometry)
+
+
+def diagnose_tiff(tiff_file, shapefile=None, report_json=None, problem_map=None, map_factor=16, top_n=20):
+    """
+    Chẩn đoán file TIFF so với ranh giới, đọc ảnh theo khối đúng một lần
+
+    Args:
+        tiff_file: Đường dẫn file TIFF
+        shapefile: Shapefile ranh giới (None = coi toàn bộ ảnh là bên trong)
+        report_json: Đường dẫn file báo cáo JSON (None = không ghi)
+        problem_map: Đường dẫn GeoTIFF bản đồ lỗi thu nhỏ (None = không ghi)
+        map_factor: Hệ số thu nhỏ của bản đồ lỗi (mỗi ô = map_factor x map_factor pixel)
+        top_n: Số ô thiếu dữ liệu nhiều nhất liệt kê trong báo cáo
+
+    Returns:
+        dict báo cáo
+    """
+    start = time.perf_counter()
+
+    print("=" * 60)
+    print("CHECKING TIFF FILE")
+    print("=" * 60)
+
+    with rasterio.open(tiff_file) as src:
+        nodata = src.nodata
+        crs = src.crs
+        transform = src.transform
+        height, width = src.height, src.width
+        is_float = np.issubdtype(np.dtype(src.dtypes[0]), np.floating)
+
+        print(f"Shape: {(height, width)}")
+        print(f"CRS: {crs}")
+        print(f"Transform: {transform}")
+        print(f"NoData value: {nodata}")
+        print(f"Data type: {src.dtypes[0]}")
+        print(f"Block shape: {src.block_shapes[0]}")
+
+        geometries = None
+        if shapefile is not None:
+            print("\n" + "=" * 60)
+            print("CHECKING SHAPEFILE")
+            print("=" * 60)
+            geometries = load_boundary(shapefile, crs)
+
+        # Lưới của bản đồ lỗi thu nhỏ
+        map_h = (height + map_factor - 1) // map_factor
+        map_w = (width + map_factor - 1) // map_factor
+        inside_cells = np.zeros(map_h * map_w, dtype=np.int64)
+        missing_cells = np.zeros(map_h * map_w, dtype=np.int64)
+        col_cells = np.arange(width) // map_factor
+
+        # Ma trận [trong, ngoài] x [có dữ liệu, không có dữ liệu]
+        matrix = np.zeros((2, 2), dtype=np.int64)
+        counts = {'nan': 0, 'nodata': 0, 'zero': 0, 'negative': 0}
+        vmin, vmax, total, count = np.inf, -np.inf, 0.0, 0
+        lowest = np.empty(0, dtype=np.float64)
+        highest = np.empty(0, dtype=np.float64)
+        distinct = DistinctCounter()
+
+        print("\n" + "=" * 60)
+        print("ANALYZING DATA VS BOUNDARY (BLOCK STREAMING)")
+        print("=" * 60)
+
+        for window in iter_windows(src):
+            data = src.read(1, window=window)
+
+            nan_mask = np.isnan(data) if is_float else np.zeros(data.shape, dtype=bool)
+            has_data = ~nan_mask
+            if nodata is not None and not np.isnan(nodata):
+                nodata_mask = data == nodata
+                counts['nodata'] += int(nodata_mask.sum())
+                has_data &= ~nodata_mask
+            counts['nan'] += int(nan_mask.sum())
+
+            if geometries is not None:
+                inside = geometry_mask(geometries, out_shape=data.shape,
+                                       transform=window_transform(window, transform), invert=True)
+            else:
+                inside = np.ones(data.shape, dtype=bool)
+
+            n_inside_data = int(np.count_nonzero(has_data & inside))
+            n_inside = int(np.count_nonzero(inside))
+            n_data = int(np.count_nonzero(has_data))
+            matrix[0, 0] += n_inside_data
+            matrix[0, 1] += n_inside - n_inside_data
+            matrix[1, 0] += n_data - n_inside_data
+            matrix[1, 1] += data.size - n_inside - n_data + n_inside_data
+
+            # Cộng dồn vào ô của bản đồ lỗi
+            row_cells = (window.row_off + np.arange(data.shape[0])) // map_factor
+            cell_idx = (row_cells[:, None] * map_w + col_cells[None, :]).ravel()
+            inside_flat = inside.ravel()
+            inside_cells += np.bincount(cell_idx[inside_flat], minlength=map_h * map_w)
+            missing = inside_flat & ~has_data.ravel()
+            missing_cells += np.bincount(cell_idx[missing], minlength=map_h * map_w)
+
+            values = data[has_data].astype(np.float64)
+            if values.size:
+                vmin = min(vmin, values.min())
+                vmax = max(vmax, values.max())
+                total += values.sum()
+                count += values.size
+                counts['zero'] += int(np.count_nonzero(values == 0))
+                counts['negative'] += int(np.count_nonzero(values < 0))
+                distinct.update(values)
+                lowest = _update_extremes(lowest, values)
+                highest = _update_extremes(highest, values, largest=True)
+
+    n_distinct, exact = distinct.estimate()
+    print(f"Data min: {vmin}")
+    print(f"Data max: {vmax}")
+    print(f"Data mean: {total / count if count else float('nan')}")
+    print(f"\nNumber of unique values: {'' if exact else '~'}{n_distinct}")
+    print(f"First {N_EXTREMES} unique values: {lowest}")
+    print(f"Last {N_EXTREMES} unique values: {highest}")
+    print(f"\nNaN pixels: {counts['nan']}")
     if nodata is not None:
-        nodata_count = np.sum(data == nodata)
-        print(f"NoData ({nodata}) pixels: {nodata_count}")
-    
-    # Check for zero values
-    zero_count = np.sum(data == 0)
-    print(f"Zero pixels: {zero_count}")
-    
-    # Check for negative values
-    neg_count = np.sum(data < 0)
-    print(f"Negative pixels: {neg_count}")
-
-print("\n" + "="*60)
-print("CHECKING SHAPEFILE")
-print("="*60)
-
-# Read shapefile
-gdf = gpd.read_file(shapefile)
-print(f"Shapefile CRS: {gdf.crs}")
-print(f"Number of features: {len(gdf)}")
-print(f"Geometry type: {gdf.geometry.type.unique()}")
-print(f"Bounds: {gdf.total_bounds}")
-
-# Reproject if needed
-if gdf.crs != crs:
-    print(f"\nReprojecting shapefile from {gdf.crs} to {crs}")
-    gdf = gdf.to_crs(crs)
-    print(f"New bounds: {gdf.total_bounds}")
-
-print("\n" + "="*60)
-print("CREATING BOUNDARY MASK")
-print("="*60)
-
-# Create boundary mask
-with rasterio.open(tiff_file) as src:
-    boundary_mask = ~geometry_mask(
-        gdf.geometry,
-        out_shape=data.shape,
-        transform=transform,
-        invert=False
-    )
-    
-    print(f"Boundary mask shape: {boundary_mask.shape}")
-    print(f"Pixels inside boundary: {np.sum(boundary_mask)}")
-    print(f"Pixels outside boundary: {np.sum(~boundary_mask)}")
-
-print("\n" + "="*60)
-print("ANALYZING DATA VS BOUNDARY")
-print("="*60)
-
-# Check data inside/outside boundary
-if nodata is not None:
-    has_data = (data != nodata) & (~np.isnan(data))  # Check BOTH nodata and NaN
-else:
-    has_data = ~np.isnan(data)
-
-print(f"Total pixels with data: {np.sum(has_data)}")
-print(f"Pixels with data INSIDE boundary: {np.sum(has_data & boundary_mask)}")
-print(f"Pixels with data OUTSIDE boundary: {np.sum(has_data & ~boundary_mask)}")
-print(f"Pixels WITHOUT data INSIDE boundary: {np.sum(~has_data & boundary_mask)}")
-print(f"Pixels WITHOUT data OUTSIDE boundary: {np.sum(~has_data & ~boundary_mask)}")
-
-# Find edges where data might be missing
-print("\n" + "="*60)
-print("CHECKING EDGE PIXELS")
-print("="*60)
-
-# Check corners and edges
-h, w = data.shape
-corners = [
-    (0, 0), (0, w-1), (h-1, 0), (h-1, w-1),  # corners
-    (h//4, w//4), (h//4, 3*w//4), (3*h//4, w//4), (3*h//4, 3*w//4)  # mid points
-]
-
-for i, j in corners:
-    val = data[i, j]
-    in_boundary = boundary_mask[i, j]
-    print(f"Pixel [{i},{j}]: value={val:.6f}, in_boundary={in_boundary}, is_nodata={val==nodata if nodata else np.isnan(val)}")
-
-print("\n" + "="*60)
-print("RECOMMENDATION")
-print("="*60)
-
-null_pixels = np.sum(~has_data & boundary_mask)
-if null_pixels == 0:
-    print("⚠ No null pixels found inside boundary!")
-    print("\nPossible reasons:")
-    print("1. All pixels inside boundary already have valid data")
-    print("2. NoData value detection is incorrect")
-    print("3. Shapefile boundary doesn't match expected area")
-    print("\nTry checking:")
-    print(f"- If nodata={nodata} is correct")
-    print("- If shapefile covers the expected area")
-    print("- Visual inspection of the TIFF file")
-else:
-    print(f"✓ Found {null_pixels} null pixels to fill")
+        print(f"NoData ({nodata}) pixels: {counts['nodata']}")
+    print(f"Zero pixels: {counts['zero']}")
+    print(f"Negative pixels: {counts['negative']}")
+
+    print("\n" + "=" * 60)
+    print("DATA VS BOUNDARY MATRIX")
+    print("=" * 60)
+    print(f"{'':<10}{'có dữ liệu':>15}{'không dữ liệu':>15}")
+    print(f"{'trong':<10}{matrix[0, 0]:>15,}{matrix[0, 1]:>15,}")
+    print(f"{'ngoài':<10}{matrix[1, 0]:>15,}{matrix[1, 1]:>15,}")
+
+    # Bản đồ lỗi: tỷ lệ pixel thiếu dữ liệu trong ranh giới, -1 = ô nằm ngoài ranh giới
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.where(inside_cells > 0, missing_cells / inside_cells, -1.0).astype(np.float32)
+    ratio = ratio.reshape(map_h, map_w)
+
+    order = np.argsort(missing_cells)[::-1][:top_n]
+    problem_cells = []
+    for idx in order:
+        if missing_cells[idx] == 0:
+            break
+        r, c = divmod(int(idx), map_w)
+        x0, y0 = transform * (c * map_factor, r * map_factor)
+        x1, y1 = transform * (min((c + 1) * map_factor, width), min((r + 1) * map_factor, height))
+        problem_cells.append({
+            'row': r * map_factor, 'col': c * map_factor,
+            'missing_pixels': int(missing_cells[idx]),
+            'missing_ratio': float(ratio[r, c]),
+            'bounds': [min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1)],
+        })
+
+    if problem_map:
+        profile = {
+            'driver': 'GTiff', 'height': map_h, 'width': map_w, 'count': 1, 'dtype': 'float32',
+            'crs': crs, 'transform': transform * Affine.scale(map_factor), 'nodata': -1.0,
+            'compress': 'lzw',
+        }
+        with rasterio.open(problem_map, 'w', **profile) as dst:
+            dst.write(ratio, 1)
+        print(f"\nĐã lưu bản đồ lỗi: {problem_map}")
+
+    report = {
+        'file': os.path.abspath(tiff_file),
+        'shapefile': os.path.abspath(shapefile) if shapefile else None,
+        'shape': [height, width],
+        'crs': str(crs),
+        'nodata': nodata,
+        'min': float(vmin) if count else None,
+        'max': float(vmax) if count else None,
+        'mean': total / count if count else None,
+        'distinct_values': n_distinct,
+        'distinct_exact': exact,
+        'lowest_values': lowest.tolist(),
+        'highest_values': highest.tolist(),
+        'pixel_counts': counts,
+        'matrix': {
+            'inside_with_data': int(matrix[0, 0]),
+            'inside_without_data': int(matrix[0, 1]),
+            'outside_with_data': int(matrix[1, 0]),
+            'outside_without_data': int(matrix[1, 1]),
+        },
+        'problem_map': {'path': problem_map, 'factor': map_factor, 'shape': [map_h, map_w]},
+        'problem_cells': problem_cells,
+        'seconds': time.perf_counter() - start,
+    }
+
+    if report_json:
+        with open(report_json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2, default=float)
+        print(f"Đã lưu báo cáo: {report_json}")
+
+    print("\n" + "=" * 60)
+    print("RECOMMENDATION")
+    print("=" * 60)
+
+    null_pixels = int(matrix[0, 1])
+    if null_pixels == 0:
+        print("⚠ No null pixels found inside boundary!")
+        print("\nPossible reasons:")
+        print("1. All pixels inside boundary already have valid data")
+        print("2. NoData value detection is incorrect")
+        print("3. Shapefile boundary doesn't match expected area")
+        print("\nTry checking:")
+        print(f"- If nodata={nodata} is correct")
+        print("- If shapefile covers the expected area")
+        print("- Visual inspection of the TIFF file")
+    else:
+        print(f"✓ Found {null_pixels} null pixels to fill")
+        for cell in problem_cells[:5]:
+            print(f"  - Ô [{cell['row']},{cell['col']}]: {cell['missing_pixels']} pixel thiếu "
+                  f"({cell['missing_ratio'] * 100:.1f}%)")
+
+    print(f"\nThời gian: {report['seconds']:.2f}s")
+    return report
+
+
+if __name__ == "__main__":
+    # Paths
+    tiff_file = r"D:\prj\results\map\cliped\rf\cliped_flood_probability_pso_RF.tif"
+    shapefile = r"C:\Users\Admin\Desktop\GL\gl.shp"
+
+    report_json = r"D:\prj\results\map\cliped\rf\debug_pso_RF.json"
+    problem_map = r"D:\prj\results\map\cliped\rf\debug_pso_RF_problem_map.tif"
+
+    diagnose_tiff(tiff_file, shapefile, report_json, problem_map)
@@ -0,0 +1,193 @@
+"""
+Tổng hợp 9 bản đồ nhạy cảm ngập lụt (PSO/PUMA/RS x RF/SVR/XGB) theo từng pixel
+
+Đọc đồng thời các bản đồ đã căn chỉnh theo từng dải block, mỗi process xử lý một dải
+và trả về: trung bình, độ lệch chuẩn, min, max, ngưỡng đa số (theo BREAKS của phan_nguong)
+và số mô hình đồng thuận với ngưỡng đa số. Mỗi lúc chỉ giữ vài dải trong bộ nhớ.
+"""
+
+import os
+import time
+import numpy as np
+import rasterio
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from raster_io import valid_mask, iter_windows
+from models import MODEL_FOLDERS, output_name
+from phan_nguong import BREAKS
+
+OPTIMIZERS = ['pso', 'puma', 'rs']
+NODATA = -9999.0
+N_CLASSES = len(BREAKS) + 1
+# Số pixel mỗi dải (mỗi dải đọc 1 window từ mỗi bản đồ)
+WINDOW_PIXELS = 1_000_000
+# Kích thước tile của file kết quả; dải là bội số của số hàng này nên mỗi tile chỉ ghi một lần
+OUTPUT_BLOCK = 256
+
+# (tên file, kiểu dữ liệu, nodata) của từng lớp kết quả
+OUTPUTS = {
+    'mean': ('ensemble_mean.tif', 'float32', NODATA),
+    'std': ('ensemble_std.tif', 'float32', NODATA),
+    'min': ('ensemble_min.tif', 'float32', NODATA),
+    'max': ('ensemble_max.tif', 'float32', NODATA),
+    'majority': ('ensemble_majority_class.tif', 'uint8', 0),
+    'agreement': ('ensemble_agreement.tif', 'uint8', 0),
+    'count': ('ensemble_count.tif', 'uint8', 0),
+}
+
+# Các dataset đang mở của mỗi process
+_WORKER = {}
+
+
+def find_maps(map_dir, optimizers=OPTIMIZERS, models=MODEL_FOLDERS):
+    """
+    Tìm các bản đồ flood_susceptibility_<opt>_<MODEL>.tif trong map_dir/<rf|svr|xgb> hoặc map_dir
+
+    Returns:
+        list đường dẫn file tồn tại
+    """
+    paths = []
+    for model, folder in models.items():
+        for opt in optimizers:
+            name = output_name(opt, model)
+            for path in (os.path.join(map_dir, folder, name), os.path.join(map_dir, name)):
+                if os.path.exists(path):
+                    paths.append(path)
+                    break
+            else:
+                print(f"⚠ Không tìm thấy: {name}")
+    return paths
+
+
+def _init_worker(paths):
+    _WORKER['datasets'] = [rasterio.open(p) for p in paths]
+
+
+def reduce_stack(stack, masks):
+    """
+    Tổng hợp chồng bản đồ (k, h, w) với mask hợp lệ tương ứng
+
+    Pixel thiếu ở một vài bản đồ vẫn được tính trên các bản đồ còn lại; ngưỡng đa số
+    khi hòa lấy ngưỡng thấp hơn.
+
+    Returns:
+        dict tên lớp -> mảng (h, w) theo OUTPUTS
+    """
+    count = masks.sum(axis=0)
+    has_data = count > 0
+    data = np.where(masks, stack, np.nan).astype(np.float64)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        total = np.where(masks, stack, 0).sum(axis=0, dtype=np.float64)
+        mean = total / count
+        std = np.sqrt(np.where(masks, (stack - mean) ** 2, 0).sum(axis=0) / count)
+    minimum = np.where(masks, data, np.inf).min(axis=0)
+    maximum = np.where(masks, data, -np.inf).max(axis=0)
+
+    # Ngưỡng 1..5 giống phan_nguong (cận trên bao gồm), 0 = không có dữ liệu
+    classes = np.where(masks, np.digitize(stack, BREAKS, right=True) + 1, 0)
+    votes = np.stack([(classes == c).sum(axis=0) for c in range(1, N_CLASSES + 1)])
+    majority = votes.argmax(axis=0) + 1
+    agreement = votes.max(axis=0)
+
+    result = {
+        'mean': mean, 'std': std, 'min': minimum, 'max': maximum,
+        'majority': majority, 'agreement': agreement, 'count': count,
+    }
+    for key, (_, dtype, nodata) in OUTPUTS.items():
+        result[key] = np.where(has_data, result[key], nodata).astype(dtype)
+    return result
+
+
+def _reduce_window(window):
+    """Đọc cùng một window từ tất cả bản đồ và tổng hợp (chạy trong process riêng)"""
+    stack, masks = [], []
+    for ds in _WORKER['datasets']:
+        data = ds.read(1, window=window)
+        stack.append(data)
+        masks.append(valid_mask(data, ds.nodata))
+    return window, reduce_stack(np.stack(stack).astype(np.float32), np.stack(masks))
+
+
+def check_same_grid(paths):
+    """Báo lỗi nếu các bản đồ không cùng lưới (dùng align_features trước)"""
+    grids = {}
+    for path in paths:
+        with rasterio.open(path) as src:
+            grids.setdefault((src.crs.to_string() if src.crs else None, src.width, src.height,
+                              tuple(round(v, 9) for v in src.transform[:6])), []).append(path)
+    if len(grids) > 1:
+        details = '\n'.join(f"  {key[1]}x{key[2]} {key[0]}: {[os.path.basename(p) for p in group]}"
+                            for key, group in grids.items())
+        raise ValueError(f"Các bản đồ không cùng lưới, hãy căn chỉnh bằng align_features:\n{details}")
+
+
+def ensemble_maps(paths, output_dir, max_workers=None, window_pixels=WINDOW_PIXELS):
+    """
+    Tạo các bản đồ tổng hợp từ nhiều bản đồ nhạy cảm cùng lưới
+
+    Args:
+        paths: Danh sách bản đồ (vd: kết quả find_maps)
+        output_dir: Thư mục lưu các file ensemble_*.tif
+        max_workers: Số process
+        window_pixels: Số pixel mỗi dải
+
+    Returns:
+        dict tên lớp -> đường dẫn file
+    """
+    if not paths:
+        raise ValueError("Không có bản đồ nào để tổng hợp")
+    check_same_grid(paths)
+    os.makedirs(output_dir, exist_ok=True)
+    max_workers = max_workers or os.cpu_count() or 1
+
+    print(f"{'='*60}")
+    print(f"TỔNG HỢP {len(paths)} BẢN ĐỒ")
+    print(f"{'='*60}")
+    for path in paths:
+        print(f"  - {os.path.basename(path)}")
+
+    with rasterio.open(paths[0]) as src:
+        profile = src.profile.copy()
+        windows = list(iter_windows(src, window_pixels, align_rows=OUTPUT_BLOCK))
+    profile.update(count=1, compress='lzw', tiled=True, blockxsize=OUTPUT_BLOCK, blockysize=OUTPUT_BLOCK,
+                   BIGTIFF='IF_SAFER')
+
+    outputs = {key: os.path.join(output_dir, name) for key, (name, _, _) in OUTPUTS.items()}
+    start = time.perf_counter()
+    destinations = {key: rasterio.open(outputs[key], 'w', **{**profile, 'dtype': dtype, 'nodata': nodata})
+                    for key, (_, dtype, nodata) in OUTPUTS.items()}
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                 initargs=(paths,)) as executor:
+            # Giới hạn số dải đang xử lý để bộ nhớ không tăng theo kích thước ảnh
+            pending, queue, done_count = set(), iter(windows), 0
+            while True:
+                for window in queue:
+                    pending.add(executor.submit(_reduce_window, window))
+                    if len(pending) >= 2 * max_workers:
+                        break
+                if not pending:
+                    break
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    window, result = future.result()
+                    for key, dst in destinations.items():
+                        dst.write(result[key], 1, window=window)
+                    done_count += 1
+                    print(f"  {done_count}/{len(windows)} dải", end='\r')
+    finally:
+        for dst in destinations.values():
+            dst.close()
+
+    print(f"\n✓ Hoàn thành trong {time.perf_counter() - start:.1f}s")
+    for path in outputs.values():
+        print(f"Đã lưu: {path}")
+    return outputs
+
+
+if __name__ == "__main__":
+    map_dir = r"D:\prj\results\map"
+    output_dir = r"D:\prj\results\map\ensemble"
+
+    ensemble_maps(find_maps(map_dir), output_dir)
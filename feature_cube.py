@@ -0,0 +1,211 @@
+"""
+Khối dữ liệu đặc trưng (feature cube) ánh xạ bộ nhớ (memory-mapped)
+
+13 lớp đặc trưng (featureNames trong rf.js, xgb.js, svm.js) được căn về một lưới
+và ghi vào một file duy nhất, xếp xen kẽ theo pixel (rows, cols, 13) kiểu float32:
+mỗi pixel có 13 giá trị liền nhau, mỗi dải hàng là một khối liên tục trên đĩa.
+
+Cấu trúc file:
+    8 byte  MAGIC
+    8 byte  độ dài header (uint64, little-endian)
+    header  JSON (transform, CRS, tên band, nodata, ...), đệm tới bội số HEADER_ALIGN
+    dữ liệu float32 (rows, cols, bands), NoData = NaN
+
+Đọc bằng open_cube() trả về np.memmap (rows, cols, 13) không sao chép dữ liệu.
+"""
+
+import os
+import json
+import time
+import numpy as np
+import rasterio
+from rasterio.enums import Resampling
+from rasterio.windows import Window
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from raster_io import FEATURE_NAMES, CATEGORICAL_FEATURES, valid_mask
+from align_features import check_alignment, open_aligned
+
+MAGIC = b'GEECUBE1'
+HEADER_ALIGN = 4096
+CHUNK_ROWS = 256
+
+
+def _write_header(path, meta):
+    """Ghi MAGIC + header JSON, trả về vị trí bắt đầu dữ liệu"""
+    text = json.dumps(meta, ensure_ascii=False).encode('utf-8')
+    offset = -(-(16 + len(text)) // HEADER_ALIGN) * HEADER_ALIGN
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(np.uint64(len(text)).tobytes())
+        f.write(text)
+        f.write(b'\0' * (offset - 16 - len(text)))
+    return offset
+
+
+def read_header(path):
+    """
+    Đọc header của file cube
+
+    Returns:
+        dict metadata (có thêm 'data_offset')
+    """
+    with open(path, 'rb') as f:
+        if f.read(8) != MAGIC:
+            raise ValueError(f"Không phải file feature cube: {path}")
+        length = int(np.frombuffer(f.read(8), dtype=np.uint64)[0])
+        meta = json.loads(f.read(length).decode('utf-8'))
+    meta['data_offset'] = -(-(16 + length) // HEADER_ALIGN) * HEADER_ALIGN
+    return meta
+
+
+def open_cube(path, mode='r'):
+    """
+    Mở file cube dưới dạng mảng ánh xạ bộ nhớ
+
+    Args:
+        path: Đường dẫn file cube
+        mode: 'r' chỉ đọc, 'r+' đọc/ghi
+
+    Returns:
+        (np.memmap (rows, cols, bands), metadata)
+    """
+    meta = read_header(path)
+    cube = np.memmap(path, dtype=meta['dtype'], mode=mode, offset=meta['data_offset'],
+                     shape=tuple(meta['shape']))
+    return cube, meta
+
+
+def band_index(meta, names):
+    """Vị trí các band theo tên (giữ thứ tự của names)"""
+    return [meta['band_names'].index(name) for name in names]
+
+
+def xy_to_rowcol(meta, xs, ys):
+    """
+    Đổi tọa độ (theo CRS của cube) sang chỉ số hàng/cột
+
+    Returns:
+        (rows, cols, inside) - inside = điểm nằm trong cube
+    """
+    a, b, c, d, e, f = meta['transform']
+    xs = np.asarray(xs, dtype=np.float64)
+    ys = np.asarray(ys, dtype=np.float64)
+    det = a * e - b * d
+    cols = np.floor(((xs - c) * e - (ys - f) * b) / det).astype(np.int64)
+    rows = np.floor(((ys - f) * a - (xs - c) * d) / det).astype(np.int64)
+    height, width = meta['shape'][:2]
+    inside = (rows >= 0) & (rows < height) & (cols >= 0) & (cols < width)
+    return rows, cols, inside
+
+
+def _fill_rows(path, sources, row_off, height):
+    """Đọc một dải hàng của tất cả các lớp và ghi vào cube (chạy trong process riêng)"""
+    cube, meta = open_cube(path, mode='r+')
+    width = meta['shape'][1]
+    window = Window(0, row_off, width, height)
+    out = cube[row_off:row_off + height]
+    for i, source in enumerate(sources):
+        if source['aligned']:
+            with rasterio.open(source['file']) as ds:
+                data = ds.read(1, window=window)
+                nodata = ds.nodata
+        else:
+            src, vrt = open_aligned(source['file'], meta['reference'], Resampling[source['resampling']])
+            try:
+                data = vrt.read(1, window=window)
+                nodata = vrt.nodata
+            finally:
+                vrt.close()
+                src.close()
+        values = data.astype(np.float32)
+        values[~valid_mask(data, nodata)] = np.nan
+        out[:, :, i] = values
+    cube.flush()
+    del cube
+    return height
+
+
+def build_feature_cube(feature_dir, output_path, feature_names=FEATURE_NAMES, reference=None,
+                       chunk_rows=CHUNK_ROWS, max_workers=None):
+    """
+    Căn các lớp đặc trưng về một lưới và ghi thành một file cube
+
+    Lớp lệch lưới được căn trực tiếp khi đọc (WarpedVRT, nearest cho lớp phân loại).
+    Mỗi process ghi một dải chunk_rows hàng vào file ánh xạ bộ nhớ.
+
+    Args:
+        feature_dir: Thư mục chứa các file đặc trưng
+        output_path: Đường dẫn file cube đầu ra
+        feature_names: Danh sách tên lớp (thứ tự band trong cube)
+        reference: Tên lớp làm lưới tham chiếu (None = lưới xuất hiện nhiều nhất)
+        chunk_rows: Số hàng mỗi dải ghi
+        max_workers: Số process
+
+    Returns:
+        metadata của cube
+    """
+    start = time.perf_counter()
+    report, ref = check_alignment(feature_dir, feature_names, reference)
+    if report is None:
+        return None
+    missing = [name for name in feature_names if name not in set(report['layer'])]
+    if missing:
+        raise ValueError(f"Thiếu lớp đặc trưng: {missing}")
+
+    rows_by_layer = {row['layer']: row for _, row in report.iterrows()}
+    sources = []
+    for name in feature_names:
+        row = rows_by_layer[name]
+        sources.append({
+            'layer': name,
+            'file': os.path.abspath(row['file']),
+            'aligned': bool(row['aligned']),
+            'resampling': 'nearest' if name in CATEGORICAL_FEATURES else 'bilinear',
+            'nodata': row['nodata'],
+        })
+
+    height, width = ref['height'], ref['width']
+    meta = {
+        'shape': [height, width, len(feature_names)],
+        'dtype': 'float32',
+        'band_names': list(feature_names),
+        'crs': ref['crs'],
+        'transform': list(ref['transform']),
+        'nodata': 'nan',
+        'chunk_rows': chunk_rows,
+        'sources': sources,
+        'reference': {k: ref[k] for k in ('crs', 'transform', 'width', 'height')},
+    }
+
+    print(f"\n{'='*60}")
+    print(f"TẠO FEATURE CUBE {height} x {width} x {len(feature_names)}")
+    print(f"{'='*60}")
+
+    offset = _write_header(output_path, meta)
+    # Cấp phát vùng dữ liệu (file thưa trên hầu hết hệ điều hành)
+    with open(output_path, 'r+b') as f:
+        f.truncate(offset + height * width * len(feature_names) * 4)
+
+    done = 0
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_fill_rows, output_path, sources, row_off, min(chunk_rows, height - row_off))
+                   for row_off in range(0, height, chunk_rows)]
+        for future in as_completed(futures):
+            done += future.result()
+            print(f"  {done}/{height} hàng", end='\r')
+
+    size_mb = os.path.getsize(output_path) / 1024 / 1024
+    print(f"\n✓ Đã lưu: {output_path} ({size_mb:.1f} MB, {time.perf_counter() - start:.1f}s)")
+    return read_header(output_path)
+
+
+if __name__ == "__main__":
+    # Thư mục chứa 13 lớp đặc trưng
+    feature_dir = r"D:\prj\feature"
+    cube_path = r"D:\prj\feature\feature_cube.bin"
+
+    build_feature_cube(feature_dir, cube_path)
+
+    cube, meta = open_cube(cube_path)
+    print(f"Cube: {cube.shape}, band: {meta['band_names']}")
@@ -0,0 +1,226 @@
+"""
+Mô hình thống kê Frequency Ratio (FR) làm đường cơ sở so sánh với RF, SVM, XGB
+
+FR của lớp i trong yếu tố j = (% điểm lũ rơi vào lớp i) / (% diện tích thuộc lớp i).
+Chỉ số nhạy cảm của pixel = tổng FR của các lớp mà pixel thuộc về trên 13 yếu tố.
+
+Chạy trên feature cube (feature_cube.build_feature_cube):
+1. Ngưỡng phân lớp: phân vị của mẫu lưới thưa từ cube (yếu tố phân loại giữ nguyên giá trị)
+2. Một lượt duyệt tile song song: đếm pixel mỗi lớp bằng một np.bincount cho mỗi yếu tố
+3. Một lượt duyệt tile song song: tra bảng FR và ghi bản đồ nhạy cảm
+"""
+
+import os
+import time
+import numpy as np
+import pandas as pd
+import rasterio
+from rasterio.crs import CRS
+from rasterio.warp import transform as transform_coords
+from rasterio.windows import Window
+from concurrent.futures import ProcessPoolExecutor
+
+from raster_io import FEATURE_NAMES, CATEGORICAL_FEATURES
+from feature_cube import open_cube, band_index, xy_to_rowcol
+from predict_map import iter_tiles, TILE_SIZE, NODATA
+
+N_CLASSES = 10
+# Số pixel tối đa của mẫu lưới thưa dùng tính ngưỡng phân lớp
+SAMPLE_PIXELS = 2_000_000
+# Yếu tố phân loại có nhiều giá trị hơn số này được chia theo phân vị như yếu tố liên tục
+MAX_CATEGORIES = 64
+
+# Cube, band và bảng tra của mỗi process
+_WORKER = {}
+
+
+def _init_worker(cube_path, bands, edges, lookup=None):
+    cube, _ = open_cube(cube_path)
+    _WORKER.update(cube=cube, bands=bands, edges=edges, lookup=lookup)
+
+
+def points_to_pixels(points, meta):
+    """
+    Vị trí pixel (row, col) trong cube của các điểm (cột lon, lat, EPSG:4326)
+
+    Returns:
+        (rows, cols, inside)
+    """
+    lon = points['lon'].to_numpy(dtype=np.float64)
+    lat = points['lat'].to_numpy(dtype=np.float64)
+    crs = CRS.from_user_input(meta['crs'])
+    if crs.is_geographic:
+        xs, ys = lon, lat
+    else:
+        xs, ys = (np.asarray(v) for v in transform_coords('EPSG:4326', crs, lon, lat))
+    return xy_to_rowcol(meta, xs, ys)
+
+
+def class_edges(cube, bands, feature_names, n_classes=N_CLASSES, sample_pixels=SAMPLE_PIXELS):
+    """
+    Ngưỡng phân lớp của từng yếu tố từ mẫu lưới thưa của cube
+
+    Yếu tố liên tục: n_classes lớp theo phân vị (bỏ ngưỡng trùng nhau).
+    Yếu tố phân loại (CATEGORICAL_FEATURES): mỗi giá trị là một lớp, ngưỡng là
+    điểm giữa các giá trị liên tiếp.
+
+    Returns:
+        list mảng ngưỡng trong (lớp k = các giá trị trong (edges[k-1], edges[k]])
+    """
+    height, width = cube.shape[:2]
+    step = max(1, int(np.sqrt(height * width / sample_pixels)))
+    sample = np.asarray(cube[::step, ::step][:, :, bands], dtype=np.float64).reshape(-1, len(bands))
+    sample = sample[np.isfinite(sample).all(axis=1)]
+
+    edges = []
+    for j, name in enumerate(feature_names):
+        values = sample[:, j]
+        uniques = np.unique(values)
+        if name in CATEGORICAL_FEATURES and len(uniques) <= MAX_CATEGORIES:
+            edges.append((uniques[:-1] + uniques[1:]) / 2)
+        else:
+            quantiles = np.quantile(values, np.linspace(0, 1, n_classes + 1)[1:-1])
+            edges.append(np.unique(quantiles))
+    return edges
+
+
+def _classify(X):
+    """Chỉ số lớp (n, bands) theo ngưỡng của từng yếu tố"""
+    classes = np.empty(X.shape, dtype=np.int64)
+    for j, e in enumerate(_WORKER['edges']):
+        classes[:, j] = np.searchsorted(e, X[:, j], side='left')
+    return classes
+
+
+def _read_tile(row_off, col_off, height, width):
+    tile = _WORKER['cube'][row_off:row_off + height, col_off:col_off + width]
+    X = np.asarray(tile[:, :, _WORKER['bands']], dtype=np.float32).reshape(-1, len(_WORKER['bands']))
+    return X, np.isfinite(X).all(axis=1)
+
+
+def _count_tile(row_off, col_off, height, width):
+    """Số pixel hợp lệ mỗi lớp của từng yếu tố trong một tile (chạy trong process riêng)"""
+    X, valid = _read_tile(row_off, col_off, height, width)
+    classes = _classify(X[valid])
+    return [np.bincount(classes[:, j], minlength=len(e) + 1) for j, e in enumerate(_WORKER['edges'])]
+
+
+def _score_tile(row_off, col_off, height, width):
+    """Tổng FR của các yếu tố cho từng pixel trong một tile (chạy trong process riêng)"""
+    X, valid = _read_tile(row_off, col_off, height, width)
+    out = np.full(X.shape[0], NODATA, dtype=np.float32)
+    classes = _classify(X[valid])
+    score = np.zeros(classes.shape[0], dtype=np.float64)
+    for j, table in enumerate(_WORKER['lookup']):
+        score += table[classes[:, j]]
+    out[valid] = score
+    return row_off, col_off, out.reshape(height, width)
+
+
+def frequency_ratio(cube_path, flood_points, output_tif, table_csv=None, feature_names=FEATURE_NAMES,
+                    n_classes=N_CLASSES, tile_size=TILE_SIZE, normalize=True, max_workers=None):
+    """
+    Tính bảng FR và bản đồ nhạy cảm ngập lụt theo Frequency Ratio
+
+    Args:
+        cube_path: File feature cube
+        flood_points: DataFrame điểm (lon, lat, flood), chỉ dùng điểm flood = 1
+            (vd: phần huấn luyện của sample_regions.split_by_points)
+        output_tif: File GeoTIFF bản đồ FR
+        table_csv: File CSV bảng FR (None = không lưu)
+        n_classes: Số lớp phân vị của yếu tố liên tục
+        normalize: Đưa tổng FR về [0, 1] theo min/max lý thuyết (so sánh được với bản đồ ML)
+        max_workers: Số process
+
+    Returns:
+        (DataFrame bảng FR, đường dẫn bản đồ)
+    """
+    start = time.perf_counter()
+    cube, meta = open_cube(cube_path)
+    bands = band_index(meta, feature_names)
+    height, width = meta['shape'][:2]
+
+    print(f"{'='*60}")
+    print(f"FREQUENCY RATIO: {len(feature_names)} yếu tố, {height} x {width} pixel")
+    print(f"{'='*60}")
+
+    edges = class_edges(cube, bands, feature_names, n_classes)
+    tiles = list(iter_tiles(height, width, tile_size))
+
+    # Số pixel mỗi lớp trên toàn vùng
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                             initargs=(cube_path, bands, edges)) as executor:
+        pixel_counts = [np.zeros(len(e) + 1, dtype=np.int64) for e in edges]
+        for counts in executor.map(_count_tile, *zip(*tiles)):
+            for total, c in zip(pixel_counts, counts):
+                total += c
+    print(f"Đếm pixel theo lớp: {time.perf_counter() - start:.1f}s")
+
+    # Số điểm lũ mỗi lớp (mỗi pixel lũ tính một lần)
+    floods = flood_points[flood_points['flood'] == 1]
+    rows, cols, inside = points_to_pixels(floods, meta)
+    pixels = np.unique(np.stack([rows[inside], cols[inside]], axis=1), axis=0)
+    X = np.asarray(cube[pixels[:, 0], pixels[:, 1]][:, bands], dtype=np.float32)
+    X = X[np.isfinite(X).all(axis=1)]
+    _WORKER['edges'] = edges
+    flood_classes = _classify(X)
+    print(f"Số pixel lũ: {len(X):,} (từ {len(floods):,} điểm)")
+
+    rows_out, lookup = [], []
+    total_pixels = pixel_counts[0].sum()
+    for j, (name, e) in enumerate(zip(feature_names, edges)):
+        flood_count = np.bincount(flood_classes[:, j], minlength=len(e) + 1)
+        pct_pixels = pixel_counts[j] / total_pixels
+        pct_flood = flood_count / max(len(X), 1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            fr = np.where(pixel_counts[j] > 0, pct_flood / pct_pixels, 0.0)
+        lookup.append(fr)
+        bounds = np.concatenate([[-np.inf], e, [np.inf]])
+        for k in range(len(e) + 1):
+            rows_out.append({
+                'feature': name, 'class': k + 1, 'low': bounds[k], 'high': bounds[k + 1],
+                'pixels': int(pixel_counts[j][k]), 'flood_pixels': int(flood_count[k]),
+                'pct_pixels': pct_pixels[k] * 100, 'pct_flood': pct_flood[k] * 100, 'fr': fr[k],
+            })
+    table = pd.DataFrame(rows_out)
+
+    if normalize:
+        # min/max lý thuyết của tổng FR trên các lớp có pixel
+        low = sum(fr[c > 0].min() for fr, c in zip(lookup, pixel_counts))
+        high = sum(fr[c > 0].max() for fr, c in zip(lookup, pixel_counts))
+        scale = 1.0 / (high - low) if high > low else 0.0
+        lookup = [(fr - low / len(lookup)) * scale for fr in lookup]
+
+    profile = {
+        'driver': 'GTiff', 'height': height, 'width': width, 'count': 1, 'dtype': 'float32',
+        'crs': meta['crs'], 'transform': rasterio.Affine(*meta['transform'][:6]), 'nodata': NODATA,
+        'tiled': True, 'blockxsize': tile_size, 'blockysize': tile_size, 'compress': 'lzw',
+        'BIGTIFF': 'IF_SAFER',
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(output_tif)), exist_ok=True)
+    with rasterio.open(output_tif, 'w', **profile) as dst, \
+            ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                initargs=(cube_path, bands, edges, lookup)) as executor:
+        for row_off, col_off, score in executor.map(_score_tile, *zip(*tiles)):
+            dst.write(score, 1, window=Window(col_off, row_off, score.shape[1], score.shape[0]))
+
+    if table_csv:
+        table.to_csv(table_csv, index=False)
+        print(f"Đã lưu: {table_csv}")
+    print(f"✓ Đã lưu: {output_tif}")
+    print(f"Thời gian: {time.perf_counter() - start:.1f}s")
+    return table, output_tif
+
+
+if __name__ == "__main__":
+    from sample_regions import load_point_split, split_by_points
+
+    cube_path = r"D:\prj\feature\feature_cube.bin"
+    points = load_point_split(r"D:\prj\data\flood_points.csv", r"D:\prj\data\point_split.csv")
+    output_dir = r"D:\prj\results\map\fr"
+
+    # Cùng phần huấn luyện với run_all
+    training_points, _ = split_by_points(points, points)
+    frequency_ratio(cube_path, training_points,
+                    os.path.join(output_dir, "flood_susceptibility_FR.tif"),
+                    os.path.join(output_dir, "frequency_ratio_table.csv"))
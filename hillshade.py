@@ -0,0 +1,190 @@
+"""
+Tạo lớp bóng địa hình (hillshade) từ DEM để làm nền bản đồ offline
+
+DEM được đọc trực tiếp ở độ phân giải và hệ tọa độ của bản đồ đầu ra (WarpedVRT),
+xử lý theo từng dải với viền 1 pixel (halo) để không bị đường nối giữa các dải,
+kết quả được cache theo (DEM, extent, kích thước, hướng chiếu sáng).
+"""
+
+import os
+import hashlib
+import numpy as np
+import rasterio
+from rasterio.crs import CRS
+from rasterio.vrt import WarpedVRT
+from rasterio.windows import Window
+from rasterio.transform import from_bounds
+from rasterio.enums import Resampling
+
+DEFAULT_CACHE_DIR = r"D:\prj\hillshade_cache"
+
+_HILLSHADE_CACHE = {}
+
+
+def hillshade_block(dem, dx, dy, azimuth=315.0, altitude=45.0, z_factor=1.0):
+    """
+    Tính hillshade (phương pháp Horn) cho một khối DEM đã có viền 1 pixel
+
+    Args:
+        dem: Mảng DEM (rows+2, cols+2), NaN = không có dữ liệu
+        dx, dy: Kích thước pixel theo x, y (cùng đơn vị với độ cao)
+        azimuth: Hướng nguồn sáng (độ, tính từ Bắc theo chiều kim đồng hồ)
+        altitude: Góc cao nguồn sáng (độ)
+        z_factor: Hệ số phóng đại độ cao
+
+    Returns:
+        Mảng float32 (rows, cols) trong khoảng [0, 1], NaN nếu thiếu dữ liệu
+    """
+    z = dem.astype(np.float32) * z_factor
+    # Các ô lân cận a b c / d e f / g h i
+    a, b, c = z[:-2, :-2], z[:-2, 1:-1], z[:-2, 2:]
+    d, f = z[1:-1, :-2], z[1:-1, 2:]
+    g, h, i = z[2:, :-2], z[2:, 1:-1], z[2:, 2:]
+
+    dzdx = ((c + 2 * f + i) - (a + 2 * d + g)) / (8 * dx)
+    dzdy = ((g + 2 * h + i) - (a + 2 * b + c)) / (8 * dy)
+
+    slope = np.arctan(np.hypot(dzdx, dzdy))
+    aspect = np.arctan2(dzdy, -dzdx)
+
+    zenith = np.radians(90.0 - altitude)
+    azimuth_math = np.radians((360.0 - azimuth + 90.0) % 360.0)
+    shade = (np.cos(zenith) * np.cos(slope) +
+             np.sin(zenith) * np.sin(slope) * np.cos(azimuth_math - aspect))
+    return np.clip(shade, 0, 1).astype(np.float32)
+
+
+def _cache_key(dem_path, extent, crs, out_shape, azimuth, altitude, z_factor):
+    crs_str = crs if isinstance(crs, str) else crs.to_string()
+    text = (f"{os.path.abspath(dem_path)}|{os.path.getmtime(dem_path)}|{crs_str}|{out_shape}|"
+            f"{azimuth}|{altitude}|{z_factor}|" + ",".join(f"{v:.3f}" for v in extent))
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+
+def compute_hillshade(dem_path, extent, crs, out_shape, azimuth=315.0, altitude=45.0, z_factor=1.0,
+                      cache_dir=DEFAULT_CACHE_DIR, block_rows=512):
+    """
+    Hillshade của DEM trên lưới của bản đồ, có cache
+
+    Args:
+        dem_path: Đường dẫn file DEM
+        extent: [left, right, bottom, top] theo crs của bản đồ
+        crs: Hệ tọa độ của bản đồ
+        out_shape: (rows, cols) của lưới đầu ra (độ phân giải vẽ)
+        azimuth, altitude, z_factor: Tham số chiếu sáng
+        cache_dir: Thư mục cache (.npz), None = chỉ cache trong bộ nhớ
+        block_rows: Số hàng mỗi dải xử lý
+
+    Returns:
+        (ảnh uint8 rows x cols, 0 = không có dữ liệu, extent) dùng cho imshow
+    """
+    key = _cache_key(dem_path, extent, crs, tuple(out_shape), azimuth, altitude, z_factor)
+    if key in _HILLSHADE_CACHE:
+        return _HILLSHADE_CACHE[key]
+
+    cache_path = os.path.join(cache_dir, f"hillshade_{key}.npz") if cache_dir else None
+    if cache_path and os.path.exists(cache_path):
+        with np.load(cache_path) as npz:
+            result = (npz['image'], list(npz['extent']))
+        _HILLSHADE_CACHE[key] = result
+        return result
+
+    image = _render_hillshade(dem_path, extent, crs, out_shape, azimuth, altitude, z_factor, block_rows)
+    result = (image, list(extent))
+    if cache_path:
+        os.makedirs(cache_dir, exist_ok=True)
+        np.savez_compressed(cache_path, image=image, extent=np.array(extent, dtype=np.float64))
+    _HILLSHADE_CACHE[key] = result
+    return result
+
+
+def _render_hillshade(dem_path, extent, crs, out_shape, azimuth, altitude, z_factor, block_rows):
+    """Tính ảnh hillshade uint8 theo từng dải (không dùng cache)"""
+    rows, cols = out_shape
+    transform = from_bounds(extent[0], extent[2], extent[1], extent[3], cols, rows)
+    dx = (extent[1] - extent[0]) / cols
+    dy = (extent[3] - extent[2]) / rows
+
+    image = np.zeros((rows, cols), dtype=np.uint8)
+    with rasterio.open(dem_path) as src:
+        crs_str = crs if isinstance(crs, str) else crs.to_string()
+        # Bản đồ theo kinh/vĩ độ: đổi kích thước pixel sang mét
+        if CRS.from_user_input(crs_str).is_geographic:
+            lat = np.radians((extent[2] + extent[3]) / 2)
+            dx *= 111320.0 * np.cos(lat)
+            dy *= 110540.0
+
+        # Đọc DEM trực tiếp ở lưới đầu ra (GDAL dùng overview nếu có)
+        with WarpedVRT(src, crs=crs_str, transform=transform, width=cols, height=rows,
+                       resampling=Resampling.average, src_nodata=src.nodata, nodata=np.nan,
+                       dtype='float32') as vrt:
+            for row_off in range(0, rows, block_rows):
+                height = min(block_rows, rows - row_off)
+                # Viền 1 pixel quanh dải (ngoài ảnh thì điền NaN)
+                r0 = max(row_off - 1, 0)
+                r1 = min(row_off + height + 1, rows)
+                dem = vrt.read(1, window=Window(0, r0, cols, r1 - r0))
+                pad_top, pad_bottom = r0 - (row_off - 1), (row_off + height + 1) - r1
+                dem = np.pad(dem, ((pad_top, pad_bottom), (1, 1)), constant_values=np.nan)
+                # Chỉ hàng/cột nằm ngoài ảnh mới lấy giá trị gần nhất (không mất hàng/cột
+                # ngoài cùng); hàng viền đọc từ dải kề bên giữ nguyên để các dải liền mạch
+                dem = _fill_edges(dem, top=pad_top > 0, bottom=pad_bottom > 0)
+                shade = hillshade_block(dem, dx, dy, azimuth, altitude, z_factor)
+                block = np.where(np.isnan(shade), 0, 1 + shade * 254).astype(np.uint8)
+                image[row_off:row_off + height] = block
+    return image
+
+
+def _fill_edges(dem, top=True, bottom=True):
+    """
+    Thay NaN ở viền ngoài ảnh bằng giá trị pixel bên trong liền kề
+
+    Args:
+        dem: Khối DEM đã có viền 1 pixel
+        top, bottom: Hàng viền trên/dưới nằm ngoài ảnh (False = hàng đọc từ dải kề bên, giữ nguyên)
+    """
+    dem = dem.copy()
+    # Cột viền trái/phải luôn nằm ngoài ảnh (dải đọc đủ chiều rộng)
+    for src_idx, dst_idx in ((1, 0), (-2, -1)):
+        col = dem[:, dst_idx]
+        np.copyto(col, dem[:, src_idx], where=np.isnan(col))
+    for src_idx, dst_idx, outside in ((1, 0, top), (-2, -1, bottom)):
+        if outside:
+            row = dem[dst_idx]
+            np.copyto(row, dem[src_idx], where=np.isnan(row))
+    return dem
+
+
+def check_strip_consistency(dem_path, extent, crs, out_shape, block_rows=(60, 1000), **kwargs):
+    """
+    Kiểm tra kết quả không phụ thuộc số hàng mỗi dải (các dải ghép liền mạch)
+
+    Returns:
+        Số pixel khác nhau lớn nhất so với block_rows[0] (0 = giống hệt)
+    """
+    images = [_render_hillshade(dem_path, extent, crs, out_shape, kwargs.get('azimuth', 315.0),
+                                kwargs.get('altitude', 45.0), kwargs.get('z_factor', 1.0), rows)
+              for rows in block_rows]
+    n_diff = max(int(np.count_nonzero(img != images[0])) for img in images)
+    print(f"{'✓' if n_diff == 0 else '✗'} Hillshade theo dải {list(block_rows)}: {n_diff} pixel khác nhau")
+    return n_diff
+
+
+if __name__ == "__main__":
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    dem_path = r"D:\prj\feature\gialai_dem.tif"
+    output_png = r"D:\prj\feature\gialai_hillshade.png"
+
+    with rasterio.open(dem_path) as ds:
+        extent = [ds.bounds.left, ds.bounds.right, ds.bounds.bottom, ds.bounds.top]
+        crs = ds.crs.to_string()
+
+    # Kết quả phải giống hệt khi đổi số hàng mỗi dải
+    check_strip_consistency(dem_path, extent, crs, (900, 1200), block_rows=(60, 512, 1000))
+
+    image, extent = compute_hillshade(dem_path, extent, crs, (3600, 4800))
+    plt.imsave(output_png, np.ma.masked_equal(image, 0), cmap='gray', vmin=0, vmax=255)
+    print(f"Đã lưu: {output_png}")
@@ -0,0 +1,232 @@
+"""
+Kho mô hình đã huấn luyện, khóa theo loại mô hình + siêu tham số + hash bảng huấn luyện + seed
+
+Cùng một yêu cầu huấn luyện (vd: XGB 813 cây, lr 0.01 trên cùng bảng mẫu) chỉ huấn luyện
+một lần, các lần sau đọc lại file joblib không nén (đọc nhanh). Mỗi mô hình có file JSON
+mô tả đi kèm, dùng để liệt kê và xóa theo tuổi hoặc tổng dung lượng.
+"""
+
+import os
+import json
+import time
+import hashlib
+import numpy as np
+import pandas as pd
+
+from raster_io import FEATURE_NAMES
+from models import MODEL_CONFIGS, SEED, create_model, save_model, load_model
+
+# Tham số không ảnh hưởng tới mô hình sau huấn luyện
+_IGNORED_PARAMS = {'n_jobs'}
+# File tạm (.tmp) cũ hơn số giây này coi là sót lại từ lần ghi bị ngắt
+STALE_TMP_SECONDS = 24 * 3600
+
+
+def hash_table(df, columns):
+    """Hash SHA-256 nội dung các cột (không phụ thuộc index)"""
+    digest = hashlib.sha256()
+    digest.update(json.dumps(list(columns)).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(df[list(columns)], index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def _json_value(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+class ModelStore:
+    """
+    Kho mô hình trên đĩa
+
+    Args:
+        root: Thư mục lưu (<key>.joblib + <key>.json)
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def make_key(self, model, params, data_hash, feature_names, target):
+        """Khóa của yêu cầu huấn luyện và phần mô tả dùng để tạo khóa"""
+        params = {k: _json_value(v) for k, v in sorted(params.items()) if k not in _IGNORED_PARAMS}
+        spec = {
+            'model': model.upper(),
+            'params': params,
+            'seed': params.get('seed', SEED),
+            'data_hash': data_hash,
+            'feature_names': list(feature_names),
+            'target': target,
+        }
+        key = hashlib.sha256(json.dumps(spec, sort_keys=True).encode('utf-8')).hexdigest()[:24]
+        return key, spec
+
+    def _paths(self, key):
+        return os.path.join(self.root, f"{key}.joblib"), os.path.join(self.root, f"{key}.json")
+
+    def get_or_train(self, training, model, optimizer='pso', feature_names=FEATURE_NAMES, target='flood',
+                     data_hash=None, **params):
+        """
+        Trả về artifact (giống models.train_model), chỉ huấn luyện khi chưa có trong kho
+
+        Args:
+            training: Bảng huấn luyện
+            model: 'RF', 'XGB' hoặc 'SVM'
+            optimizer: Bộ tham số gốc trong MODEL_CONFIGS
+            data_hash: Hash bảng huấn luyện tính sẵn (None = tự tính)
+            **params: Tham số ghi đè
+
+        Returns:
+            dict artifact, thêm 'store_key' và 'cache_hit'
+        """
+        model = model.upper()
+        full_params = {**MODEL_CONFIGS[model][optimizer], **params}
+        if data_hash is None:
+            data_hash = hash_table(training, list(feature_names) + [target])
+        key, spec = self.make_key(model, full_params, data_hash, feature_names, target)
+        model_path, meta_path = self._paths(key)
+
+        if os.path.exists(model_path) and os.path.exists(meta_path):
+            start = time.perf_counter()
+            artifact = load_model(model_path)
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+            meta['last_used'] = time.time()
+            meta['hits'] = meta.get('hits', 0) + 1
+            self._write_meta(meta_path, meta)
+            # Cùng siêu tham số có thể đến từ thuật toán tối ưu khác
+            artifact.update(optimizer=optimizer, store_key=key, cache_hit=True)
+            print(f"✓ Dùng lại mô hình {model} [{key}] ({time.perf_counter() - start:.2f}s)")
+            return artifact
+
+        start = time.perf_counter()
+        estimator = create_model(model, optimizer, **params)
+        estimator.fit(training[list(feature_names)].to_numpy(), training[target].to_numpy())
+        train_s = time.perf_counter() - start
+        artifact = {
+            'model': estimator,
+            'model_key': model,
+            'optimizer': optimizer,
+            'feature_names': list(feature_names),
+            'params': full_params,
+        }
+        # Ghi file tạm rồi đổi tên: không bao giờ có .joblib ghi dở ở đường dẫn cuối
+        tmp = f"{model_path}.{os.getpid()}.tmp"
+        save_model(artifact, tmp)
+        os.replace(tmp, model_path)
+        now = time.time()
+        self._write_meta(meta_path, {
+            **spec, 'key': key, 'optimizer': optimizer, 'created': now, 'last_used': now, 'hits': 0,
+            'train_seconds': train_s, 'n_samples': len(training), 'size_bytes': os.path.getsize(model_path),
+        })
+        print(f"✓ Huấn luyện và lưu mô hình {model} [{key}] ({train_s:.1f}s)")
+        return {**artifact, 'store_key': key, 'cache_hit': False}
+
+    def model_path(self, key):
+        """Đường dẫn file joblib của khóa (dùng cho predict_map)"""
+        return self._paths(key)[0]
+
+    @staticmethod
+    def _write_meta(path, meta):
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+
+    def list(self):
+        """
+        Liệt kê các mô hình trong kho
+
+        File .joblib không có .json đi kèm (lần lưu bị ngắt giữa chừng) hoặc ngược lại được
+        liệt kê với orphan = True để evict xóa.
+
+        Returns:
+            DataFrame: key, model, optimizer, params, data_hash, seed, size_mb, created, last_used, hits, orphan
+        """
+        rows = []
+        names = set(os.listdir(self.root))
+        for name in sorted(names):
+            stem, ext = os.path.splitext(name)
+            if ext == '.joblib' and f"{stem}.json" not in names:
+                path = os.path.join(self.root, name)
+                mtime = pd.to_datetime(os.path.getmtime(path), unit='s')
+                rows.append({'key': stem, 'size_mb': os.path.getsize(path) / 1024 ** 2,
+                             'created': mtime, 'last_used': mtime, 'hits': 0, 'orphan': True})
+                continue
+            if ext != '.json':
+                continue
+            with open(os.path.join(self.root, name), encoding='utf-8') as f:
+                meta = json.load(f)
+            rows.append({
+                'key': meta['key'],
+                'model': meta['model'],
+                'optimizer': meta.get('optimizer'),
+                'params': json.dumps(meta['params'], sort_keys=True),
+                'data_hash': meta['data_hash'][:12],
+                'seed': meta['seed'],
+                'size_mb': meta['size_bytes'] / 1024 ** 2,
+                'train_seconds': meta.get('train_seconds'),
+                'created': pd.to_datetime(meta['created'], unit='s'),
+                'last_used': pd.to_datetime(meta['last_used'], unit='s'),
+                'hits': meta.get('hits', 0),
+                'orphan': f"{stem}.joblib" not in names,
+            })
+        columns = ['key', 'model', 'optimizer', 'params', 'data_hash', 'seed', 'size_mb', 'train_seconds',
+                   'created', 'last_used', 'hits', 'orphan']
+        return pd.DataFrame(rows, columns=columns).sort_values('last_used', ascending=False, ignore_index=True)
+
+    def remove(self, key):
+        for path in self._paths(key):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _remove_stale_tmp(self):
+        """Xóa file .tmp sót lại từ các lần ghi bị ngắt"""
+        cutoff = time.time() - STALE_TMP_SECONDS
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name.endswith('.tmp') and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+
+    def evict(self, max_age_days=None, max_size_mb=None):
+        """
+        Xóa mô hình không dùng quá max_age_days ngày, sau đó xóa mô hình lâu không dùng
+        nhất cho tới khi tổng dung lượng <= max_size_mb. File .joblib mồ côi (không có .json)
+        và file .tmp cũ luôn bị xóa.
+
+        Returns:
+            list khóa đã xóa
+        """
+        self._remove_stale_tmp()
+        entries = self.list()
+        orphan = entries['orphan'].astype(bool)
+        removed = entries.loc[orphan, 'key'].tolist()
+        entries = entries[~orphan]
+        if max_age_days is not None:
+            # last_used lưu theo giây epoch (UTC)
+            cutoff = pd.to_datetime(time.time() - max_age_days * 86400, unit='s')
+            old = entries['last_used'] < cutoff
+            removed += entries.loc[old, 'key'].tolist()
+            entries = entries[~old]
+        if max_size_mb is not None:
+            # entries đã sắp xếp dùng gần nhất trước: giữ phần đầu trong giới hạn dung lượng
+            over = entries['size_mb'].cumsum() > max_size_mb
+            removed += entries.loc[over, 'key'].tolist()
+        for key in removed:
+            self.remove(key)
+        if removed:
+            print(f"Đã xóa {len(removed)} mô hình khỏi kho")
+        return removed
+
+
+if __name__ == "__main__":
+    training_data = pd.read_csv(r"D:\prj\data\training_data.csv")
+    store = ModelStore(r"D:\prj\models\store")
+
+    for model in ['RF', 'SVM', 'XGB']:
+        for optimizer in ['pso', 'puma', 'rs']:
+            store.get_or_train(training_data, model, optimizer)
+
+    print(store.list().to_string(index=False))
+    store.evict(max_age_days=30, max_size_mb=2048)
@@ -0,0 +1,122 @@
+"""
+Cấu hình và khởi tạo các mô hình hồi quy giống rf.js, xgb.js, svm.js (scikit-learn)
+
+- RF : smileRandomForest (variablesPerSplit = sqrt, bagFraction 0.5, seed 42)
+- XGB: smileGradientTreeBoost (loss LeastAbsoluteDeviation, samplingRate 0.7 mặc định của smile)
+- SVM: libsvm EPSILON_SVR, kernel RBF, đặc trưng chuẩn hóa z-score
+"""
+
+import os
+import joblib
+from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+from sklearn.svm import SVR
+
+from raster_io import FEATURE_NAMES
+
+SEED = 42
+
+# Thư mục con chứa bản đồ của từng mô hình (giống tao_ban_do / fill_tiff_nulls)
+MODEL_FOLDERS = {'RF': 'rf', 'SVM': 'svr', 'XGB': 'xgb'}
+# Tên mô hình trong tên file bản đồ khi khác khóa mô hình (svm.js xuất flood_susceptibility_SVR)
+MAP_NAMES = {'SVM': 'SVR'}
+
+# Bộ tham số tối ưu theo từng thuật toán (PSO, PUMA, Randomized Search)
+MODEL_CONFIGS = {
+    'RF': {
+        'pso': {'n_trees': 1000},
+        'puma': {'n_trees': 352},
+        'rs': {'n_trees': 62},
+    },
+    'XGB': {
+        'pso': {'n_trees': 1000, 'learning_rate': 0.01},
+        'puma': {'n_trees': 813, 'learning_rate': 0.01},
+        'rs': {'n_trees': 78, 'learning_rate': 0.96},
+    },
+    'SVM': {
+        'pso': {'C': 1.1928841970033406, 'gamma': 0.0787381332672518, 'epsilon': 0.1177825297466713},
+        'puma': {'C': 408.0072353832169, 'gamma': 0.22246591790356623, 'epsilon': 0.01},
+        'rs': {'C': 65.04020246676566, 'gamma': 0.0002359137306347712, 'epsilon': 0.3054603435341466},
+    },
+}
+
+
+def create_model(model, optimizer='pso', **params):
+    """
+    Khởi tạo mô hình với bộ tham số của thuật toán tối ưu
+
+    Args:
+        model: 'RF', 'XGB' hoặc 'SVM'
+        optimizer: 'pso', 'puma' hoặc 'rs'
+        **params: Tham số ghi đè (n_trees, learning_rate, C, gamma, epsilon, ...)
+
+    Returns:
+        Estimator của scikit-learn (chưa huấn luyện)
+    """
+    model = model.upper()
+    config = dict(MODEL_CONFIGS[model][optimizer])
+    config.update(params)
+
+    if model == 'RF':
+        return RandomForestRegressor(
+            n_estimators=int(config['n_trees']),
+            min_samples_leaf=int(config.get('min_leaf_population', 1)),
+            max_features=config.get('max_features', 'sqrt'),
+            max_samples=config.get('bag_fraction', 0.5),
+            random_state=config.get('seed', SEED),
+            n_jobs=config.get('n_jobs', -1),
+        )
+    if model == 'XGB':
+        return GradientBoostingRegressor(
+            loss='absolute_error',
+            n_estimators=int(config['n_trees']),
+            learning_rate=config['learning_rate'],
+            subsample=config.get('subsample', 0.7),
+            max_depth=config.get('max_depth', 20),
+            max_leaf_nodes=config.get('max_nodes'),
+            min_samples_leaf=config.get('min_samples_leaf', 5),
+            random_state=config.get('seed', SEED),
+        )
+    if model == 'SVM':
+        return make_pipeline(
+            StandardScaler(),
+            SVR(kernel='rbf', C=config['C'], gamma=config['gamma'], epsilon=config['epsilon']),
+        )
+    raise ValueError(f"Mô hình không hỗ trợ: {model}")
+
+
+def train_model(training, model, optimizer='pso', feature_names=FEATURE_NAMES, target='flood', **params):
+    """
+    Huấn luyện mô hình trên bảng mẫu (vd: kết quả sample_regions)
+
+    Returns:
+        dict artifact: model, model_key, optimizer, feature_names, params
+    """
+    estimator = create_model(model, optimizer, **params)
+    estimator.fit(training[list(feature_names)].to_numpy(), training[target].to_numpy())
+    return {
+        'model': estimator,
+        'model_key': model.upper(),
+        'optimizer': optimizer,
+        'feature_names': list(feature_names),
+        'params': {**MODEL_CONFIGS[model.upper()][optimizer], **params},
+    }
+
+
+def save_model(artifact, path):
+    """Lưu artifact mô hình (joblib)"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    joblib.dump(artifact, path)
+    return path
+
+
+def load_model(path):
+    """Đọc artifact mô hình đã lưu bằng save_model"""
+    return joblib.load(path)
+
+
+def output_name(optimizer, model):
+    """Tên file bản đồ kết quả, vd: flood_susceptibility_pso_RF.tif, flood_susceptibility_pso_SVR.tif"""
+    model = model.upper()
+    return f"flood_susceptibility_{optimizer}_{MAP_NAMES.get(model, model)}.tif"
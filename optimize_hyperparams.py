@@ -0,0 +1,265 @@
+"""
+Tối ưu siêu tham số cục bộ bằng PSO, PUMA và Randomized Search cho RF, XGB, SVM
+
+Mỗi thế hệ (swarm / quần thể) được đánh giá song song trong process pool,
+cấu hình đã đánh giá được ghi nhớ (memoize) để không huấn luyện lại.
+Kết quả từng vòng lặp (r2, mae, rmse của cấu hình tốt nhất) được ghi ra CSV
+theo đúng định dạng bieudoduong.load_data đọc (vd: pso_rf_convergence.csv).
+"""
+
+import os
+import json
+import time
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+from raster_io import FEATURE_NAMES
+from models import create_model, SEED
+
+# Không gian tìm kiếm: tên tham số -> (min, max, kiểu), kiểu 'int', 'float' hoặc 'log'
+SEARCH_SPACES = {
+    'RF': {
+        'n_trees': (10, 1000, 'int'),
+        'min_leaf_population': (1, 10, 'int'),
+        'bag_fraction': (0.3, 1.0, 'float'),
+    },
+    'XGB': {
+        'n_trees': (10, 1000, 'int'),
+        'learning_rate': (0.01, 1.0, 'log'),
+        'max_depth': (2, 20, 'int'),
+    },
+    'SVM': {
+        'C': (0.01, 1000.0, 'log'),
+        'gamma': (1e-4, 1.0, 'log'),
+        'epsilon': (0.01, 0.5, 'float'),
+    },
+}
+
+# Tên thuật toán trong tên file (khớp với bieudoduong.load_data)
+OPTIMIZERS = ['pso', 'puma', 'rs']
+
+# Dữ liệu huấn luyện/kiểm định của mỗi process
+_DATA = {}
+
+
+def _init_worker(X_train, y_train, X_val, y_val):
+    _DATA.update(X_train=X_train, y_train=y_train, X_val=X_val, y_val=y_val)
+
+
+def decode(position, space):
+    """Đổi vị trí trong khối đơn vị [0, 1]^d thành bộ tham số"""
+    params = {}
+    for u, (name, (low, high, kind)) in zip(np.clip(position, 0, 1), space.items()):
+        if kind == 'log':
+            params[name] = float(np.exp(np.log(low) + u * (np.log(high) - np.log(low))))
+        elif kind == 'int':
+            params[name] = int(round(low + u * (high - low)))
+        else:
+            params[name] = float(low + u * (high - low))
+    return params
+
+
+def config_key(params):
+    """Khóa ghi nhớ: số thực làm tròn 4 chữ số có nghĩa"""
+    return tuple((k, v if isinstance(v, int) else float(f"{v:.4g}")) for k, v in sorted(params.items()))
+
+
+def evaluate(model, params):
+    """Huấn luyện với bộ tham số và tính r2, mae, rmse trên tập kiểm định (chạy trong process)"""
+    start = time.perf_counter()
+    extra = {'n_jobs': 1} if model == 'RF' else {}
+    estimator = create_model(model, 'pso', **params, **extra)
+    estimator.fit(_DATA['X_train'], _DATA['y_train'])
+    pred = np.clip(estimator.predict(_DATA['X_val']), 0, 1)
+    y = _DATA['y_val']
+    residual = y - pred
+    return {
+        'r2': float(1 - np.sum(residual ** 2) / np.sum((y - y.mean()) ** 2)),
+        'mae': float(np.mean(np.abs(residual))),
+        'rmse': float(np.sqrt(np.mean(residual ** 2))),
+        'seconds': time.perf_counter() - start,
+    }
+
+
+class FitnessCache:
+    """Đánh giá song song một thế hệ, bỏ qua các cấu hình đã đánh giá"""
+
+    def __init__(self, executor, model, space):
+        self.executor = executor
+        self.model = model
+        self.space = space
+        self.cache = {}
+        self.hits = 0
+        self.evaluations = 0
+
+    def __call__(self, positions):
+        params_list = [decode(p, self.space) for p in positions]
+        keys = [config_key(p) for p in params_list]
+        pending = {}
+        for key, params in zip(keys, params_list):
+            if key in self.cache or key in pending:
+                self.hits += 1
+            else:
+                pending[key] = self.executor.submit(evaluate, self.model, params)
+        for key, future in pending.items():
+            self.cache[key] = future.result()
+            self.evaluations += 1
+        return params_list, [self.cache[key] for key in keys]
+
+
+def _pso(fitness, dim, population, iterations, rng, w=0.7, c1=1.5, c2=1.5):
+    """Particle Swarm Optimization trên khối đơn vị"""
+    x = rng.random((population, dim))
+    v = rng.uniform(-0.1, 0.1, (population, dim))
+    params, scores = fitness(x)
+    pbest, pbest_r2 = x.copy(), np.array([s['r2'] for s in scores])
+    yield 0, params, scores
+    for it in range(iterations):
+        g = pbest[np.argmax(pbest_r2)]
+        r1, r2 = rng.random((2, population, dim))
+        v = np.clip(w * v + c1 * r1 * (pbest - x) + c2 * r2 * (g - x), -0.25, 0.25)
+        x = np.clip(x + v, 0, 1)
+        params, scores = fitness(x)
+        r2_values = np.array([s['r2'] for s in scores])
+        better = r2_values > pbest_r2
+        pbest[better], pbest_r2[better] = x[better], r2_values[better]
+        yield it + 1, params, scores
+
+
+def _puma(fitness, dim, population, iterations, rng, pf=(0.5, 0.5, 0.3), mega_explore=0.99):
+    """
+    Puma Optimizer (PUMA) rút gọn: mỗi thế hệ chọn pha khám phá hoặc khai thác
+    theo điểm cải thiện tích lũy của từng pha (3 thế hệ đầu chạy luân phiên)
+    """
+    x = rng.random((population, dim))
+    params, scores = fitness(x)
+    fit = np.array([s['r2'] for s in scores])
+    yield 0, params, scores
+    score = {'explore': 0.0, 'exploit': 0.0}
+    for it in range(iterations):
+        best = x[np.argmax(fit)]
+        if it < 3:
+            phase = 'explore' if it % 2 == 0 else 'exploit'
+        else:
+            phase = 'explore' if score['explore'] >= score['exploit'] else 'exploit'
+
+        if phase == 'explore':
+            # Đột biến kiểu DE/rand với lai ghép, đôi khi nhảy ngẫu nhiên toàn cục
+            idx = np.array([rng.choice(np.delete(np.arange(population), i), 5, replace=False)
+                            for i in range(population)])
+            a, b, c, d, e = (x[idx[:, k]] for k in range(5))
+            G = 2 * rng.random((population, 1)) - 1
+            mutant = a + G * (a - b) + G * ((a - b) - (c - d)) + G * ((c - d) - (e - a))
+            cross = rng.random((population, dim)) < pf[0]
+            cross[np.arange(population), rng.integers(0, dim, population)] = True
+            candidate = np.where(cross, mutant, x)
+            jump = rng.random(population) > mega_explore
+            candidate[jump] = rng.random((jump.sum(), dim))
+        else:
+            # Phục kích quanh con mồi tốt nhất với bước đi ngẫu nhiên thu hẹp dần
+            mean = x.mean(axis=0)
+            step = (1 - it / iterations) * rng.normal(0, pf[2], (population, dim))
+            toward = rng.random((population, 1)) < pf[1]
+            candidate = np.where(toward, best + rng.random((population, dim)) * (mean - x) + step,
+                                 best + step)
+        candidate = np.clip(candidate, 0, 1)
+
+        params, scores = fitness(candidate)
+        new_fit = np.array([s['r2'] for s in scores])
+        improved = new_fit > fit
+        score[phase] = 0.5 * score[phase] + float(np.sum(new_fit[improved] - fit[improved]))
+        x[improved], fit[improved] = candidate[improved], new_fit[improved]
+        yield it + 1, params, scores
+
+
+def _random_search(fitness, dim, population, iterations, rng):
+    """Randomized Search: mỗi vòng lặp lấy ngẫu nhiên population cấu hình"""
+    params, scores = fitness(rng.random((population, dim)))
+    yield 0, params, scores
+    for it in range(iterations):
+        params, scores = fitness(rng.random((population, dim)))
+        yield it + 1, params, scores
+
+
+STRATEGIES = {'pso': _pso, 'puma': _puma, 'rs': _random_search}
+
+
+def optimize(training, model, optimizer='pso', output_dir='.', population=20, iterations=100,
+             feature_names=FEATURE_NAMES, target='flood', validation=None, seed=SEED, max_workers=None):
+    """
+    Chạy một thuật toán tối ưu cho một mô hình
+
+    Args:
+        training: Bảng mẫu (vd: kết quả sample_regions)
+        model: 'RF', 'XGB' hoặc 'SVM'
+        optimizer: 'pso', 'puma' hoặc 'rs'
+        output_dir: Thư mục lưu CSV hội tụ và JSON tham số tốt nhất
+        population: Số cá thể mỗi thế hệ (PUMA cần ít nhất 6)
+        iterations: Số vòng lặp
+        validation: Tập kiểm định (None = chia 70/30 từ training theo seed)
+        max_workers: Số process
+
+    Returns:
+        (DataFrame hội tụ, dict tham số tốt nhất)
+    """
+    from sample_regions import split_train_validation
+
+    model = model.upper()
+    space = SEARCH_SPACES[model]
+    if validation is None:
+        training, validation = split_train_validation(training, seed=seed)
+    arrays = (training[list(feature_names)].to_numpy(), training[target].to_numpy(dtype=np.float64),
+              validation[list(feature_names)].to_numpy(), validation[target].to_numpy(dtype=np.float64))
+
+    print(f"{'='*60}")
+    print(f"TỐI ƯU {optimizer.upper()} + {model}: {population} cá thể x {iterations} vòng lặp")
+    print(f"{'='*60}")
+
+    start = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    best = {'r2': -np.inf}
+    history = []
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=arrays) as executor:
+        fitness = FitnessCache(executor, model, space)
+        for iteration, params_list, scores in STRATEGIES[optimizer](fitness, len(space), population,
+                                                                   iterations, rng):
+            for params, score in zip(params_list, scores):
+                if score['r2'] > best['r2']:
+                    best = {**score, 'params': params}
+            history.append({
+                'iteration': iteration,
+                'r2': best['r2'],
+                'mae': best['mae'],
+                'rmse': best['rmse'],
+                'generation_best_r2': max(s['r2'] for s in scores),
+                'evaluations': fitness.evaluations,
+                'cache_hits': fitness.hits,
+            })
+            print(f"  Vòng {iteration:3d}: R²={best['r2']:.4f}  MAE={best['mae']:.4f}  "
+                  f"RMSE={best['rmse']:.4f}  ({fitness.evaluations} lần huấn luyện, "
+                  f"{fitness.hits} lần dùng lại)")
+
+    df = pd.DataFrame(history)
+    os.makedirs(output_dir, exist_ok=True)
+    csv_path = os.path.join(output_dir, f"{optimizer}_{model.lower()}_convergence.csv")
+    df.to_csv(csv_path, index=False)
+    json_path = os.path.join(output_dir, f"{optimizer}_{model.lower()}_best.json")
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump({'model': model, 'optimizer': optimizer, **best}, f, ensure_ascii=False, indent=2)
+
+    print(f"\n✓ Tham số tốt nhất: {best['params']}")
+    print(f"  R²={best['r2']:.4f}, MAE={best['mae']:.4f}, RMSE={best['rmse']:.4f}")
+    print(f"  Thời gian: {time.perf_counter() - start:.1f}s")
+    print(f"Đã lưu: {csv_path}")
+    print(f"Đã lưu: {json_path}")
+    return df, best
+
+
+if __name__ == "__main__":
+    training_data = pd.read_csv(r"D:\prj\data\training_data.csv")
+    results_dir = r"D:\25-26_HKI_DATN_QuanVX\results"
+
+    for model in ['RF', 'SVM', 'XGB']:
+        for optimizer in OPTIMIZERS:
+            optimize(training_data, model, optimizer, results_dir)
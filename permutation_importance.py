@@ -0,0 +1,148 @@
+"""
+Độ quan trọng hoán vị (permutation importance) của 13 yếu tố ảnh hưởng ngập lụt
+
+Với mỗi yếu tố, xáo trộn ngẫu nhiên cột đó trên tập kiểm định rồi đo mức giảm R².
+Mọi cặp (yếu tố, lần lặp) được đánh giá song song trong process pool; mỗi process
+giữ một bộ đệm đặc trưng riêng, chỉ ghi đè một cột rồi khôi phục sau khi dự đoán
+(không sao chép DataFrame cho mỗi lần hoán vị).
+"""
+
+import os
+import time
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+from concurrent.futures import ProcessPoolExecutor
+
+from raster_io import FEATURE_NAMES
+from predict_map import set_single_thread
+
+N_REPEATS = 10
+SEED = 42
+
+# Tên hiển thị của các yếu tố (giống mttuongquan.py)
+FEATURE_LABELS = {
+    'lulc': 'LULC',
+    'Density_River': 'Mật độ sông',
+    'Density_Road': 'Mật độ đường',
+    'Distan2river': 'Khoảng cách sông',
+    'Distan2road_met': 'Khoảng cách đường',
+    'aspect': 'Hướng sườn',
+    'curvature': 'Độ cong',
+    'dem': 'DEM',
+    'flowDir': 'Hướng dòng chảy',
+    'slope': 'Độ dốc',
+    'twi': 'TWI',
+    'NDVI': 'NDVI',
+    'rainfall': 'Lượng mưa',
+}
+
+# Mô hình, dữ liệu gốc và bộ đệm của mỗi process
+_WORKER = {}
+
+
+def _r2(y, pred):
+    return 1 - np.sum((y - pred) ** 2) / np.sum((y - y.mean()) ** 2)
+
+
+def _init_worker(model, X, y):
+    set_single_thread(model)
+    _WORKER.update(model=model, X=X, y=y, buffer=X.copy())
+
+
+def _permuted_r2(feature, seed):
+    """R² khi cột feature bị xáo trộn (chạy trong process riêng)"""
+    X, buffer = _WORKER['X'], _WORKER['buffer']
+    perm = np.random.default_rng(seed).permutation(X.shape[0])
+    buffer[:, feature] = X[perm, feature]
+    try:
+        pred = np.clip(_WORKER['model'].predict(buffer), 0, 1)
+    finally:
+        buffer[:, feature] = X[:, feature]
+    return feature, _r2(_WORKER['y'], pred)
+
+
+def permutation_importance(model, data, feature_names=FEATURE_NAMES, target='flood', n_repeats=N_REPEATS,
+                           seed=SEED, max_workers=None):
+    """
+    Tính mức giảm R² khi hoán vị từng yếu tố
+
+    Args:
+        model: Estimator đã huấn luyện (vd: artifact['model'] của models.train_model)
+        data: Bảng kiểm định (DataFrame có feature_names và target)
+        n_repeats: Số lần hoán vị mỗi yếu tố
+        max_workers: Số process
+
+    Returns:
+        DataFrame: feature, label, r2_drop_mean, r2_drop_std, r2_permuted_mean (sắp xếp giảm dần)
+    """
+    X = data[list(feature_names)].to_numpy(dtype=np.float64)
+    y = data[target].to_numpy(dtype=np.float64)
+    baseline = _r2(y, np.clip(model.predict(X), 0, 1))
+
+    n_features = len(feature_names)
+    seeds = np.random.SeedSequence(seed).spawn(n_features * n_repeats)
+    features = np.repeat(np.arange(n_features), n_repeats)
+
+    print(f"{'='*60}")
+    print(f"PERMUTATION IMPORTANCE: {n_features} yếu tố x {n_repeats} lần, {len(y):,} mẫu")
+    print(f"{'='*60}")
+    print(f"R² gốc: {baseline:.4f}")
+
+    start = time.perf_counter()
+    scores = np.empty((n_features, n_repeats))
+    filled = np.zeros(n_features, dtype=int)
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                             initargs=(model, X, y)) as executor:
+        chunksize = max(1, len(seeds) // (4 * (max_workers or os.cpu_count() or 1)))
+        for feature, r2 in executor.map(_permuted_r2, features.tolist(), seeds, chunksize=chunksize):
+            scores[feature, filled[feature]] = r2
+            filled[feature] += 1
+
+    drops = baseline - scores
+    df = pd.DataFrame({
+        'feature': list(feature_names),
+        'label': [FEATURE_LABELS.get(f, f) for f in feature_names],
+        'r2_drop_mean': drops.mean(axis=1),
+        'r2_drop_std': drops.std(axis=1),
+        'r2_permuted_mean': scores.mean(axis=1),
+    }).sort_values('r2_drop_mean', ascending=False, ignore_index=True)
+    df.attrs['baseline_r2'] = baseline
+
+    for _, row in df.iterrows():
+        print(f"  {row['label']:20s} {row['r2_drop_mean']:8.4f} ± {row['r2_drop_std']:.4f}")
+    print(f"\n✓ Thời gian: {time.perf_counter() - start:.1f}s")
+    return df
+
+
+def plot_importance(df, output_file, title="Permutation Importance"):
+    """Biểu đồ cột ngang mức giảm R² (kèm độ lệch chuẩn)"""
+    df = df.iloc[::-1]
+    fig, ax = plt.subplots(figsize=(10, 8))
+    ax.barh(df['label'], df['r2_drop_mean'], xerr=df['r2_drop_std'], color='#4C72B0',
+            edgecolor='black', linewidth=0.5, capsize=3)
+    ax.axvline(0, color='black', linewidth=0.8)
+    ax.set_xlabel('Mức giảm R²', fontsize=12, fontweight='bold')
+    ax.set_title(title, fontsize=14, fontweight='bold')
+    ax.grid(axis='x', alpha=0.3, linestyle='--')
+    plt.tight_layout()
+    plt.savefig(output_file, dpi=300, bbox_inches='tight')
+    plt.close(fig)
+    print(f"Đã lưu: {output_file}")
+
+
+if __name__ == "__main__":
+    from models import train_model
+    from sample_regions import split_train_validation
+
+    training_data = pd.read_csv(r"D:\prj\data\training_data.csv")
+    output_dir = r"D:\prj\results\importance"
+    os.makedirs(output_dir, exist_ok=True)
+
+    training, validation = split_train_validation(training_data)
+    for model in ['RF', 'SVM', 'XGB']:
+        artifact = train_model(training, model, 'pso')
+        result = permutation_importance(artifact['model'], validation)
+        result.to_csv(os.path.join(output_dir, f"importance_pso_{model}.csv"), index=False)
+        plot_importance(result, os.path.join(output_dir, f"importance_pso_{model}.png"),
+                        f"Permutation Importance - PSO {model}")
@@ -11,6 +11,9 @@ import numpy as np
 import rasterio
 from pathlib import Path
 
+# Cận trên (bao gồm) của ngưỡng 1-4, giá trị > 0.741 thuộc ngưỡng 5
+BREAKS = [0.125, 0.282, 0.475, 0.741]
+
 
 def xu_ly_tiff(duong_dan_dau_vao, duong_dan_dau_ra):
     """
@@ -39,17 +42,13 @@ def xu_ly_tiff(duong_dan_dau_vao, duong_dan_dau_ra):
             no_data_value = src.nodata
             
             if no_data_value is not None:
-                mask = data != no_data_value
+                mask = (data != no_data_value) & (~np.isnan(data))
             else:
                 # Nếu không có NoData, coi giá trị âm hoặc >1 là không hợp lệ
                 mask = (data >= 0) & (data <= 1) & (~np.isnan(data))
             
             # Phân ngưỡng cho các giá trị hợp lệ
-            data_phan_nguong[mask & (data <= 0.125)] = 1
-            data_phan_nguong[mask & (data > 0.125) & (data <= 0.282)] = 2
-            data_phan_nguong[mask & (data > 0.282) & (data <= 0.475)] = 3
-            data_phan_nguong[mask & (data > 0.475) & (data <= 0.741)] = 4
-            data_phan_nguong[mask & (data > 0.741)] = 5
+            data_phan_nguong[mask] = np.digitize(data[mask], BREAKS, right=True) + 1
             
             # Giữ nguyên NoData
             data_phan_nguong[~mask] = 0
@@ -171,11 +170,9 @@ if __name__ == "__main__":
     print(f"File đầu vào: {file_dau_vao}")
     print(f"File đầu ra: {file_dau_ra}")
     print("Phân ngưỡng:")
-    print("  - Ngưỡng 1: 0.000 - 0.125  -> Giá trị 1")
-    print("  - Ngưỡng 2: 0.126 - 0.282  -> Giá trị 2")
-    print("  - Ngưỡng 3: 0.283 - 0.475  -> Giá trị 3")
-    print("  - Ngưỡng 4: 0.476 - 0.741  -> Giá trị 4")
-    print("  - Ngưỡng 5: 0.742 - 1.000  -> Giá trị 5")
+    # Cận dưới hiển thị = cận trên của ngưỡng trước + 0.001 (giống docstring)
+    for i, (low, high) in enumerate(zip([0.0] + [b + 0.001 for b in BREAKS], BREAKS + [1.0]), 1):
+        print(f"  - Ngưỡng {i}: {low:.3f} - {high:.3f}  -> Giá trị {i}")
     print("="*60)
     print()
     
@@ -0,0 +1,157 @@
+"""
+Dự đoán bản đồ nhạy cảm ngập lụt cục bộ (thay cho features.classify + Export.image.toDrive)
+
+Feature cube được chia thành các ô (tile), mỗi process dự đoán cả ô theo lô,
+giới hạn kết quả trong [0, 1] (clamp(0, 1)) rồi process chính ghi vào GeoTIFF dạng tile.
+"""
+
+import os
+import time
+import numpy as np
+import rasterio
+from rasterio.windows import Window
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from feature_cube import open_cube, band_index
+from models import load_model, output_name
+from svr_approx import ApproxSVR
+from tree_predictor import compile_model
+
+TILE_SIZE = 512
+NODATA = -9999.0
+
+# Trạng thái của mỗi process (mô hình chỉ nạp một lần cho mỗi process)
+_WORKER = {}
+
+
+def _init_worker(model_path, cube_path, fast_model=None):
+    artifact = load_model(model_path)
+    if fast_model is not None:
+        artifact['model'] = fast_model
+    set_single_thread(artifact['model'])
+    cube, meta = open_cube(cube_path)
+    _WORKER.update(artifact=artifact, cube=cube, bands=band_index(meta, artifact['feature_names']))
+
+
+def set_single_thread(estimator):
+    """Mỗi process đã là một luồng song song: tắt n_jobs bên trong mô hình"""
+    steps = estimator.steps if hasattr(estimator, 'steps') else [(None, estimator)]
+    for _, step in steps:
+        if hasattr(step, 'n_jobs'):
+            step.n_jobs = 1
+
+
+def predict_block(model, X):
+    """Dự đoán một lô pixel (n, bands), NaN ở bất kỳ band nào -> NoData, kết quả clamp(0, 1)"""
+    out = np.full(X.shape[0], np.nan, dtype=np.float32)
+    valid = np.isfinite(X).all(axis=1)
+    if valid.any():
+        out[valid] = np.clip(model.predict(X[valid]), 0, 1)
+    return out
+
+
+def _predict_tile(row_off, col_off, height, width):
+    """Dự đoán một ô của cube (chạy trong process riêng)"""
+    cube = _WORKER['cube']
+    tile = cube[row_off:row_off + height, col_off:col_off + width]
+    X = np.asarray(tile[:, :, _WORKER['bands']], dtype=np.float32).reshape(-1, len(_WORKER['bands']))
+    pred = predict_block(_WORKER['artifact']['model'], X)
+    n_valid = int(np.isfinite(pred).sum())
+    pred[np.isnan(pred)] = NODATA
+    return row_off, col_off, pred.reshape(height, width), n_valid
+
+
+def iter_tiles(height, width, tile_size=TILE_SIZE):
+    """Các ô (row_off, col_off, height, width) phủ toàn bộ ảnh"""
+    for row_off in range(0, height, tile_size):
+        for col_off in range(0, width, tile_size):
+            yield row_off, col_off, min(tile_size, height - row_off), min(tile_size, width - col_off)
+
+
+def predict_map(model_path, cube_path, output_tif=None, output_dir=None, tile_size=TILE_SIZE, max_workers=None,
+                svr_components=None, svr_method='nystroem', compile_trees=False):
+    """
+    Dự đoán toàn bộ vùng nghiên cứu bằng mô hình đã huấn luyện
+
+    Args:
+        model_path: File mô hình (models.save_model)
+        cube_path: File feature cube (feature_cube.build_feature_cube)
+        output_tif: File GeoTIFF đầu ra (None = output_dir/flood_susceptibility_<opt>_<MODEL>.tif)
+        output_dir: Thư mục lưu khi không chỉ định output_tif
+        tile_size: Kích thước ô dự đoán (cũng là kích thước block của GeoTIFF)
+        max_workers: Số process (mặc định = số CPU)
+        svr_components: Với mô hình SVM, số thành phần của bản xấp xỉ kernel (svr_approx),
+            None = dùng SVR gốc
+        svr_method: 'nystroem' hoặc 'rff'
+        compile_trees: Với mô hình RF/XGB, dự đoán bằng tree_predictor.CompiledEnsemble
+            (kết quả giống hệt, xem tree_predictor.benchmark để so sánh tốc độ)
+
+    Returns:
+        dict: output, seconds, pixels, valid_pixels, mp_per_s, mp_per_s_per_core
+    """
+    artifact = load_model(model_path)
+    _, meta = open_cube(cube_path)
+    height, width = meta['shape'][:2]
+    if output_tif is None:
+        output_tif = os.path.join(output_dir, output_name(artifact['optimizer'], artifact['model_key']))
+    os.makedirs(os.path.dirname(os.path.abspath(output_tif)), exist_ok=True)
+    max_workers = max_workers or os.cpu_count() or 1
+
+    print(f"{'='*60}")
+    print(f"DỰ ĐOÁN {artifact['optimizer'].upper()} + {artifact['model_key']}: {height} x {width} pixel")
+    print(f"{'='*60}")
+
+    # Dựng bản xấp xỉ SVR / cây mảng phẳng một lần rồi gửi cho các process
+    fast_model = None
+    if svr_components and artifact['model_key'] == 'SVM':
+        fast_model = ApproxSVR(artifact['model'], svr_components, svr_method)
+        print(f"Dùng SVR xấp xỉ {svr_method}: {fast_model.n_components} thành phần "
+              f"thay cho {fast_model.n_support} vector hỗ trợ")
+    elif compile_trees and artifact['model_key'] in ('RF', 'XGB'):
+        fast_model = compile_model(artifact['model'])
+        print(f"Dùng cây mảng phẳng: {fast_model.n_trees} cây, {fast_model.n_nodes:,} nút")
+
+    profile = {
+        'driver': 'GTiff', 'height': height, 'width': width, 'count': 1, 'dtype': 'float32',
+        'crs': meta['crs'], 'transform': rasterio.Affine(*meta['transform'][:6]), 'nodata': NODATA,
+        'tiled': True, 'blockxsize': tile_size, 'blockysize': tile_size, 'compress': 'lzw',
+        'BIGTIFF': 'IF_SAFER',
+    }
+
+    start = time.perf_counter()
+    tiles = list(iter_tiles(height, width, tile_size))
+    valid_pixels = 0
+    with rasterio.open(output_tif, 'w', **profile) as dst, \
+            ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                initargs=(model_path, cube_path, fast_model)) as executor:
+        futures = [executor.submit(_predict_tile, *tile) for tile in tiles]
+        for i, future in enumerate(as_completed(futures), 1):
+            row_off, col_off, pred, n_valid = future.result()
+            dst.write(pred, 1, window=Window(col_off, row_off, pred.shape[1], pred.shape[0]))
+            valid_pixels += n_valid
+            print(f"  {i}/{len(tiles)} ô", end='\r')
+
+    seconds = time.perf_counter() - start
+    pixels = height * width
+    mp_per_s = pixels / 1e6 / seconds
+    result = {
+        'output': output_tif,
+        'seconds': seconds,
+        'pixels': pixels,
+        'valid_pixels': valid_pixels,
+        'workers': max_workers,
+        'mp_per_s': mp_per_s,
+        'mp_per_s_per_core': mp_per_s / max_workers,
+    }
+    print(f"\n✓ Đã lưu: {output_tif}")
+    print(f"Thời gian: {seconds:.1f}s, {valid_pixels:,}/{pixels:,} pixel hợp lệ")
+    print(f"Tốc độ: {mp_per_s:.2f} MP/s, {result['mp_per_s_per_core']:.3f} MP/s/core ({max_workers} process)")
+    return result
+
+
+if __name__ == "__main__":
+    cube_path = r"D:\prj\feature\feature_cube.bin"
+    model_path = r"D:\prj\models\pso_RF.joblib"
+    output_dir = r"D:\prj\results\map\rf"
+
+    predict_map(model_path, cube_path, output_dir=output_dir)
@@ -0,0 +1,98 @@
+"""
+Các hàm dùng chung để đọc ảnh TIFF theo khối (block streaming)
+và tìm các lớp dữ liệu đặc trưng (feature) trong thư mục
+"""
+
+import os
+import numpy as np
+from rasterio.windows import Window
+
+# 13 lớp đặc trưng dùng cho huấn luyện (giống featureNames trong rf.js, xgb.js, svm.js)
+FEATURE_NAMES = [
+    'lulc', 'Density_River', 'Density_Road', 'Distan2river', 'Distan2road_met',
+    'aspect', 'curvature', 'dem', 'flowDir', 'slope', 'twi', 'NDVI', 'rainfall'
+]
+
+# Các lớp dạng phân loại (lấy mẫu lại bằng nearest thay vì bilinear)
+CATEGORICAL_FEATURES = ['lulc', 'flowDir']
+
+
+def list_tiff_files(folder):
+    """Trả về danh sách file .tif/.tiff (bỏ qua .aux.xml) trong thư mục, đã sắp xếp"""
+    files = []
+    for file in sorted(os.listdir(folder)):
+        if (file.endswith('.tif') or file.endswith('.tiff')) and not file.endswith('.aux.xml'):
+            files.append(os.path.join(folder, file))
+    return files
+
+
+def find_feature_files(feature_dir, feature_names=FEATURE_NAMES):
+    """
+    Tìm file TIFF tương ứng với từng lớp đặc trưng trong thư mục
+
+    Tên lớp được so khớp không phân biệt hoa thường với tên file
+    (vd: 'curvature' -> gialai_curvature.tif, 'rainfall' -> rainfall_30m.tif).
+    Nếu nhiều file cùng khớp, chọn file có tên ngắn nhất.
+
+    Args:
+        feature_dir: Thư mục chứa các file đặc trưng
+        feature_names: Danh sách tên lớp cần tìm
+
+    Returns:
+        dict {tên lớp: đường dẫn file}, các lớp không tìm thấy sẽ không có trong dict
+    """
+    tiff_files = list_tiff_files(feature_dir)
+    found = {}
+    for name in feature_names:
+        matches = [f for f in tiff_files if name.lower() in os.path.basename(f).lower()]
+        if matches:
+            found[name] = min(matches, key=lambda f: len(os.path.basename(f)))
+    return found
+
+
+def valid_mask(data, nodata):
+    """Mask các pixel hợp lệ (không phải NaN và không phải NoData)"""
+    if np.issubdtype(data.dtype, np.floating):
+        mask = ~np.isnan(data)
+    else:
+        mask = np.ones(data.shape, dtype=bool)
+    if nodata is not None and not np.isnan(nodata):
+        mask &= data != nodata
+    return mask
+
+
+def iter_windows(ds, target_pixels=4_000_000, align_rows=1):
+    """
+    Chia ảnh thành các dải hàng (window) khớp với kích thước block của file
+
+    Mỗi dải có chiều cao là bội số của chiều cao block và khoảng
+    target_pixels pixel, để mỗi block trong file chỉ được giải nén một lần.
+
+    Args:
+        ds: rasterio dataset đang mở
+        target_pixels: Số pixel mong muốn trong mỗi window
+        align_rows: Chiều cao dải đồng thời là bội số của số này (vd: blockysize của
+            file đầu ra, để mỗi tile đầu ra chỉ được ghi và nén một lần)
+
+    Yields:
+        rasterio.windows.Window
+    """
+    block_h = int(np.lcm(ds.block_shapes[0][0], align_rows))
+    rows = max(block_h, (target_pixels // max(ds.width, 1)) // block_h * block_h)
+    for row_off in range(0, ds.height, rows):
+        yield Window(0, row_off, ds.width, min(rows, ds.height - row_off))
+
+
+def hist_percentiles(hist, edges, percentiles):
+    """Nội suy phân vị từ histogram (sai số tối đa bằng độ rộng một bin)"""
+    cdf = np.cumsum(hist, dtype=np.float64)
+    total = cdf[-1]
+    values = []
+    for p in percentiles:
+        target = total * p / 100.0
+        i = int(np.searchsorted(cdf, target))
+        i = min(i, len(hist) - 1)
+        prev = cdf[i - 1] if i > 0 else 0.0
+        frac = (target - prev) / hist[i] if hist[i] > 0 else 0.0
+        values.append(edges[i] + frac * (edges[i + 1] - edges[i]))
+    return values
@@ -0,0 +1,191 @@
+"""
+Đường cong success rate, prediction rate và ROC trên toàn bản đồ cho 9 mô hình
+
+- Success rate   : % diện tích (xếp theo độ nhạy cảm giảm dần) vs % điểm lũ huấn luyện bắt được
+- Prediction rate: như trên với điểm lũ kiểm định
+- ROC            : điểm lũ (flood = 1) vs điểm không lũ (flood = 0) của tập kiểm định
+
+Mỗi bản đồ được đọc một lượt theo dải block: vừa cộng histogram mịn (N_BINS bin trên [0, 1])
+vừa lấy giá trị tại các điểm nằm trong dải (tra chỉ số vector hóa). Các bản đồ chạy song song.
+"""
+
+import os
+import time
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+import rasterio
+from rasterio.warp import transform as transform_coords
+from concurrent.futures import ProcessPoolExecutor
+
+from raster_io import valid_mask, iter_windows
+from ensemble_maps import find_maps
+
+N_BINS = 1000
+
+plt.rcParams['font.family'] = 'DejaVu Sans'
+plt.rcParams['axes.unicode_minus'] = False
+
+
+def _map_key(path):
+    """(optimizer, MODEL) từ tên flood_susceptibility_<opt>_<MODEL>.tif"""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    opt, model = stem.split('_')[-2:]
+    return opt, model
+
+
+def scan_map(path, lon, lat, n_bins=N_BINS):
+    """
+    Histogram toàn bản đồ và giá trị tại các điểm trong một lượt đọc
+
+    Args:
+        path: File bản đồ nhạy cảm (giá trị 0-1)
+        lon, lat: Tọa độ điểm (EPSG:4326)
+
+    Returns:
+        (histogram (n_bins,), giá trị tại điểm - NaN nếu ngoài ảnh hoặc NoData)
+    """
+    hist = np.zeros(n_bins, dtype=np.int64)
+    values = np.full(len(lon), np.nan)
+    with rasterio.open(path) as src:
+        if src.crs and not src.crs.is_geographic:
+            xs, ys = (np.asarray(v) for v in transform_coords('EPSG:4326', src.crs, lon, lat))
+        else:
+            xs, ys = np.asarray(lon), np.asarray(lat)
+        cols, rows = ~src.transform * (xs, ys)
+        rows, cols = np.floor(rows).astype(np.int64), np.floor(cols).astype(np.int64)
+        inside = (rows >= 0) & (rows < src.height) & (cols >= 0) & (cols < src.width)
+
+        for window in iter_windows(src):
+            data = src.read(1, window=window)
+            mask = valid_mask(data, src.nodata)
+            bins = np.clip((data[mask] * n_bins).astype(np.int64), 0, n_bins - 1)
+            hist += np.bincount(bins, minlength=n_bins)
+
+            row_off = int(window.row_off)
+            in_window = inside & (rows >= row_off) & (rows < row_off + int(window.height))
+            r, c = rows[in_window] - row_off, cols[in_window]
+            values[in_window] = np.where(mask[r, c], data[r, c], np.nan)
+    return hist, values
+
+
+def rate_curve(hist, point_values, n_bins=N_BINS):
+    """
+    Đường cong tỷ lệ: ngưỡng giảm dần từ 1 về 0
+
+    Returns:
+        (thresholds, % diện tích tích lũy, % điểm tích lũy, AUC)
+    """
+    point_values = point_values[np.isfinite(point_values)]
+    point_hist = np.bincount(np.clip((point_values * n_bins).astype(np.int64), 0, n_bins - 1),
+                             minlength=n_bins)
+    thresholds = np.arange(n_bins, -1, -1) / n_bins
+    area = np.concatenate([[0], np.cumsum(hist[::-1])]) / max(hist.sum(), 1)
+    captured = np.concatenate([[0], np.cumsum(point_hist[::-1])]) / max(point_hist.sum(), 1)
+    return thresholds, area, captured, float(np.sum(np.diff(area) * (captured[1:] + captured[:-1]) / 2))
+
+
+def _scan_task(path, lon, lat, n_bins):
+    return path, *scan_map(path, lon, lat, n_bins)
+
+
+def compute_curves(map_paths, training_points, validation_points, n_bins=N_BINS, max_workers=None):
+    """
+    Tính success rate, prediction rate, ROC và AUC cho tất cả bản đồ
+
+    Args:
+        map_paths: Danh sách bản đồ flood_susceptibility_<opt>_<MODEL>.tif
+        training_points, validation_points: DataFrame điểm (lon, lat, flood)
+        max_workers: Số process (mỗi process một bản đồ)
+
+    Returns:
+        (DataFrame đường cong: optimizer, model, curve, threshold, x, y;
+         DataFrame AUC: optimizer, model, success_auc, prediction_auc, roc_auc)
+    """
+    train_flood = training_points['flood'].to_numpy() == 1
+    val_flood = validation_points['flood'].to_numpy() == 1
+    lon = np.concatenate([training_points['lon'].to_numpy(), validation_points['lon'].to_numpy()])
+    lat = np.concatenate([training_points['lat'].to_numpy(), validation_points['lat'].to_numpy()])
+    n_train = len(training_points)
+
+    print(f"{'='*60}")
+    print(f"ĐƯỜNG CONG SUCCESS / PREDICTION RATE: {len(map_paths)} bản đồ")
+    print(f"{'='*60}")
+    start = time.perf_counter()
+
+    curves, summary = [], []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_scan_task, path, lon, lat, n_bins) for path in map_paths]
+        for future in futures:
+            path, hist, values = future.result()
+            opt, model = _map_key(path)
+            train_values, val_values = values[:n_train], values[n_train:]
+
+            result = {'optimizer': opt, 'model': model}
+            for curve, point_values in (('success', train_values[train_flood]),
+                                        ('prediction', val_values[val_flood])):
+                thresholds, x, y, auc = rate_curve(hist, point_values, n_bins)
+                result[f'{curve}_auc'] = auc
+                curves.append(pd.DataFrame({'optimizer': opt, 'model': model, 'curve': curve,
+                                            'threshold': thresholds, 'x': x, 'y': y}))
+
+            # ROC: histogram điểm không lũ đóng vai trò "diện tích"
+            negatives = val_values[~val_flood]
+            negatives = negatives[np.isfinite(negatives)]
+            neg_hist = np.bincount(np.clip((negatives * n_bins).astype(np.int64), 0, n_bins - 1),
+                                   minlength=n_bins)
+            thresholds, fpr, tpr, auc = rate_curve(neg_hist, val_values[val_flood], n_bins)
+            result['roc_auc'] = auc if negatives.size else np.nan
+            curves.append(pd.DataFrame({'optimizer': opt, 'model': model, 'curve': 'roc',
+                                        'threshold': thresholds, 'x': fpr, 'y': tpr}))
+            result['n_missing_points'] = int(np.isnan(values).sum())
+            summary.append(result)
+            print(f"  {opt.upper():4s} + {model:3s}: success AUC={result['success_auc']:.4f}  "
+                  f"prediction AUC={result['prediction_auc']:.4f}  ROC AUC={result['roc_auc']:.4f}")
+
+    print(f"✓ Thời gian: {time.perf_counter() - start:.1f}s")
+    return pd.concat(curves, ignore_index=True), pd.DataFrame(summary)
+
+
+def plot_curves(curves, summary, output_file):
+    """Vẽ 3 biểu đồ (success rate, prediction rate, ROC) cho tất cả mô hình"""
+    titles = {
+        'success': ('Success Rate Curve', '% diện tích (nhạy cảm giảm dần)', '% điểm lũ huấn luyện'),
+        'prediction': ('Prediction Rate Curve', '% diện tích (nhạy cảm giảm dần)', '% điểm lũ kiểm định'),
+        'roc': ('ROC Curve', 'False Positive Rate', 'True Positive Rate'),
+    }
+    fig, axes = plt.subplots(1, 3, figsize=(18, 6))
+    for ax, (curve, (title, xlabel, ylabel)) in zip(axes, titles.items()):
+        for (opt, model), group in curves[curves['curve'] == curve].groupby(['optimizer', 'model'], sort=False):
+            row = summary[(summary['optimizer'] == opt) & (summary['model'] == model)].iloc[0]
+            auc = row['roc_auc'] if curve == 'roc' else row[f'{curve}_auc']
+            ax.plot(group['x'], group['y'], linewidth=1.5, label=f"{opt.upper()}_{model} (AUC={auc:.3f})")
+        ax.plot([0, 1], [0, 1], color='gray', linestyle='--', linewidth=1)
+        ax.set_title(title, fontsize=14, fontweight='bold')
+        ax.set_xlabel(xlabel, fontsize=12)
+        ax.set_ylabel(ylabel, fontsize=12)
+        ax.set_xlim(0, 1)
+        ax.set_ylim(0, 1)
+        ax.grid(alpha=0.3, linestyle='--')
+        ax.legend(fontsize=8, loc='lower right')
+    plt.tight_layout()
+    plt.savefig(output_file, dpi=300, bbox_inches='tight', facecolor='white')
+    plt.close(fig)
+    print(f"Đã lưu: {output_file}")
+
+
+if __name__ == "__main__":
+    from sample_regions import load_point_split, split_by_points
+
+    map_dir = r"D:\prj\results\map"
+    output_dir = r"D:\prj\results\curves"
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Cùng bảng chia điểm mà run_all dùng khi huấn luyện
+    points = load_point_split(r"D:\prj\data\flood_points.csv", r"D:\prj\data\point_split.csv")
+    training_points, validation_points = split_by_points(points, points)
+
+    curves, summary = compute_curves(find_maps(map_dir), training_points, validation_points)
+    curves.to_csv(os.path.join(output_dir, 'rate_curves.csv'), index=False)
+    summary.to_csv(os.path.join(output_dir, 'rate_curves_auc.csv'), index=False)
+    plot_curves(curves, summary, os.path.join(output_dir, 'rate_curves.png'))
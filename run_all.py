@@ -0,0 +1,240 @@
+"""
+Chạy trọn bộ 3 thuật toán tối ưu x 3 mô hình (PSO/PUMA/RS x RF/SVM/XGB) trong một lần
+
+Thay cho việc bỏ comment từng khối tham số trong rf.js, xgb.js, svm.js:
+1. Lấy mẫu vùng đệm một lần (sample_regions) và chia 70/30 theo điểm (point_split.csv)
+2. Huấn luyện song song 9 cấu hình (qua ModelStore, cấu hình đã có thì dùng lại)
+3. Dự đoán cả 9 bản đồ trong một lượt duyệt tile: mỗi tile của feature cube chỉ đọc
+   một lần rồi đưa qua 9 mô hình
+Bản đồ được lưu theo mẫu <output_dir>/<rf|svr|xgb>/flood_susceptibility_<opt>_<MODEL>.tif,
+bảng kiểm định theo validation_<opt>_<MODEL>.csv.
+"""
+
+import os
+import sys
+import json
+import time
+import numpy as np
+import pandas as pd
+import rasterio
+from rasterio.windows import Window
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from raster_io import FEATURE_NAMES
+from feature_cube import open_cube, band_index
+from models import MODEL_CONFIGS, MODEL_FOLDERS, load_model, output_name
+from model_store import ModelStore, hash_table
+from predict_map import predict_block, iter_tiles, set_single_thread, TILE_SIZE, NODATA
+from sample_regions import sample_regions, load_point_split, split_by_points
+from svr_approx import ApproxSVR
+
+DEFAULT_CONFIG = {
+    'points_csv': r"D:\prj\data\flood_points.csv",
+    # Bảng chia điểm huấn luyện/kiểm định dùng chung với frequency_ratio và rate_curves
+    'split_csv': r"D:\prj\data\point_split.csv",
+    'cube_path': r"D:\prj\feature\feature_cube.bin",
+    'store_dir': r"D:\prj\models\store",
+    'output_dir': r"D:\prj\results\map",
+    'validation_dir': r"D:\prj\results\validate",
+    'optimizers': ['pso', 'puma', 'rs'],
+    'models': ['RF', 'SVM', 'XGB'],
+    # Tham số ghi đè theo "<opt>_<MODEL>", vd: {"puma_XGB": {"n_trees": 900}}
+    'params': {},
+    'feature_names': FEATURE_NAMES,
+    'tile_size': TILE_SIZE,
+    # Số thành phần SVR xấp xỉ khi dự đoán bản đồ (None = SVR gốc)
+    'svr_components': None,
+    'max_workers': None,
+}
+
+# Trạng thái của mỗi process (huấn luyện hoặc dự đoán)
+_WORKER = {}
+
+
+def load_config(path=None, **overrides):
+    """Cấu hình mặc định, ghi đè bằng file JSON (nếu có) và tham số"""
+    config = dict(DEFAULT_CONFIG)
+    if path:
+        with open(path, encoding='utf-8') as f:
+            config.update(json.load(f))
+    config.update(overrides)
+    return config
+
+
+def _init_train_worker(training, store_dir, data_hash, feature_names):
+    _WORKER.update(training=training, store=ModelStore(store_dir), data_hash=data_hash,
+                   feature_names=feature_names)
+
+
+def _train_one(model, optimizer, params):
+    """Huấn luyện (hoặc lấy từ kho) một cấu hình, trả về đường dẫn mô hình"""
+    extra = {'n_jobs': 1} if model == 'RF' else {}
+    artifact = _WORKER['store'].get_or_train(_WORKER['training'], model, optimizer, _WORKER['feature_names'],
+                                             data_hash=_WORKER['data_hash'], **{**params, **extra})
+    return model, optimizer, _WORKER['store'].model_path(artifact['store_key']), artifact['cache_hit']
+
+
+def train_all(training, config):
+    """
+    Huấn luyện song song mọi cặp (optimizer, model) trong config
+
+    Các cặp có cùng khóa trong kho (vd: cùng tham số ghi đè cho hai thuật toán) chỉ
+    huấn luyện một lần và dùng chung file mô hình.
+
+    Returns:
+        dict (optimizer, model) -> đường dẫn mô hình trong kho
+    """
+    feature_names = list(config['feature_names'])
+    data_hash = hash_table(training, feature_names + ['flood'])
+    store = ModelStore(config['store_dir'])
+    jobs = {}
+    for opt in config['optimizers']:
+        for model in config['models']:
+            params = config['params'].get(f"{opt}_{model}", {})
+            key, _ = store.make_key(model, {**MODEL_CONFIGS[model][opt], **params}, data_hash,
+                                    feature_names, 'flood')
+            jobs.setdefault(key, []).append((model, opt, params))
+
+    n_configs = sum(len(group) for group in jobs.values())
+    print(f"{'='*60}")
+    print(f"HUẤN LUYỆN {n_configs} CẤU HÌNH ({len(jobs)} mô hình khác nhau)")
+    print(f"{'='*60}")
+    start = time.perf_counter()
+    paths = {}
+    with ProcessPoolExecutor(max_workers=config['max_workers'], initializer=_init_train_worker,
+                             initargs=(training, config['store_dir'], data_hash, feature_names)) as executor:
+        futures = {executor.submit(_train_one, *group[0]): group for group in jobs.values()}
+        for future in as_completed(futures):
+            _, _, path, hit = future.result()
+            for model, opt, _ in futures[future]:
+                paths[(opt, model)] = path
+                print(f"  {'↺' if hit else '✓'} {opt.upper()} + {model}")
+    print(f"Thời gian huấn luyện: {time.perf_counter() - start:.1f}s")
+    return paths
+
+
+def export_validation(model_paths, validation, validation_dir):
+    """Ghi validation_<opt>_<MODEL>.csv (flood, prediction, lat, lon) giống Export.table của .js"""
+    os.makedirs(validation_dir, exist_ok=True)
+    for (opt, model), path in model_paths.items():
+        artifact = load_model(path)
+        X = validation[artifact['feature_names']].to_numpy()
+        df = validation[['flood', 'lat', 'lon']].copy()
+        df.insert(1, 'prediction', np.clip(artifact['model'].predict(X), 0, 1))
+        df.to_csv(os.path.join(validation_dir, f"validation_{opt}_{model}.csv"), index=False)
+    print(f"✓ Đã lưu {len(model_paths)} bảng kiểm định vào: {validation_dir}")
+
+
+def _init_predict_worker(model_paths, cube_path, fast_models):
+    cube, meta = open_cube(cube_path)
+    models = {}
+    for key, path in model_paths.items():
+        artifact = load_model(path)
+        estimator = fast_models.get(key, artifact['model'])
+        set_single_thread(estimator)
+        models[key] = (estimator, artifact['feature_names'])
+    # Đọc hợp các band cần dùng một lần, mỗi mô hình lấy các cột của mình
+    bands = sorted({b for _, names in models.values() for b in band_index(meta, names)})
+    columns = {key: [bands.index(b) for b in band_index(meta, names)] for key, (_, names) in models.items()}
+    _WORKER.update(cube=cube, models=models, bands=bands, columns=columns)
+
+
+def _predict_tile_all(row_off, col_off, height, width):
+    """Đọc một tile và dự đoán bằng tất cả mô hình (chạy trong process riêng)"""
+    tile = _WORKER['cube'][row_off:row_off + height, col_off:col_off + width]
+    X = np.asarray(tile[:, :, _WORKER['bands']], dtype=np.float32).reshape(-1, len(_WORKER['bands']))
+    results = {}
+    for key, (estimator, _) in _WORKER['models'].items():
+        pred = predict_block(estimator, X[:, _WORKER['columns'][key]])
+        pred[np.isnan(pred)] = NODATA
+        results[key] = pred.reshape(height, width)
+    return row_off, col_off, results
+
+
+def predict_all(model_paths, config):
+    """
+    Dự đoán mọi bản đồ trong một lượt duyệt tile của feature cube
+
+    Returns:
+        dict (optimizer, model) -> đường dẫn GeoTIFF
+    """
+    _, meta = open_cube(config['cube_path'])
+    height, width = meta['shape'][:2]
+    tile_size = config['tile_size']
+
+    fast_models = {}
+    if config['svr_components']:
+        for key, path in model_paths.items():
+            if key[1] == 'SVM':
+                fast_models[key] = ApproxSVR(load_model(path)['model'], config['svr_components'])
+
+    profile = {
+        'driver': 'GTiff', 'height': height, 'width': width, 'count': 1, 'dtype': 'float32',
+        'crs': meta['crs'], 'transform': rasterio.Affine(*meta['transform'][:6]), 'nodata': NODATA,
+        'tiled': True, 'blockxsize': tile_size, 'blockysize': tile_size, 'compress': 'lzw',
+        'BIGTIFF': 'IF_SAFER',
+    }
+    outputs = {}
+    for opt, model in model_paths:
+        folder = os.path.join(config['output_dir'], MODEL_FOLDERS[model])
+        os.makedirs(folder, exist_ok=True)
+        outputs[(opt, model)] = os.path.join(folder, output_name(opt, model))
+
+    print(f"{'='*60}")
+    print(f"DỰ ĐOÁN {len(model_paths)} BẢN ĐỒ: {height} x {width} pixel")
+    print(f"{'='*60}")
+    start = time.perf_counter()
+    tiles = list(iter_tiles(height, width, tile_size))
+    destinations = {key: rasterio.open(path, 'w', **profile) for key, path in outputs.items()}
+    try:
+        with ProcessPoolExecutor(max_workers=config['max_workers'], initializer=_init_predict_worker,
+                                 initargs=(model_paths, config['cube_path'], fast_models)) as executor:
+            futures = [executor.submit(_predict_tile_all, *tile) for tile in tiles]
+            for i, future in enumerate(as_completed(futures), 1):
+                row_off, col_off, results = future.result()
+                for key, pred in results.items():
+                    window = Window(col_off, row_off, pred.shape[1], pred.shape[0])
+                    destinations[key].write(pred, 1, window=window)
+                print(f"  {i}/{len(tiles)} ô", end='\r')
+    finally:
+        for dst in destinations.values():
+            dst.close()
+
+    seconds = time.perf_counter() - start
+    print(f"\n✓ Thời gian dự đoán: {seconds:.1f}s "
+          f"({height * width * len(outputs) / 1e6 / seconds:.2f} MP/s tính trên cả {len(outputs)} mô hình)")
+    for path in outputs.values():
+        print(f"Đã lưu: {path}")
+    return outputs
+
+
+def run_all(config):
+    """
+    Lấy mẫu, huấn luyện và dự đoán toàn bộ cấu hình
+
+    Args:
+        config: dict giống DEFAULT_CONFIG (xem load_config)
+
+    Returns:
+        dict (optimizer, model) -> đường dẫn bản đồ
+    """
+    start = time.perf_counter()
+    samples = sample_regions(config['points_csv'], config['cube_path'], config['feature_names'])
+    split = load_point_split(config['points_csv'], config['split_csv'])
+    training, validation = split_by_points(samples, split)
+    print(f"Huấn luyện: {len(training):,} mẫu, kiểm định: {len(validation):,} mẫu")
+
+    model_paths = train_all(training, config)
+    if config.get('validation_dir'):
+        export_validation(model_paths, validation, config['validation_dir'])
+    outputs = predict_all(model_paths, config)
+
+    print(f"\n{'='*60}")
+    print(f"✓ HOÀN THÀNH {len(outputs)} CẤU HÌNH TRONG {time.perf_counter() - start:.1f}s")
+    print(f"{'='*60}")
+    return outputs
+
+
+if __name__ == "__main__":
+    # python run_all.py [config.json]
+    run_all(load_config(sys.argv[1] if len(sys.argv) > 1 else None))
@@ -0,0 +1,193 @@
+"""
+Lấy mẫu dữ liệu huấn luyện cục bộ, tương đương features.sampleRegions trong rf.js / xgb.js / svm.js
+
+Mỗi điểm lũ (lon, lat, flood) được tạo vùng đệm BUFFER_SIZE mét, lấy tất cả các
+điểm lưới SCALE mét có tâm nằm trong vùng đệm, đọc 13 đặc trưng từ feature cube
+bằng chỉ số vector hóa, rồi bỏ các hàng có giá trị rỗng (ee.Filter.notNull).
+"""
+
+import os
+import time
+import numpy as np
+import pandas as pd
+from rasterio.crs import CRS
+from rasterio.warp import transform as transform_coords
+
+from raster_io import FEATURE_NAMES
+from feature_cube import open_cube, band_index, xy_to_rowcol
+
+# Giống cấu hình trong rf.js, xgb.js, svm.js
+BUFFER_SIZE = 15
+SCALE = 10
+TRAIN_SPLIT = 0.7
+SEED = 42
+
+
+def buffer_offsets(buffer_size=BUFFER_SIZE, scale=SCALE):
+    """
+    Độ lệch (mét) của các điểm lưới scale mét có tâm nằm trong hình tròn bán kính buffer_size
+
+    Lưới được neo tại bội số của scale (giống lưới lấy mẫu của Earth Engine),
+    nên trả về các độ lệch trên lưới [-n, n] để ghép với vị trí điểm đã làm tròn.
+    """
+    n = int(np.ceil(buffer_size / scale)) + 1
+    steps = np.arange(-n, n + 1) * scale
+    dx, dy = np.meshgrid(steps, steps)
+    return dx.ravel().astype(np.float64), dy.ravel().astype(np.float64)
+
+
+def sample_regions(points_csv, cube_path, feature_names=FEATURE_NAMES, buffer_size=BUFFER_SIZE,
+                   scale=SCALE, properties=('flood', 'lat', 'lon')):
+    """
+    Lấy mẫu các pixel trong vùng đệm quanh mỗi điểm lũ
+
+    Args:
+        points_csv: File CSV điểm lũ (cột lon, lat, flood)
+        cube_path: File feature cube (feature_cube.build_feature_cube)
+        feature_names: Các lớp đặc trưng cần lấy
+        buffer_size: Bán kính vùng đệm (mét)
+        scale: Khoảng cách lưới lấy mẫu (mét)
+        properties: Các cột của điểm được giữ lại trong bảng kết quả
+
+    Returns:
+        DataFrame: feature_names + properties + point_id, đã bỏ hàng có giá trị rỗng
+    """
+    start = time.perf_counter()
+    points = pd.read_csv(points_csv)
+    cube, meta = open_cube(cube_path)
+    crs = CRS.from_user_input(meta['crs'])
+
+    lon = points['lon'].to_numpy(dtype=np.float64)
+    lat = points['lat'].to_numpy(dtype=np.float64)
+
+    # Tọa độ điểm theo CRS của cube
+    if crs.is_geographic:
+        xs, ys = lon, lat
+        # Đổi mét sang độ theo vĩ độ của từng điểm
+        mx = 1.0 / (111320.0 * np.cos(np.radians(lat)))
+        my = np.full_like(lat, 1.0 / 110540.0)
+    else:
+        xs, ys = (np.asarray(v) for v in transform_coords('EPSG:4326', crs, lon, lat))
+        mx = my = np.ones_like(lat)
+
+    # Vị trí điểm trên lưới scale mét (mét kể từ gốc tọa độ)
+    px = np.round(xs / (mx * scale)) * scale
+    py = np.round(ys / (my * scale)) * scale
+    off_x, off_y = buffer_offsets(buffer_size, scale)
+
+    # Điểm lưới (N, K): giữ các điểm có tâm nằm trong vùng đệm
+    grid_x = px[:, None] + off_x[None, :]
+    grid_y = py[:, None] + off_y[None, :]
+    dist_x = grid_x - xs[:, None] / mx[:, None]
+    dist_y = grid_y - ys[:, None] / my[:, None]
+    inside_buffer = dist_x ** 2 + dist_y ** 2 <= buffer_size ** 2
+
+    point_idx, offset_idx = np.nonzero(inside_buffer)
+    sample_x = grid_x[point_idx, offset_idx] * mx[point_idx]
+    sample_y = grid_y[point_idx, offset_idx] * my[point_idx]
+
+    rows, cols, inside = xy_to_rowcol(meta, sample_x, sample_y)
+    point_idx, rows, cols = point_idx[inside], rows[inside], cols[inside]
+
+    # Chỉ số vector hóa trên memmap (rows, cols, bands)
+    bands = band_index(meta, feature_names)
+    values = np.asarray(cube[rows, cols][:, bands])
+
+    df = pd.DataFrame(values, columns=list(feature_names))
+    for prop in properties:
+        df[prop] = points[prop].to_numpy()[point_idx]
+    df['point_id'] = point_idx
+
+    # ee.Filter.notNull(['flood'].concat(featureNames))
+    required = ['flood'] + list(feature_names) if 'flood' in df.columns else list(feature_names)
+    n_before = len(df)
+    df = df.dropna(subset=required).reset_index(drop=True)
+
+    print(f"Số điểm lũ: {len(points)}")
+    print(f"Số mẫu trong vùng đệm {buffer_size} m: {n_before}")
+    print(f"Số mẫu sau khi bỏ giá trị rỗng: {len(df)}")
+    print(f"Thời gian: {time.perf_counter() - start:.2f}s")
+    return df
+
+
+def split_train_validation(df, train_split=TRAIN_SPLIT, seed=SEED):
+    """
+    Chia tập huấn luyện/kiểm định theo cột ngẫu nhiên (giống randomColumn('random', 42))
+
+    Returns:
+        (training, validation)
+    """
+    df = df.copy()
+    df['random'] = np.random.default_rng(seed).random(len(df))
+    training = df[df['random'] < train_split].reset_index(drop=True)
+    validation = df[df['random'] >= train_split].reset_index(drop=True)
+    return training, validation
+
+
+def split_points(points, train_split=TRAIN_SPLIT, seed=SEED):
+    """
+    Chia điểm lũ (không phải pixel mẫu) thành huấn luyện/kiểm định
+
+    Mọi pixel trong vùng đệm của một điểm thuộc cùng một phần, nên điểm kiểm định không
+    có pixel nào nằm trong dữ liệu huấn luyện.
+
+    Returns:
+        DataFrame điểm thêm cột point_id (= chỉ số hàng, giống sample_regions) và split
+        ('train' hoặc 'validation')
+    """
+    points = points.copy()
+    points['point_id'] = np.arange(len(points))
+    is_train = np.random.default_rng(seed).random(len(points)) < train_split
+    points['split'] = np.where(is_train, 'train', 'validation')
+    return points
+
+
+def load_point_split(points_csv, split_csv, train_split=TRAIN_SPLIT, seed=SEED):
+    """
+    Đọc bảng chia điểm đã lưu, chưa có thì chia (split_points) và lưu lại
+
+    Dùng chung một file cho run_all, frequency_ratio và rate_curves để đánh giá trên
+    đúng các điểm mà mô hình chưa thấy.
+
+    Returns:
+        DataFrame điểm với cột point_id, split
+    """
+    n_points = len(pd.read_csv(points_csv, usecols=['flood']))
+    if os.path.exists(split_csv):
+        split = pd.read_csv(split_csv)
+        if len(split) != n_points:
+            raise ValueError(f"{split_csv} có {len(split)} điểm, {points_csv} có {n_points} điểm: "
+                             f"xóa file chia điểm để chia lại")
+        return split
+    split = split_points(pd.read_csv(points_csv), train_split, seed)
+    os.makedirs(os.path.dirname(os.path.abspath(split_csv)), exist_ok=True)
+    split.to_csv(split_csv, index=False)
+    print(f"Đã lưu bảng chia điểm: {split_csv}")
+    return split
+
+
+def split_by_points(df, split):
+    """
+    Chia bảng có cột point_id (mẫu của sample_regions hoặc chính bảng điểm) theo bảng chia điểm
+
+    Returns:
+        (training, validation)
+    """
+    train_ids = split.loc[split['split'] == 'train', 'point_id']
+    is_train = df['point_id'].isin(train_ids)
+    return df[is_train].reset_index(drop=True), df[~is_train].reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    # File điểm lũ (lon, lat, flood) và feature cube
+    points_csv = r"D:\prj\data\flood_points.csv"
+    cube_path = r"D:\prj\feature\feature_cube.bin"
+    output_csv = r"D:\prj\data\training_data.csv"
+    split_csv = r"D:\prj\data\point_split.csv"
+
+    training_data = sample_regions(points_csv, cube_path)
+    training_data.to_csv(output_csv, index=False)
+    print(f"Đã lưu: {output_csv}")
+
+    training, validation = split_by_points(training_data, load_point_split(points_csv, split_csv))
+    print(f"Huấn luyện: {len(training)}, kiểm định: {len(validation)}")
@@ -0,0 +1,168 @@
+"""
+Dự đoán xấp xỉ nhanh cho SVR kernel RBF (EPSILON_SVR trong svm.js)
+
+SVR gốc: f(x) = sum_i alpha_i * k(sv_i, x) + b, chi phí O(số vector hỗ trợ) mỗi pixel.
+Bản xấp xỉ hạng thấp được dựng trực tiếp từ mô hình đã huấn luyện (không huấn luyện lại):
+- 'nystroem': m điểm mốc L (k-means trên các vector hỗ trợ), f(x) ~ w . k(L, x) + b,
+  w khớp bình phương tối thiểu với giá trị f chính xác tại các vector hỗ trợ
+- 'rff'     : đặc trưng Fourier ngẫu nhiên phi(x), f(x) ~ (sum_i alpha_i phi(sv_i)) . phi(x) + b
+Chi phí mỗi pixel còn O(m) thay vì O(số vector hỗ trợ).
+"""
+
+import time
+import numpy as np
+from sklearn.cluster import KMeans
+from sklearn.pipeline import Pipeline
+from sklearn.svm import SVR
+
+N_LANDMARKS = 256
+BATCH_SIZE = 65536
+SEED = 42
+
+
+def _split_pipeline(model):
+    """Tách (scaler, svr) từ Pipeline(StandardScaler, SVR) hoặc SVR đơn"""
+    if isinstance(model, Pipeline):
+        return model[:-1], model[-1]
+    return None, model
+
+
+def _rbf(A, B, gamma):
+    """Ma trận kernel RBF exp(-gamma * ||a - b||^2)"""
+    d2 = (A * A).sum(axis=1)[:, None] + (B * B).sum(axis=1)[None, :] - 2.0 * A @ B.T
+    np.maximum(d2, 0, out=d2)
+    return np.exp(-gamma * d2)
+
+
+class ApproxSVR:
+    """
+    SVR kernel RBF xấp xỉ hạng thấp, có predict(X) giống mô hình gốc
+
+    Args:
+        model: SVR hoặc Pipeline(StandardScaler, SVR) đã huấn luyện (kernel='rbf')
+        n_components: Số điểm mốc (nystroem) hoặc số đặc trưng Fourier (rff)
+        method: 'nystroem' hoặc 'rff'
+        batch_size: Số pixel mỗi lô khi dự đoán
+    """
+
+    def __init__(self, model, n_components=N_LANDMARKS, method='nystroem', batch_size=BATCH_SIZE, seed=SEED):
+        self.scaler, svr = _split_pipeline(model)
+        if not isinstance(svr, SVR) or svr.kernel != 'rbf':
+            raise TypeError("Chỉ hỗ trợ SVR kernel RBF")
+        self.method = method
+        self.batch_size = batch_size
+        self.gamma = float(svr._gamma)
+        self.intercept = float(svr.intercept_[0])
+        self.n_support = svr.support_vectors_.shape[0]
+
+        sv = svr.support_vectors_.astype(np.float64)
+        alpha = svr.dual_coef_[0].astype(np.float64)
+        n_components = int(n_components)
+
+        if method == 'nystroem':
+            n_components = min(n_components, self.n_support)
+            landmarks = KMeans(n_clusters=n_components, n_init=1, random_state=seed).fit(sv).cluster_centers_
+            # Giá trị chính xác sum_i alpha_i k(sv_i, sv_j) tại các vector hỗ trợ (tính theo khối)
+            target = np.concatenate([_rbf(sv[i:i + 2048], sv, self.gamma) @ alpha
+                                     for i in range(0, self.n_support, 2048)])
+            K_SL = _rbf(sv, landmarks, self.gamma)
+            self.landmarks = landmarks
+            self.weights = np.linalg.lstsq(K_SL, target, rcond=None)[0]
+        elif method == 'rff':
+            rng = np.random.default_rng(seed)
+            self.omega = rng.normal(0, np.sqrt(2 * self.gamma), size=(sv.shape[1], n_components))
+            self.phase = rng.uniform(0, 2 * np.pi, size=n_components)
+            self.weights = alpha @ self._rff(sv)
+        else:
+            raise ValueError(f"Phương pháp không hỗ trợ: {method}")
+        self.n_components = n_components
+
+    def _rff(self, X):
+        return np.sqrt(2.0 / self.omega.shape[1]) * np.cos(X @ self.omega + self.phase)
+
+    def _predict_batch(self, X):
+        if self.method == 'nystroem':
+            return _rbf(X, self.landmarks, self.gamma) @ self.weights + self.intercept
+        return self._rff(X) @ self.weights + self.intercept
+
+    def predict(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if self.scaler is not None:
+            X = self.scaler.transform(X)
+        out = np.empty(X.shape[0], dtype=np.float64)
+        for start in range(0, X.shape[0], self.batch_size):
+            out[start:start + self.batch_size] = self._predict_batch(X[start:start + self.batch_size])
+        return out
+
+
+def _r2(y, pred):
+    return 1 - np.sum((y - pred) ** 2) / np.sum((y - np.mean(y)) ** 2)
+
+
+def approximation_report(model, X_val, y_val=None, n_components=N_LANDMARKS, method='nystroem', approx=None):
+    """
+    Đánh giá sai số của bản xấp xỉ trên tập kiểm định và tốc độ dự đoán
+
+    Args:
+        model: Pipeline(StandardScaler, SVR) đã huấn luyện
+        X_val: Đặc trưng tập kiểm định (chưa chuẩn hóa)
+        y_val: Giá trị flood thật (để so sánh R²), None = bỏ qua
+        n_components, method: Tham số của ApproxSVR
+        approx: ApproxSVR dựng sẵn (None = dựng mới)
+
+    Returns:
+        (ApproxSVR, dict báo cáo)
+    """
+    start = time.perf_counter()
+    if approx is None:
+        approx = ApproxSVR(model, n_components, method)
+    fit_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    exact = np.clip(model.predict(X_val), 0, 1)
+    exact_s = time.perf_counter() - start
+    start = time.perf_counter()
+    fast = np.clip(approx.predict(X_val), 0, 1)
+    approx_s = time.perf_counter() - start
+
+    diff = np.abs(fast - exact)
+    report = {
+        'method': approx.method,
+        'n_components': approx.n_components,
+        'n_support': approx.n_support,
+        'n_val': len(exact),
+        'max_abs_diff': float(diff.max()),
+        'mean_abs_diff': float(diff.mean()),
+        'rmse_diff': float(np.sqrt(np.mean(diff ** 2))),
+        'fit_s': fit_s,
+        'exact_s': exact_s,
+        'approx_s': approx_s,
+        'speedup': exact_s / approx_s if approx_s > 0 else np.inf,
+    }
+    if y_val is not None:
+        y_val = np.asarray(y_val, dtype=np.float64)
+        report['r2_exact'] = float(_r2(y_val, exact))
+        report['r2_approx'] = float(_r2(y_val, fast))
+
+    print(f"SVR xấp xỉ ({report['method']}, {report['n_components']} thành phần, "
+          f"{report['n_support']} vector hỗ trợ)")
+    print(f"  Sai khác so với SVR gốc: max {report['max_abs_diff']:.4g}, "
+          f"MAE {report['mean_abs_diff']:.4g}, RMSE {report['rmse_diff']:.4g}")
+    if 'r2_exact' in report:
+        print(f"  R² gốc: {report['r2_exact']:.4f}, R² xấp xỉ: {report['r2_approx']:.4f}")
+    print(f"  Thời gian: gốc {exact_s:.3f}s, xấp xỉ {approx_s:.3f}s (x{report['speedup']:.1f})")
+    return approx, report
+
+
+if __name__ == "__main__":
+    import pandas as pd
+    from models import load_model
+    from sample_regions import split_train_validation
+
+    artifact = load_model(r"D:\prj\models\puma_SVM.joblib")
+    training_data = pd.read_csv(r"D:\prj\data\training_data.csv")
+    _, validation = split_train_validation(training_data)
+
+    X_val = validation[artifact['feature_names']].to_numpy()
+    for n_components in [64, 256, 1024]:
+        approximation_report(artifact['model'], X_val, validation['flood'], n_components)
@@ -1,16 +1,56 @@
 import numpy as np
+import matplotlib
+matplotlib.use('Agg')  # Chỉ lưu file, không cần giao diện -> chạy được trong process con
 import matplotlib.pyplot as plt
 from matplotlib.patches import Rectangle, Circle, Polygon
+from matplotlib.collections import LineCollection
 import rasterio
-import contextily as ctx
+from rasterio.enums import Resampling
 import os
+import time
+import pickle
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from matplotlib.colors import LinearSegmentedColormap
 from pyproj import Transformer
+from basemap_cache import get_basemap, OSM_URL, DEFAULT_CACHE_DIR
+from hillshade import compute_hillshade, DEFAULT_CACHE_DIR as HILLSHADE_CACHE_DIR
+
+# ===== KÍCH THƯỚC ẢNH TỐI ĐA KHI VẼ =====
+# Figure 16x12 inch lưu ở 300 dpi -> không bao giờ cần quá 4800x3600 pixel
+MAX_RENDER_SHAPE = (3600, 4800)  # (rows, cols)
+
+def fit_render_shape(extent, max_shape=MAX_RENDER_SHAPE):
+    """Kích thước (rows, cols) lớn nhất vừa max_shape và giữ tỷ lệ của extent"""
+    width_range = extent[1] - extent[0]
+    height_range = extent[3] - extent[2]
+    scale = min(max_shape[0] / height_range, max_shape[1] / width_range)
+    return max(1, int(round(height_range * scale))), max(1, int(round(width_range * scale)))
 
 # ===== ĐỌC FILE TIFF VÀ CHUYỂN ĐỔI HỆ TỌA ĐỘ =====
-def read_tiff(file_path):
+def read_tiff(file_path, max_shape=MAX_RENDER_SHAPE, resampling=Resampling.mode):
+    """
+    Đọc band đầu tiên ở độ phân giải vừa đủ cho ảnh đầu ra
+
+    Nếu ảnh lớn hơn max_shape, dữ liệu được đọc giảm mẫu qua out_shape
+    (GDAL tự dùng overview nếu file có), mặc định resampling mode để
+    giữ đúng giá trị lớp của ảnh phân ngưỡng.
+
+    Args:
+        file_path: Đường dẫn file TIFF
+        max_shape: Kích thước (rows, cols) tối đa cần đọc, None = đọc toàn bộ
+        resampling: Phương pháp lấy mẫu khi giảm độ phân giải
+    """
     with rasterio.open(file_path) as ds:
-        data = ds.read(1)  # Đọc band đầu tiên
+        if max_shape is not None:
+            scale = max(ds.height / max_shape[0], ds.width / max_shape[1], 1.0)
+        else:
+            scale = 1.0
+        out_shape = (int(np.ceil(ds.height / scale)), int(np.ceil(ds.width / scale)))
+        if scale > 1.0:
+            data = ds.read(1, out_shape=out_shape, resampling=resampling)  # Đọc band đầu tiên (giảm mẫu)
+            print(f"  - Đọc giảm mẫu: {ds.height}x{ds.width} -> {out_shape[0]}x{out_shape[1]} ({resampling.name})")
+        else:
+            data = ds.read(1)  # Đọc band đầu tiên
         bounds = ds.bounds
         src_crs = ds.crs  # Lấy hệ tọa độ gốc
         nodata_value = ds.nodata  # Lấy giá trị NoData từ metadata
@@ -23,16 +63,21 @@ def read_tiff(file_path):
         extent_original = [bounds.left, bounds.right, bounds.bottom, bounds.top]
         
         # Chuyển đổi bounds sang WGS84 (EPSG:4326) cho lưới tọa độ
-        transformer = Transformer.from_crs(src_crs, 'EPSG:4326', always_xy=True) if src_crs and src_crs.to_string() != 'EPSG:4326' else None
-        if transformer:
-            x_min_wgs, y_min_wgs = transformer.transform(bounds.left, bounds.bottom)
-            x_max_wgs, y_max_wgs = transformer.transform(bounds.right, bounds.top)
-        else:
-            x_min_wgs, y_min_wgs, x_max_wgs, y_max_wgs = bounds.left, bounds.bottom, bounds.right, bounds.top
-        extent_wgs84 = [x_min_wgs, x_max_wgs, y_min_wgs, y_max_wgs]
+        extent_wgs84 = wgs84_extent(bounds, src_crs)
     
     return data, extent_original, extent_wgs84, src_crs, nodata_value
 
+
+def wgs84_extent(bounds, src_crs):
+    """[lon_min, lon_max, lat_min, lat_max] của bounds theo src_crs"""
+    transformer = Transformer.from_crs(src_crs, 'EPSG:4326', always_xy=True) if src_crs and src_crs.to_string() != 'EPSG:4326' else None
+    if transformer:
+        x_min_wgs, y_min_wgs = transformer.transform(bounds.left, bounds.bottom)
+        x_max_wgs, y_max_wgs = transformer.transform(bounds.right, bounds.top)
+    else:
+        x_min_wgs, y_min_wgs, x_max_wgs, y_max_wgs = bounds.left, bounds.bottom, bounds.right, bounds.top
+    return [x_min_wgs, x_max_wgs, y_min_wgs, y_max_wgs]
+
 # ===== HÀM TẠO BỘ MÀU CHO PHÂN NGƯỠNG =====
 def get_threshold_colormap():
     """Trả về colormap cho dữ liệu phân ngưỡng (1-5)"""
@@ -78,6 +123,9 @@ def draw_compass_rose(ax, x_pos=0.95, y_pos=0.88, size=0.045):
     ax.add_patch(inner_circle)
     
     # Vẽ các vạch chia độ giữa 2 vòng ngoài
+    # Gom tất cả vạch vào một LineCollection thay vì 72 lệnh ax.plot riêng lẻ
+    tick_segments = []
+    tick_widths = []
     for i in range(72):
         angle = i * 5  # Mỗi 5 độ
         angle_rad = np.radians(angle)
@@ -110,10 +158,15 @@ def draw_compass_rose(ax, x_pos=0.95, y_pos=0.88, size=0.045):
         x_end = x_pos + outer_radius * np.sin(angle_rad)
         y_end = y_pos + outer_radius * np.cos(angle_rad)
         
-        ax.plot([x_start, x_end], [y_start, y_end],
-               transform=ax.transAxes, color='black', linewidth=linewidth, zorder=11)
+        tick_segments.append([(x_start, y_start), (x_end, y_end)])
+        tick_widths.append(linewidth)
+    
+    ax.add_collection(LineCollection(tick_segments, linewidths=tick_widths, colors='black',
+                                     transform=ax.transAxes, zorder=11))
     
     # Vẽ 8 đường từ tâm ra (4 chính + 4 phụ)
+    spoke_segments = []
+    spoke_widths = []
     for angle in [0, 45, 90, 135, 180, 225, 270, 315]:
         angle_rad = np.radians(angle)
         is_cardinal = angle % 90 == 0
@@ -123,11 +176,11 @@ def draw_compass_rose(ax, x_pos=0.95, y_pos=0.88, size=0.045):
         x_end = x_pos + size * 0.80 * np.sin(angle_rad)
         y_end = y_pos + size * 0.80 * np.cos(angle_rad)
         
-        linewidth = 1.5 if is_cardinal else 1.0
-        
-        ax.plot([x_start, x_end], [y_start, y_end],
-               transform=ax.transAxes, color='black', 
-               linewidth=linewidth, zorder=11, alpha=0.8)
+        spoke_segments.append([(x_start, y_start), (x_end, y_end)])
+        spoke_widths.append(1.5 if is_cardinal else 1.0)
+    
+    ax.add_collection(LineCollection(spoke_segments, linewidths=spoke_widths, colors='black',
+                                     transform=ax.transAxes, zorder=11, alpha=0.8))
     
     # Vẽ 8 cánh ngôi sao (4 chính + 4 phụ)
     # Cánh Bắc (N) - đen đậm
@@ -226,273 +279,451 @@ def draw_compass_rose(ax, x_pos=0.95, y_pos=0.88, size=0.045):
            ha='center', va='center', fontsize=16, fontweight='bold', zorder=15,
            family='serif', color='black')
 
-# ===== CẤU HÌNH THƯ MỤC =====
-input_folder = r"D:\prj\results\map\threshold"
-output_folder = r"D:\prj\map\ThreshHold"
+# ===== HÀM PHÂN TÍCH TÊN FILE =====
+def parse_algorithm_model(filename):
+    """Trích xuất (algorithm, model) từ tên file, vd: cliped_flood_susceptibility_pso_RF.tif -> ('pso', 'RF')"""
+    # Loại bỏ các tiền tố và hậu tố không cần thiết
+    base_name = filename.replace('cliped_', '').replace('_thresholded', '').replace('.tif', '').replace('.tiff', '')
+    # Lấy phần flood_susceptibility_xxx_YYY hoặc flood_probability_xxx_YYY
+    parts = base_name.replace('flood_susceptibility_', '').replace('flood_probability_', '').split('_')
+    if len(parts) >= 2:
+        return parts[0], parts[1]
+    return None
+
+
+def map_title(filename):
+    """Tiêu đề bản đồ trích xuất từ tên file"""
+    parsed = parse_algorithm_model(filename)
+    if parsed:
+        algorithm, model = parsed[0].upper(), parsed[1].upper()  # PSO, PUMA, RSO / RF, SVR, XGB
+        return f'BẢN ĐỒ MỨC ĐỘ NHẠY CẢM VỚI NGẬP LỤT - {algorithm} + {model}'
+    return 'BẢN ĐỒ MỨC ĐỘ NHẠY CẢM VỚI NGẬP LỤT'
+
+
+# ===== HÀM TẠO KHUNG BẢN ĐỒ DÙNG LẠI (TEMPLATE) =====
+def build_map_template(extent_original, extent_wgs84, src_crs, basemap_options=None, hillshade_options=None):
+    """
+    Dựng một lần các thành phần tĩnh của bản đồ cho một extent và CRS:
+    bản đồ nền, colorbar, lưới tọa độ WGS84, la bàn, thước tỷ lệ, nhãn.
+    Mỗi ảnh phân ngưỡng sau đó chỉ cần render_map() để thay dữ liệu và tiêu đề.
+
+    Args:
+        extent_original: [left, right, bottom, top] theo CRS gốc
+        extent_wgs84: [lon_min, lon_max, lat_min, lat_max]
+        src_crs: Hệ tọa độ gốc của ảnh
+        basemap_options: dict tham số cho get_basemap (source, cache_dir, offline, zoom),
+                         None = không vẽ bản đồ nền
+        hillshade_options: dict {'dem_path', 'cache_dir'} để vẽ bóng địa hình từ DEM,
+                           None = không vẽ hillshade
+
+    Returns:
+        dict {'fig', 'ax', 'im', 'title'}
+    """
+    # Tạo figure
+    fig, ax = plt.subplots(figsize=(16, 12), dpi=150)
+    fig.patch.set_facecolor('white')
+
+    # Colormap cho phân ngưỡng
+    cmap_threshold, label_threshold = get_threshold_colormap()
+
+    # Ảnh đã được đọc ở độ phân giải đầu ra nên luôn thêm được bản đồ nền
+    # Mosaic được ghép một lần cho mỗi extent/zoom và dùng lại cho các file sau
+    if basemap_options is not None:
+        try:
+            print("Đang tải bản đồ nền...")
+            basemap_img, basemap_extent = get_basemap(extent_original, src_crs, **basemap_options)
+            ax.imshow(basemap_img, extent=basemap_extent, aspect='auto',
+                     alpha=0.5, zorder=1, interpolation='bilinear')
+            print("✓ Đã thêm bản đồ nền")
+        except Exception as e:
+            print(f"Không thể tải basemap: {e}")
+
+    # Bóng địa hình tính từ DEM (offline), trộn dưới lớp phân ngưỡng
+    if hillshade_options is not None:
+        try:
+            print("Đang tạo hillshade từ DEM...")
+            hs_img, hs_extent = compute_hillshade(hillshade_options['dem_path'], extent_original, src_crs,
+                                                  fit_render_shape(extent_original),
+                                                  cache_dir=hillshade_options.get('cache_dir', HILLSHADE_CACHE_DIR))
+            ax.imshow(np.ma.masked_equal(hs_img, 0), extent=hs_extent, cmap='gray', vmin=0, vmax=255,
+                     aspect='auto', alpha=0.6 if basemap_options is not None else 1.0,
+                     zorder=2, interpolation='bilinear')
+            print("✓ Đã thêm hillshade")
+        except Exception as e:
+            print(f"Không thể tạo hillshade: {e}")
+    ax.set_xlim(extent_original[0], extent_original[1])
+    ax.set_ylim(extent_original[2], extent_original[3])
+
+    # Lớp dữ liệu phân ngưỡng (dữ liệu thật được gán trong render_map)
+    im = ax.imshow(np.ma.masked_all((1, 1)), extent=extent_original,
+                  cmap=cmap_threshold, vmin=0, vmax=5,
+                  aspect='auto', alpha=0.85, zorder=3, interpolation='nearest')
+
+    # Colorbar với chú giải
+    cbar = plt.colorbar(im, ax=ax, orientation='vertical', pad=0.08, shrink=0.7, 
+                       boundaries=[0.5, 1.5, 2.5, 3.5, 4.5, 5.5], 
+                       ticks=[1, 2, 3, 4, 5])
+    cbar.set_label(label_threshold, fontsize=12, fontweight='bold')
+    
+    # Thiết lập labels cho 5 mức với giá trị ngưỡng - căn giữa mỗi màu
+    tick_labels = [
+        'Rất thấp\n(0.000-0.125)',
+        'Thấp\n(0.126-0.282)',
+        'Trung bình\n(0.283-0.475)',
+        'Cao\n(0.476-0.741)',
+        'Rất cao\n(0.742-1.000)'
+    ]
+    cbar.ax.set_yticklabels(tick_labels, fontsize=9)
+    cbar.ax.tick_params(labelsize=9)
+
+    # Grid tọa độ
+    lon_range = extent_wgs84[1] - extent_wgs84[0]
+    lat_range = extent_wgs84[3] - extent_wgs84[2]
+    width_range = extent_original[1] - extent_original[0]
+    height_range = extent_original[3] - extent_original[2]
 
-# Các thư mục con cần xử lý
-subfolders = ['rf', 'svr', 'xgb']
+    lon_ticks_wgs = np.linspace(extent_wgs84[0], extent_wgs84[1], 8)
+    lat_ticks_wgs = np.linspace(extent_wgs84[2], extent_wgs84[3], 6)
+    
+    transformer_inv = Transformer.from_crs('EPSG:4326', src_crs, always_xy=True) if src_crs and src_crs.to_string() != 'EPSG:4326' else None
+    if transformer_inv:
+        lon_ticks_orig = transformer_inv.transform(lon_ticks_wgs, np.full_like(lon_ticks_wgs, extent_wgs84[2]))[0]
+        lat_ticks_orig = transformer_inv.transform(np.full_like(lat_ticks_wgs, extent_wgs84[0]), lat_ticks_wgs)[1]
+    else:
+        lon_ticks_orig = lon_ticks_wgs
+        lat_ticks_orig = lat_ticks_wgs
+
+    ax.set_xticks(lon_ticks_orig)
+    ax.set_yticks(lat_ticks_orig)
+    ax.grid(True, linestyle='--', linewidth=0.5, alpha=0.4, color='black', zorder=3)
+
+    # Format nhãn
+    lon_labels = [f'{lon:.3f}°Đ' for lon in lon_ticks_wgs]
+    lat_labels = [f'{lat:.3f}°B' for lat in lat_ticks_wgs]
+        
+    ax.set_xticklabels(lon_labels, fontsize=9)
+    ax.set_yticklabels(lat_labels, fontsize=9)
+    ax.tick_params(axis='both', which='major', labelsize=9, top=True, right=True, labeltop=True, labelright=True)
 
-# Các thư mục cần bỏ qua
-exclude_folders = ['thresholded']
+    # VẼ LA BÀN CẢI TIẾN - căn chỉnh vị trí
+    print("Vẽ la bàn...")
+    draw_compass_rose(ax, x_pos=0.93, y_pos=0.90, size=0.040)
 
-# Tạo thư mục output nếu chưa có
-os.makedirs(output_folder, exist_ok=True)
+    # Scale bar
+    km_per_deg = 111.32 * np.cos(np.radians((extent_wgs84[2]+extent_wgs84[3])/2))
 
-# ===== TÌM TẤT CẢ FILE TIFF =====
-print(f"Đang tìm kiếm file TIFF trong: {input_folder}")
-print(f"Thư mục con xử lý: {', '.join(subfolders)}")
-print(f"Thư mục bỏ qua: {', '.join(exclude_folders)}")
-print("="*80)
-
-# Tìm tất cả file .tif trong các thư mục con được chỉ định
-all_tiff_files = []
-for subfolder in subfolders:
-    subfolder_path = os.path.join(input_folder, subfolder)
-    
-    if not os.path.exists(subfolder_path):
-        print(f"⚠ Thư mục không tồn tại: {subfolder}")
-        continue
+    x_start = extent_original[0] + width_range * 0.05
+    y_pos = extent_original[2] + height_range * 0.08
+
+    segments = [0, 10, 25, 50]  # km
+    bar_colors = ['black', 'white', 'black']
     
-    print(f"\nQuét thư mục: {subfolder}")
-    for file in os.listdir(subfolder_path):
-        if (file.endswith('.tif') or file.endswith('.tiff')) and not file.endswith('.aux.xml'):
-            # Bỏ qua file trong thư mục exclude
-            full_path = os.path.join(subfolder_path, file)
-            if not any(excluded in full_path for excluded in exclude_folders):
-                all_tiff_files.append(full_path)
-                print(f"  - {file}")
-
-print("\n" + "="*80)
-print(f"Tìm thấy {len(all_tiff_files)} file TIFF:")
-for i, file in enumerate(all_tiff_files, 1):
-    print(f"  {i}. {os.path.basename(file)}")
-print("="*80)
-
-# ===== XỬ LÝ TỪNG FILE =====
-for idx, input_file in enumerate(all_tiff_files, 1):
-    # Phân tích tên file để tạo tên output
-    filename = os.path.basename(input_file)
+    scale_factor = width_range / lon_range
     
-    # Trích xuất algorithm và model từ tên file
-    try:
-        # Loại bỏ các tiền tố và hậu tố không cần thiết
-        base_name = filename.replace('cliped_', '').replace('_thresholded', '').replace('.tif', '').replace('.tiff', '')
-        # Lấy phần flood_susceptibility_xxx_YYY hoặc flood_probability_xxx_YYY
-        parts = base_name.replace('flood_susceptibility_', '').replace('flood_probability_', '').split('_')
-        if len(parts) >= 2:
-            algorithm = parts[0]  # pso, puma, rso
-            model = parts[1]      # RF, SVR, XGB
-            output_filename = f"{algorithm}_{model}.png"
-        else:
-            output_filename = filename.replace('.tif', '.png').replace('.tiff', '.png')
-    except:
-        output_filename = filename.replace('.tif', '.png').replace('.tiff', '.png')
+    # Nền trắng cho scale bar
+    total_width = (segments[-1] / km_per_deg) * scale_factor
+    bg_rect = Rectangle((x_start, y_pos - height_range*0.025),
+                       total_width * 1.3, height_range*0.045,
+                       facecolor='white', edgecolor='black', linewidth=1.5, zorder=9, alpha=0.9)
+    ax.add_patch(bg_rect)
+
+    # Vẽ scale bar
+    for i in range(len(segments)-1):
+        width_km = segments[i+1] - segments[i]
+        width = (width_km / km_per_deg) * scale_factor
+        rect = Rectangle((x_start + (segments[i]/km_per_deg) * scale_factor, y_pos),
+                        width, height_range*0.01,
+                        facecolor=bar_colors[i], edgecolor='black', linewidth=1, zorder=10)
+        ax.add_patch(rect)
+
+    # Labels cho scale bar
+    for km in segments:
+        ax.text(x_start + (km/km_per_deg) * scale_factor,
+               y_pos - height_range*0.005, str(km),
+               ha='center', va='top', fontsize=10, fontweight='bold', zorder=11,
+               bbox=dict(boxstyle='round,pad=0.3', facecolor='white', edgecolor='none', alpha=0.8))
+
+    ax.text(x_start + (segments[-1]/km_per_deg) * scale_factor * 1.15,
+           y_pos + height_range*0.005, 'km',
+           ha='left', va='center', fontsize=11, fontweight='bold', zorder=11)
+
+    # Attribution
+    attribution = 'Machine Learning Model'
+    if basemap_options is not None:
+        attribution = '© OpenStreetMap contributors | ' + attribution
+    fig.text(0.99, 0.01, attribution,
+            ha='right', va='bottom', fontsize=8, style='italic', alpha=0.7)
+
+    # Labels
+    ax.set_xlabel('Kinh độ', fontsize=12, fontweight='bold')
+    ax.set_ylabel('Vĩ độ', fontsize=12, fontweight='bold')
+
+    # Tiêu đề giữ chỗ, nội dung được thay trong render_map
+    title = ax.set_title(map_title(''), fontsize=16, fontweight='bold', pad=20)
+
+    plt.tight_layout(rect=[0, 0.02, 1, 1])
+
+    return {'fig': fig, 'ax': ax, 'im': im, 'title': title}
+
+
+def render_map(template, data_masked, title, output_file):
+    """Gán dữ liệu phân ngưỡng và tiêu đề vào template rồi lưu PNG 300 dpi"""
+    template['im'].set_data(data_masked)
+    template['title'].set_text(title)
+    template['fig'].savefig(output_file, dpi=300, bbox_inches='tight', facecolor='white')
+
+
+def print_level_stats(data_masked):
+    """In phân bố 5 mức độ nhạy cảm của dữ liệu hợp lệ"""
+    valid_data = data_masked.compressed()
     
-    output_file = os.path.join(output_folder, output_filename)
-
-    print(f"\n{'='*80}")
-    print(f"[{idx}/{len(all_tiff_files)}] ĐANG XỬ LÝ: {filename}")
-    print(f"{'='*80}")
-    print(f"Input:  {input_file}")
-    print(f"Output: {output_file}")
-
-    try:
-        print("Đọc file TIFF...")
-        data, extent_original, extent_wgs84, src_crs, nodata_value = read_tiff(input_file)
-        
-        print(f"  - Dữ liệu phân ngưỡng (0 = NoData, 1-5 = mức độ nhạy cảm)")
+    if len(valid_data) > 0:
+        print(f"Data range (valid): {int(valid_data.min())} to {int(valid_data.max())}")
         
-        # Mask NoData (giá trị 0) và NaN
-        mask_condition = np.isnan(data) | (data == 0)
-        if nodata_value is not None:
-            mask_condition = mask_condition | (data == nodata_value)
-        print(f"  - Masking NaN và NoData values")
-        data_masked = np.ma.masked_where(mask_condition, data)
+        # Thống kê theo ngưỡng
+        counts = np.bincount(valid_data.astype(np.int64), minlength=6)
+        total = len(valid_data)
+        names = [
+            'Mức 1 (Rất thấp, 0.000-0.125)',
+            'Mức 2 (Thấp, 0.126-0.282)',
+            'Mức 3 (Trung bình, 0.283-0.475)',
+            'Mức 4 (Cao, 0.476-0.741)',
+            'Mức 5 (Rất cao, 0.742-1.000)',
+        ]
+        print(f"  - Phân bố mức độ nhạy cảm:")
+        for level, name in enumerate(names, 1):
+            print(f"    + {name}: {counts[level]:,} pixels ({counts[level]/total*100:.2f}%)")
+    else:
+        print("WARNING: Không có dữ liệu hợp lệ!")
 
-        # Kiểm tra dữ liệu
-        valid_data = data_masked.compressed()
+# ===== TÌM TẤT CẢ FILE TIFF =====
+def find_tiff_files(input_folder, subfolders, exclude_folders):
+    """Tìm tất cả file .tif trong các thư mục con được chỉ định"""
+    all_tiff_files = []
+    for subfolder in subfolders:
+        subfolder_path = os.path.join(input_folder, subfolder)
         
-        if len(valid_data) > 0:
-            print(f"Data range (valid): {int(valid_data.min())} to {int(valid_data.max())}")
-            
-            # Thống kê theo ngưỡng
-            level_1 = np.sum(valid_data == 1)
-            level_2 = np.sum(valid_data == 2)
-            level_3 = np.sum(valid_data == 3)
-            level_4 = np.sum(valid_data == 4)
-            level_5 = np.sum(valid_data == 5)
-            total = len(valid_data)
-            
-            print(f"  - Phân bố mức độ nhạy cảm:")
-            print(f"    + Mức 1 (Rất thấp, 0.000-0.125): {level_1:,} pixels ({level_1/total*100:.2f}%)")
-            print(f"    + Mức 2 (Thấp, 0.126-0.282): {level_2:,} pixels ({level_2/total*100:.2f}%)")
-            print(f"    + Mức 3 (Trung bình, 0.283-0.475): {level_3:,} pixels ({level_3/total*100:.2f}%)")
-            print(f"    + Mức 4 (Cao, 0.476-0.741): {level_4:,} pixels ({level_4/total*100:.2f}%)")
-            print(f"    + Mức 5 (Rất cao, 0.742-1.000): {level_5:,} pixels ({level_5/total*100:.2f}%)")
-        else:
-            print("WARNING: Không có dữ liệu hợp lệ!")
+        if not os.path.exists(subfolder_path):
+            print(f"⚠ Thư mục không tồn tại: {subfolder}")
+            continue
         
-        print(f"Data shape: {data.shape}")
-        print(f"CRS gốc: {src_crs}")
-        print(f"Extent WGS84: {extent_wgs84}")
+        print(f"\nQuét thư mục: {subfolder}")
+        for file in sorted(os.listdir(subfolder_path)):
+            if (file.endswith('.tif') or file.endswith('.tiff')) and not file.endswith('.aux.xml'):
+                # Bỏ qua file trong thư mục exclude
+                full_path = os.path.join(subfolder_path, file)
+                if not any(excluded in full_path for excluded in exclude_folders):
+                    all_tiff_files.append(full_path)
+                    print(f"  - {file}")
+    return all_tiff_files
 
-        # Tạo figure
-        fig, ax = plt.subplots(figsize=(16, 12), dpi=150)
-        fig.patch.set_facecolor('white')
 
-        print("Vẽ bản đồ...")
-        
-        # Colormap cho phân ngưỡng
-        cmap_threshold, label_threshold = get_threshold_colormap()
+def output_png_name(filename):
+    """Tên file PNG đầu ra, vd: flood_susceptibility_pso_RF.tif -> pso_RF.png"""
+    parsed = parse_algorithm_model(filename)
+    if parsed:
+        return f"{parsed[0]}_{parsed[1]}.png"
+    return filename.replace('.tif', '.png').replace('.tiff', '.png')
 
-        # Kiểm tra kích thước ảnh
-        total_pixels = data.shape[0] * data.shape[1]
-        use_basemap = total_pixels < 100_000_000
-        
-        if use_basemap:
-            try:
-                print("Đang tải bản đồ nền...")
-                ax.set_xlim(extent_original[0], extent_original[1])
-                ax.set_ylim(extent_original[2], extent_original[3])
-                ctx.add_basemap(ax, crs=src_crs.to_string(),
-                              source=ctx.providers.OpenStreetMap.Mapnik,
-                              alpha=0.5, zorder=1, attribution=False)
-                print("✓ Đã thêm bản đồ nền")
-            except Exception as e:
-                print(f"Không thể tải basemap: {e}")
-        else:
-            print(f"⚠ Bỏ qua basemap do ảnh quá lớn ({total_pixels:,} pixels)")
-
-        # Vẽ dữ liệu phân ngưỡng
-        im = ax.imshow(data_masked, extent=extent_original,
-                      cmap=cmap_threshold, vmin=0, vmax=5,
-                      aspect='auto', alpha=0.85, zorder=3, interpolation='nearest')
-
-        # Colorbar với chú giải
-        cbar = plt.colorbar(im, ax=ax, orientation='vertical', pad=0.08, shrink=0.7, 
-                           boundaries=[0.5, 1.5, 2.5, 3.5, 4.5, 5.5], 
-                           ticks=[1, 2, 3, 4, 5])
-        cbar.set_label(label_threshold, fontsize=12, fontweight='bold')
-        
-        # Thiết lập labels cho 5 mức với giá trị ngưỡng - căn giữa mỗi màu
-        tick_labels = [
-            'Rất thấp\n(0.000-0.125)',
-            'Thấp\n(0.126-0.282)',
-            'Trung bình\n(0.283-0.475)',
-            'Cao\n(0.476-0.741)',
-            'Rất cao\n(0.742-1.000)'
-        ]
-        cbar.ax.set_yticklabels(tick_labels, fontsize=9)
-        cbar.ax.tick_params(labelsize=9)
 
-        # Grid tọa độ
-        lon_range = extent_wgs84[1] - extent_wgs84[0]
-        lat_range = extent_wgs84[3] - extent_wgs84[2]
-        width_range = extent_original[1] - extent_original[0]
-        height_range = extent_original[3] - extent_original[2]
+# Template đã dựng trong process hiện tại, theo (extent, CRS)
+_TEMPLATES = {}
+# Template do process chính dựng sẵn (dạng pickle), process con nạp khi cần
+_TEMPLATE_PICKLES = {}
 
-        lon_ticks_wgs = np.linspace(extent_wgs84[0], extent_wgs84[1], 8)
-        lat_ticks_wgs = np.linspace(extent_wgs84[2], extent_wgs84[3], 6)
-        
-        transformer_inv = Transformer.from_crs('EPSG:4326', src_crs, always_xy=True) if src_crs and src_crs.to_string() != 'EPSG:4326' else None
-        if transformer_inv:
-            lon_ticks_orig = [transformer_inv.transform(lon, extent_wgs84[2])[0] for lon in lon_ticks_wgs]
-            lat_ticks_orig = [transformer_inv.transform(extent_wgs84[0], lat)[1] for lat in lat_ticks_wgs]
-        else:
-            lon_ticks_orig = lon_ticks_wgs
-            lat_ticks_orig = lat_ticks_wgs
 
-        ax.set_xticks(lon_ticks_orig)
-        ax.set_yticks(lat_ticks_orig)
-        ax.grid(True, linestyle='--', linewidth=0.5, alpha=0.4, color='black', zorder=3)
+def template_key(extent_original, src_crs):
+    """Khóa template theo extent (làm tròn) và CRS"""
+    crs_str = src_crs if isinstance(src_crs, str) else src_crs.to_string()
+    return tuple(np.round(extent_original, 3)), crs_str
 
-        # Format nhãn
-        lon_labels = [f'{lon:.3f}°Đ' for lon in lon_ticks_wgs]
-        lat_labels = [f'{lat:.3f}°B' for lat in lat_ticks_wgs]
-            
-        ax.set_xticklabels(lon_labels, fontsize=9)
-        ax.set_yticklabels(lat_labels, fontsize=9)
-        ax.tick_params(axis='both', which='major', labelsize=9, top=True, right=True, labeltop=True, labelright=True)
 
-        # VẼ LA BÀN CẢI TIẾN - căn chỉnh vị trí
-        print("Vẽ la bàn...")
-        draw_compass_rose(ax, x_pos=0.93, y_pos=0.90, size=0.040)
+def _init_render_worker(template_pickles):
+    _TEMPLATE_PICKLES.update(template_pickles)
 
-        # Scale bar
-        km_per_deg = 111.32 * np.cos(np.radians((extent_wgs84[2]+extent_wgs84[3])/2))
 
-        x_start = extent_original[0] + width_range * 0.05
-        y_pos = extent_original[2] + height_range * 0.08
+def render_file(input_file, output_folder, basemap_options=None, hillshade_options=None):
+    """
+    Vẽ bản đồ cho một file phân ngưỡng (chạy được trong process con)
 
-        segments = [0, 10, 25, 50]  # km
-        bar_colors = ['black', 'white', 'black']
-        
-        scale_factor = width_range / lon_range
-        
-        # Nền trắng cho scale bar
-        total_width = (segments[-1] / km_per_deg) * scale_factor
-        bg_rect = Rectangle((x_start, y_pos - height_range*0.025),
-                           total_width * 1.3, height_range*0.045,
-                           facecolor='white', edgecolor='black', linewidth=1.5, zorder=9, alpha=0.9)
-        ax.add_patch(bg_rect)
-
-        # Vẽ scale bar
-        for i in range(len(segments)-1):
-            width_km = segments[i+1] - segments[i]
-            width = (width_km / km_per_deg) * scale_factor
-            rect = Rectangle((x_start + (segments[i]/km_per_deg) * scale_factor, y_pos),
-                            width, height_range*0.01,
-                            facecolor=bar_colors[i], edgecolor='black', linewidth=1, zorder=10)
-            ax.add_patch(rect)
-
-        # Labels cho scale bar
-        for km in segments:
-            ax.text(x_start + (km/km_per_deg) * scale_factor,
-                   y_pos - height_range*0.005, str(km),
-                   ha='center', va='top', fontsize=10, fontweight='bold', zorder=11,
-                   bbox=dict(boxstyle='round,pad=0.3', facecolor='white', edgecolor='none', alpha=0.8))
-
-        ax.text(x_start + (segments[-1]/km_per_deg) * scale_factor * 1.15,
-               y_pos + height_range*0.005, 'km',
-               ha='left', va='center', fontsize=11, fontweight='bold', zorder=11)
-
-        # Attribution
-        fig.text(0.99, 0.01, '© OpenStreetMap contributors | Machine Learning Model',
-                ha='right', va='bottom', fontsize=8, style='italic', alpha=0.7)
-
-        # Labels
-        ax.set_xlabel('Kinh độ', fontsize=12, fontweight='bold')
-        ax.set_ylabel('Vĩ độ', fontsize=12, fontweight='bold')
-
-        # Tiêu đề - trích xuất từ tên file
-        base_name = filename.replace('cliped_', '').replace('_thresholded', '').replace('.tif', '').replace('.tiff', '')
-        parts = base_name.replace('flood_susceptibility_', '').replace('flood_probability_', '').split('_')
-        if len(parts) >= 2:
-            algorithm = parts[0].upper()  # PSO, PUMA, RSO
-            model = parts[1].upper()      # RF, SVR, XGB
-            title = f'BẢN ĐỒ MỨC ĐỘ NHẠY CẢM VỚI NGẬP LỤT - {algorithm} + {model}'
-        else:
-            title = 'BẢN ĐỒ MỨC ĐỘ NHẠY CẢM VỚI NGẬP LỤT'
-        
-        ax.set_title(title, fontsize=16, fontweight='bold', pad=20)
+    Args:
+        input_file: Đường dẫn file TIFF phân ngưỡng
+        output_folder: Thư mục lưu PNG
+        basemap_options: dict tham số cho get_basemap, None = không vẽ bản đồ nền
+        hillshade_options: dict {'dem_path', 'cache_dir'}, None = không vẽ hillshade
 
-        plt.tight_layout(rect=[0, 0.02, 1, 1])
+    Returns:
+        dict {'file', 'output', 'seconds', 'ok', 'error'}
+    """
+    start = time.perf_counter()
+    filename = os.path.basename(input_file)
+    output_file = os.path.join(output_folder, output_png_name(filename))
+    result = {'file': filename, 'output': output_file, 'ok': False, 'error': None}
 
-        print(f"Lưu file: {output_file}")
-        plt.savefig(output_file, dpi=300, bbox_inches='tight', facecolor='white')
-        plt.close()
+    try:
+        data, extent_original, extent_wgs84, src_crs, nodata_value = read_tiff(input_file)
+        
+        # Mask NoData (giá trị 0) và NaN
+        mask_condition = np.isnan(data) | (data == 0)
+        if nodata_value is not None:
+            mask_condition = mask_condition | (data == nodata_value)
+        data_masked = np.ma.masked_where(mask_condition, data)
 
-        print(f"✓ Đã tạo bản đồ thành công!")
+        # Kiểm tra dữ liệu
+        print_level_stats(data_masked)
+
+        key = template_key(extent_original, src_crs)
+        if key not in _TEMPLATES:
+            if key in _TEMPLATE_PICKLES:
+                _TEMPLATES[key] = pickle.loads(_TEMPLATE_PICKLES[key])
+            else:
+                _TEMPLATES[key] = build_map_template(extent_original, extent_wgs84, src_crs,
+                                                     basemap_options, hillshade_options)
+
+        render_map(_TEMPLATES[key], data_masked, map_title(filename), output_file)
+        result['ok'] = True
         
     except Exception as e:
-        print(f"✗ LỖI khi xử lý: {str(e)}")
         import traceback
         traceback.print_exc()
+        result['error'] = str(e)
+
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def prepare_templates(tiff_files, basemap_options=None, hillshade_options=None):
+    """
+    Dựng một lần template (bản đồ nền, hillshade, khung bản đồ) cho mỗi extent khác nhau
+    (chỉ đọc header của file). Template được lưu vào _TEMPLATES của process chính.
 
-# ===== TỔNG KẾT =====
-print("\n" + "="*80)
-print("✓ HOÀN THÀNH TẤT CẢ!")
-print("="*80)
-print(f"Kết quả lưu tại: {output_folder}")
-print("="*80)
\ No newline at end of file
+    Returns:
+        dict khóa template -> template đã pickle để gửi cho các process con
+    """
+    pickles = {}
+    for input_file in tiff_files:
+        with rasterio.open(input_file) as ds:
+            bounds = ds.bounds
+            extent = [bounds.left, bounds.right, bounds.bottom, bounds.top]
+            key = template_key(extent, ds.crs)
+            if key in pickles:
+                continue
+            if key not in _TEMPLATES:
+                _TEMPLATES[key] = build_map_template(extent, wgs84_extent(bounds, ds.crs), ds.crs,
+                                                     basemap_options, hillshade_options)
+            pickles[key] = pickle.dumps(_TEMPLATES[key], protocol=pickle.HIGHEST_PROTOCOL)
+    return pickles
+
+
+def tao_ban_do(input_folder, output_folder, subfolders=['rf', 'svr', 'xgb'], exclude_folders=['thresholded'],
+               basemap_source=OSM_URL, tile_cache_dir=DEFAULT_CACHE_DIR, basemap_offline=False,
+               basemap_zoom=None, background='basemap', dem_path=None,
+               hillshade_cache_dir=HILLSHADE_CACHE_DIR, max_workers=None):
+    """
+    Vẽ bản đồ PNG cho tất cả file phân ngưỡng, song song nhiều process (backend Agg)
+
+    Args:
+        input_folder: Thư mục gốc chứa các thư mục con (rf, svr, xgb)
+        output_folder: Thư mục lưu PNG
+        subfolders: Danh sách thư mục con cần xử lý
+        exclude_folders: Danh sách thư mục cần bỏ qua
+        basemap_source: URL XYZ (có cache trên đĩa), thư mục tile XYZ hoặc file .mbtiles
+        tile_cache_dir: Thư mục cache tile và mosaic
+        basemap_offline: True = chỉ dùng tile đã có trong cache (máy không có mạng)
+        basemap_zoom: Mức zoom, None = tự chọn theo extent
+        background: Nền bản đồ: 'basemap' (tile OSM), 'hillshade' (từ DEM, hoàn toàn offline),
+                    'both' hoặc None (không có nền)
+        dem_path: File DEM dùng cho hillshade
+        hillshade_cache_dir: Thư mục cache hillshade
+        max_workers: Số process (mặc định = số CPU), 1 = chạy tuần tự
+
+    Returns:
+        Danh sách kết quả của render_file cho từng bản đồ
+    """
+    # Tạo thư mục output nếu chưa có
+    os.makedirs(output_folder, exist_ok=True)
+
+    print(f"Đang tìm kiếm file TIFF trong: {input_folder}")
+    print(f"Thư mục con xử lý: {', '.join(subfolders)}")
+    print(f"Thư mục bỏ qua: {', '.join(exclude_folders)}")
+    print("="*80)
+
+    all_tiff_files = find_tiff_files(input_folder, subfolders, exclude_folders)
+
+    print("\n" + "="*80)
+    print(f"Tìm thấy {len(all_tiff_files)} file TIFF:")
+    for i, file in enumerate(all_tiff_files, 1):
+        print(f"  {i}. {os.path.basename(file)}")
+    print("="*80)
+
+    if not all_tiff_files:
+        return []
+
+    start = time.perf_counter()
+
+    basemap_options = None
+    hillshade_options = None
+    if background in ('basemap', 'both'):
+        basemap_options = dict(source=basemap_source, cache_dir=tile_cache_dir,
+                               offline=basemap_offline, zoom=basemap_zoom)
+    if background in ('hillshade', 'both'):
+        if dem_path is None:
+            raise ValueError("Cần dem_path khi background là 'hillshade' hoặc 'both'")
+        hillshade_options = dict(dem_path=dem_path, cache_dir=hillshade_cache_dir)
+    # Khung bản đồ (cả nền và hillshade) chỉ dựng một lần cho mỗi extent ở process chính,
+    # các process con nhận bản pickle thay vì tự dựng lại
+    print("Dựng khung bản đồ...")
+    template_pickles = prepare_templates(all_tiff_files, basemap_options, hillshade_options)
+    print(f"✓ Đã dựng khung bản đồ cho {len(template_pickles)} extent")
+
+    if max_workers is None:
+        max_workers = min(len(all_tiff_files), os.cpu_count() or 1)
+
+    # ===== VẼ SONG SONG =====
+    results = []
+    if max_workers <= 1:
+        for input_file in all_tiff_files:
+            results.append(render_file(input_file, output_folder, basemap_options, hillshade_options))
+            report = results[-1]
+            print(f"{'✓' if report['ok'] else '✗'} {report['file']}: {report['seconds']:.1f}s")
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_render_worker,
+                                 initargs=(template_pickles,)) as executor:
+            futures = [executor.submit(render_file, f, output_folder, basemap_options, hillshade_options)
+                       for f in all_tiff_files]
+            for future in as_completed(futures):
+                report = future.result()
+                results.append(report)
+                print(f"{'✓' if report['ok'] else '✗'} {report['file']}: {report['seconds']:.1f}s")
+
+    # ===== TỔNG KẾT =====
+    print("\n" + "="*80)
+    print("THỜI GIAN VẼ TỪNG BẢN ĐỒ")
+    print("="*80)
+    for report in sorted(results, key=lambda r: r['file']):
+        status = '✓' if report['ok'] else f"✗ {report['error']}"
+        print(f"  {os.path.basename(report['output']):<20} {report['seconds']:6.1f}s  {status}")
+    print(f"\nTổng thời gian: {time.perf_counter() - start:.1f}s với {max_workers} process")
+    print(f"Thành công: {sum(r['ok'] for r in results)}/{len(results)}")
+    print(f"Kết quả lưu tại: {output_folder}")
+    print("="*80)
+    return results
+
+
+if __name__ == "__main__":
+    # ===== CẤU HÌNH THƯ MỤC =====
+    input_folder = r"D:\prj\results\map\threshold"
+    output_folder = r"D:\prj\map\ThreshHold"
+
+    tao_ban_do(
+        input_folder,
+        output_folder,
+        subfolders=['rf', 'svr', 'xgb'],     # Các thư mục con cần xử lý
+        exclude_folders=['thresholded'],     # Các thư mục cần bỏ qua
+        basemap_source=OSM_URL,              # URL XYZ, thư mục tile XYZ hoặc file .mbtiles
+        tile_cache_dir=DEFAULT_CACHE_DIR,
+        basemap_offline=False,               # True = chỉ dùng tile đã có trong cache
+        basemap_zoom=None,                   # None = tự chọn theo extent
+        background='basemap',                # 'hillshade' = nền bóng địa hình từ DEM, không cần mạng
+        dem_path=r"D:\prj\feature\gialai_dem.tif"
+    )
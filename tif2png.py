@@ -1,50 +1,191 @@
+"""
+Chuyển đổi TIFF sang PNG bằng bảng màu (LUT 256 màu), không dùng matplotlib
+
+Ảnh được đọc theo từng dải, giá trị được kéo giãn (min-max hoặc theo phân vị)
+về chỉ số 0-254, chỉ số 255 dành cho NoData (trong suốt).
+Ảnh ghi ra dạng PNG indexed (palette) hoặc RGBA bằng Pillow.
+"""
+
+import os
+import numpy as np
 import rasterio
 from PIL import Image
-import numpy as np
-import matplotlib.pyplot as plt
+from rasterio.enums import Resampling
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from raster_io import list_tiff_files, valid_mask, iter_windows, hist_percentiles
+
+NODATA_INDEX = 255
+
+# Các điểm màu của bảng màu (vị trí 0-1, màu hex)
+COLOR_STOPS = {
+    'viridis': [
+        (0.0, '#440154'), (0.1, '#482475'), (0.2, '#414487'), (0.3, '#355f8d'),
+        (0.4, '#2a788e'), (0.5, '#21918c'), (0.6, '#22a884'), (0.7, '#44bf70'),
+        (0.8, '#7ad151'), (0.9, '#bddf26'), (1.0, '#fde725'),
+    ],
+    # Bảng màu hiển thị trong rf.js / xgb.js / svm.js
+    'susceptibility': [(0.0, '#00FF00'), (1 / 3, '#FFFF00'), (2 / 3, '#FF9900'), (1.0, '#FF0000')],
+    'gray': [(0.0, '#000000'), (1.0, '#FFFFFF')],
+}
+
+
+def build_lut(cmap='viridis'):
+    """
+    Bảng màu RGBA 256 mục: 0-254 là màu dữ liệu, 255 là NoData (trong suốt)
+
+    Args:
+        cmap: Tên bảng màu trong COLOR_STOPS hoặc danh sách (vị trí, màu hex)
+    """
+    stops = COLOR_STOPS[cmap] if isinstance(cmap, str) else cmap
+    positions = np.array([p for p, _ in stops])
+    colors = np.array([[int(c[i:i + 2], 16) for i in (1, 3, 5)] for _, c in stops], dtype=np.float64)
+    x = np.linspace(0, 1, NODATA_INDEX)
+    lut = np.zeros((256, 4), dtype=np.uint8)
+    for channel in range(3):
+        lut[:NODATA_INDEX, channel] = np.round(np.interp(x, positions, colors[:, channel]))
+    lut[:NODATA_INDEX, 3] = 255
+    return lut
+
+
+def compute_stretch(ds, percent_clip=None, n_bins=4096):
+    """
+    Khoảng giá trị (vmin, vmax) để kéo giãn màu, đọc theo khối
+
+    Args:
+        ds: rasterio dataset đang mở
+        percent_clip: None = min/max, hoặc (p_low, p_high), vd (2, 98)
+        n_bins: Số bin histogram khi tính phân vị
+    """
+    vmin, vmax = np.inf, -np.inf
+    for window in iter_windows(ds):
+        data = ds.read(1, window=window)
+        values = data[valid_mask(data, ds.nodata)]
+        if values.size:
+            vmin = min(vmin, float(values.min()))
+            vmax = max(vmax, float(values.max()))
+
+    if percent_clip is None or not np.isfinite(vmin) or vmax <= vmin:
+        return vmin, vmax
+
+    hist = np.zeros(n_bins, dtype=np.int64)
+    for window in iter_windows(ds):
+        data = ds.read(1, window=window)
+        values = data[valid_mask(data, ds.nodata)]
+        hist += np.histogram(values, bins=n_bins, range=(vmin, vmax))[0]
+    edges = np.linspace(vmin, vmax, n_bins + 1)
+    low, high = hist_percentiles(hist, edges, percent_clip)
+    return float(low), float(high)
+
 
-def tif_to_png(input_tif, output_png):
+def tif_to_png(input_tif, output_png, cmap='viridis', percent_clip=None, max_size=None, mode='P',
+               vmin=None, vmax=None):
     """
     Chuyển đổi file TIFF thành PNG với hiển thị màu sắc
-    
+
     Args:
         input_tif: Đường dẫn đến file TIFF đầu vào
         output_png: Đường dẫn đến file PNG đầu ra
+        cmap: Tên bảng màu ('viridis', 'susceptibility', 'gray') hoặc danh sách điểm màu
+        percent_clip: None = kéo giãn min-max, hoặc (p_low, p_high) để kéo giãn theo phân vị
+        max_size: Cạnh dài nhất của ảnh đầu ra (ảnh thu nhỏ), None = giữ kích thước gốc
+        mode: 'P' = PNG indexed (nhỏ gọn), 'RGBA' = PNG 4 kênh
+        vmin, vmax: Khoảng giá trị cố định (bỏ qua bước tính khoảng)
+
+    Returns:
+        (vmin, vmax, (rows, cols)) của ảnh đã ghi
     """
-    # Đọc file TIFF
+    lut = build_lut(cmap)
+
     with rasterio.open(input_tif) as src:
-        # Đọc dữ liệu
-        data = src.read(1)  # Đọc band đầu tiên
-        
-        # Loại bỏ giá trị NoData (-9999.0)
-        nodata_value = -9999.0
-        data_masked = np.ma.masked_where(data == nodata_value, data)
-        
-        # Chuẩn hóa dữ liệu về khoảng 0-255 (chỉ tính với dữ liệu hợp lệ)
-        data_min = data_masked.min()
-        data_max = data_masked.max()
-        
-        # Tạo ảnh màu bằng colormap
-        plt.figure(figsize=(10, 8))
-        plt.imshow(data_masked, cmap='viridis')  # Sử dụng colormap viridis, NoData sẽ không hiển thị
-        plt.colorbar(label='Giá trị')
-        plt.title('Rainfall 30m')
-        plt.axis('off')
-        
-        # Lưu file PNG với colormap
-        plt.savefig(output_png, bbox_inches='tight', dpi=300, pad_inches=0.1)
-        plt.close()
-        
-        print(f"Đã chuyển đổi thành công: {output_png}")
-        print(f"Kích thước ảnh: {data.shape}")
-        print(f"Giá trị min: {data_min:.2f}, max: {data_max:.2f}")
+        # NoData lấy từ metadata của file
+        nodata = src.nodata
+
+        if vmin is None or vmax is None:
+            data_min, data_max = compute_stretch(src, percent_clip)
+            vmin = data_min if vmin is None else vmin
+            vmax = data_max if vmax is None else vmax
+
+        scale = 1.0
+        if max_size is not None:
+            scale = max(src.height / max_size, src.width / max_size, 1.0)
+        out_h = max(1, int(round(src.height / scale)))
+        out_w = max(1, int(round(src.width / scale)))
+
+        indices = np.full((out_h, out_w), NODATA_INDEX, dtype=np.uint8)
+        span = (vmax - vmin) if np.isfinite(vmin) and vmax > vmin else 1.0
+
+        # Đọc theo dải hàng của ảnh đầu ra (giảm mẫu nếu là ảnh thu nhỏ)
+        for window in iter_windows(src):
+            out_r0 = int(round(window.row_off / scale))
+            out_r1 = int(round((window.row_off + window.height) / scale))
+            if out_r1 <= out_r0:
+                continue
+            if scale > 1.0:
+                data = src.read(1, window=window, out_shape=(out_r1 - out_r0, out_w),
+                                resampling=Resampling.nearest)
+            else:
+                data = src.read(1, window=window)
+            valid = valid_mask(data, nodata)
+            scaled = (data.astype(np.float32) - vmin) / span
+            block = np.full(data.shape, NODATA_INDEX, dtype=np.uint8)
+            block[valid] = np.round(np.clip(scaled[valid], 0, 1) * (NODATA_INDEX - 1)).astype(np.uint8)
+            indices[out_r0:out_r1] = block
+
+    if mode == 'P':
+        image = Image.fromarray(indices, 'P')
+        image.putpalette(lut[:, :3].ravel().tolist())
+        image.info['transparency'] = NODATA_INDEX
+        image.save(output_png, transparency=NODATA_INDEX, optimize=False)
+    else:
+        Image.fromarray(lut[indices], 'RGBA').save(output_png)
+
+    print(f"Đã chuyển đổi thành công: {output_png}")
+    print(f"Kích thước ảnh: {indices.shape}")
+    print(f"Giá trị min: {vmin:.2f}, max: {vmax:.2f}")
+    return vmin, vmax, indices.shape
+
+
+def convert_folder(input_folder, output_folder, max_workers=None, **kwargs):
+    """
+    Chuyển đổi tất cả file TIFF trong thư mục sang PNG, song song nhiều process
+
+    Args:
+        input_folder: Thư mục chứa file TIFF
+        output_folder: Thư mục lưu PNG
+        max_workers: Số process (mặc định = số CPU)
+        **kwargs: Tham số truyền cho tif_to_png (cmap, percent_clip, max_size, mode, ...)
+    """
+    os.makedirs(output_folder, exist_ok=True)
+    tiff_files = list_tiff_files(input_folder)
+    print(f"Tìm thấy {len(tiff_files)} file TIFF trong: {input_folder}")
+
+    success_count = 0
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        for tiff_file in tiff_files:
+            name = os.path.splitext(os.path.basename(tiff_file))[0] + '.png'
+            futures[executor.submit(tif_to_png, tiff_file, os.path.join(output_folder, name), **kwargs)] = tiff_file
+        for future in as_completed(futures):
+            try:
+                future.result()
+                success_count += 1
+            except Exception as e:
+                print(f"✗ Lỗi khi chuyển đổi {os.path.basename(futures[future])}: {e}")
+
+    print(f"Thành công: {success_count}/{len(tiff_files)}")
+    return success_count
+
 
 if __name__ == "__main__":
     # Đường dẫn file đầu vào
     input_file = r"D:\prj\feature\rainfall_30m.tif"
-    
+
     # Đường dẫn file đầu ra
     output_file = r"D:\prj\feature\rainfall_30m.png"
-    
-    # Chuyển đổi
-    tif_to_png(input_file, output_file)
+
+    # Chuyển đổi (kéo giãn theo phân vị 2-98%)
+    tif_to_png(input_file, output_file, cmap='viridis', percent_clip=(2, 98))
+
+    # Chuyển cả thư mục thành ảnh thu nhỏ 1024 px
+    # convert_folder(r"D:\prj\feature", r"D:\prj\feature\png", max_size=1024)
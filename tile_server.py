@@ -0,0 +1,344 @@
+"""
+Máy chủ tile XYZ cục bộ cho các bản đồ nhạy cảm ngập lụt
+
+Phục vụ /{layer}/{z}/{x}/{y}.png từ các GeoTIFF liên tục (0-1) và đã phân ngưỡng (1-5),
+tô màu theo bảng màu get_threshold_colormap của tao_ban_do.
+Tile được render khi có yêu cầu (đọc giảm mẫu để GDAL dùng overview),
+lưu trong cache LRU trên bộ nhớ và cache trên đĩa.
+
+Xem bản đồ: mở http://127.0.0.1:8765/ trong trình duyệt
+"""
+
+import os
+import io
+import json
+import time
+import random
+import asyncio
+import threading
+import functools
+import numpy as np
+import rasterio
+from PIL import Image
+from matplotlib.colors import to_rgba
+from concurrent.futures import ThreadPoolExecutor
+from rasterio.windows import Window, from_bounds as window_from_bounds
+from rasterio.transform import from_bounds
+from rasterio.warp import reproject, transform_bounds
+from rasterio.enums import Resampling
+
+from raster_io import list_tiff_files
+from tao_ban_do import get_threshold_colormap, parse_algorithm_model
+from phan_nguong import BREAKS
+
+TILE_SIZE = 256
+WEB_MERCATOR_ORIGIN = 20037508.342789244
+
+# ===== CẤU HÌNH MÁY CHỦ =====
+_LAYERS = {}          # {tên lớp: đường dẫn file}
+_CACHE_DIR = None     # Thư mục cache tile trên đĩa, None = không dùng
+_LOCAL = threading.local()
+
+
+def _palette_lut():
+    """Bảng màu RGBA 256 mục từ get_threshold_colormap (0 = trong suốt)"""
+    cmap, _ = get_threshold_colormap()
+    lut = np.zeros((256, 4), dtype=np.uint8)
+    for i, color in enumerate(cmap.colors):
+        lut[i] = np.round(np.array(to_rgba(color)) * 255).astype(np.uint8)
+    lut[0] = 0
+    return lut
+
+
+PALETTE = _palette_lut()
+
+
+def discover_layers(folders, subfolders=['rf', 'svr', 'xgb']):
+    """
+    Tìm các lớp cần phục vụ
+
+    Args:
+        folders: dict {tiền tố: thư mục gốc}, vd: {'map': ..., 'threshold': ...}
+        subfolders: Các thư mục con chứa file của từng mô hình
+
+    Returns:
+        dict {tên lớp: đường dẫn}, vd: 'threshold_pso_RF'
+    """
+    layers = {}
+    for prefix, root in folders.items():
+        for subfolder in subfolders:
+            folder = os.path.join(root, subfolder)
+            if not os.path.isdir(folder):
+                continue
+            for path in list_tiff_files(folder):
+                parsed = parse_algorithm_model(os.path.basename(path))
+                stem = f"{parsed[0]}_{parsed[1]}" if parsed else os.path.splitext(os.path.basename(path))[0]
+                layers[f"{prefix}_{stem}"] = path
+    return layers
+
+
+def _dataset(path):
+    """Dataset mở sẵn cho từng luồng (rasterio dataset không an toàn khi dùng chung giữa các luồng)"""
+    handles = getattr(_LOCAL, 'handles', None)
+    if handles is None:
+        handles = _LOCAL.handles = {}
+    if path not in handles:
+        handles[path] = rasterio.open(path)
+    return handles[path]
+
+
+def tile_bounds(z, x, y):
+    """Bounds (left, bottom, right, top) của tile theo EPSG:3857"""
+    tile_m = 2 * WEB_MERCATOR_ORIGIN / 2 ** z
+    left = -WEB_MERCATOR_ORIGIN + x * tile_m
+    top = WEB_MERCATOR_ORIGIN - y * tile_m
+    return left, top - tile_m, left + tile_m, top
+
+
+def _encode_png(rgba):
+    buffer = io.BytesIO()
+    Image.fromarray(rgba, 'RGBA').save(buffer, format='PNG', optimize=False, compress_level=1)
+    return buffer.getvalue()
+
+
+EMPTY_TILE = _encode_png(np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8))
+
+
+def render_tile(path, z, x, y):
+    """
+    Render một tile PNG từ GeoTIFF
+
+    Chỉ đọc vùng ảnh nằm dưới tile, ở độ phân giải gần với tile
+    (GDAL tự chọn overview), rồi chiếu lại sang lưới EPSG:3857 256x256.
+    """
+    ds = _dataset(path)
+    merc = tile_bounds(z, x, y)
+    left, bottom, right, top = transform_bounds('EPSG:3857', ds.crs, *merc, densify_pts=21)
+    b = ds.bounds
+    if right <= b.left or left >= b.right or top <= b.bottom or bottom >= b.top:
+        return EMPTY_TILE
+
+    is_class = np.issubdtype(np.dtype(ds.dtypes[0]), np.integer)
+    nodata = ds.nodata
+
+    # Đọc vùng ảnh dưới tile, giảm mẫu về tối đa 2 lần kích thước tile
+    window = window_from_bounds(left, bottom, right, top, ds.transform)
+    col_off, row_off = int(np.floor(window.col_off)), int(np.floor(window.row_off))
+    window = Window(col_off, row_off,
+                    int(np.ceil(window.col_off + window.width)) - col_off,
+                    int(np.ceil(window.row_off + window.height)) - row_off)
+    scale = max(window.height / (2 * TILE_SIZE), window.width / (2 * TILE_SIZE), 1.0)
+    out_shape = (max(1, int(np.ceil(window.height / scale))), max(1, int(np.ceil(window.width / scale))))
+    fill = nodata if nodata is not None else (0 if is_class else np.nan)
+    src = ds.read(1, window=window, out_shape=out_shape, boundless=True, fill_value=fill,
+                  resampling=Resampling.mode if is_class else Resampling.average)
+    win_bounds = ds.window_bounds(window)
+    src_transform = from_bounds(*win_bounds, out_shape[1], out_shape[0])
+
+    dst = np.full((TILE_SIZE, TILE_SIZE), np.nan, dtype=np.float32)
+    reproject(src.astype(np.float32), dst, src_transform=src_transform, src_crs=ds.crs,
+              src_nodata=np.nan if nodata is None else nodata,
+              dst_transform=from_bounds(*merc, TILE_SIZE, TILE_SIZE), dst_crs='EPSG:3857',
+              dst_nodata=np.nan, resampling=Resampling.nearest if is_class else Resampling.bilinear)
+
+    # Phân lớp (ảnh liên tục) rồi tô màu bằng bảng màu phân ngưỡng
+    valid = ~np.isnan(dst)
+    classes = np.zeros(dst.shape, dtype=np.uint8)
+    if is_class:
+        classes[valid] = np.clip(dst[valid], 0, 5).astype(np.uint8)
+    else:
+        valid &= (dst >= 0) & (dst <= 1)
+        classes[valid] = np.digitize(dst[valid], BREAKS, right=True) + 1
+    if not classes.any():
+        return EMPTY_TILE
+    return _encode_png(PALETTE[classes])
+
+
+@functools.lru_cache(maxsize=4096)
+def get_tile(layer, z, x, y):
+    """Tile PNG của một lớp, qua cache LRU trong bộ nhớ và cache trên đĩa"""
+    path = _LAYERS[layer]
+    cache_path = None
+    if _CACHE_DIR:
+        cache_path = os.path.join(_CACHE_DIR, layer, str(z), str(x), f"{y}.png")
+        # Chỉ dùng tile cache nếu mới hơn file nguồn
+        if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(path):
+            with open(cache_path, 'rb') as f:
+                return f.read()
+
+    content = render_tile(path, z, x, y)
+
+    if cache_path:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = f"{cache_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, cache_path)
+    return content
+
+
+def _index_html():
+    """Trang xem bản đồ đơn giản bằng Leaflet"""
+    layers = json.dumps(sorted(_LAYERS))
+    return f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Bản đồ nhạy cảm ngập lụt</title>
+<link rel="stylesheet" href="https://unpkg.com/leaflet@1.9.4/dist/leaflet.css"/>
+<script src="https://unpkg.com/leaflet@1.9.4/dist/leaflet.js"></script>
+<style>html,body,#map{{height:100%;margin:0}}</style></head>
+<body><div id="map"></div><script>
+var map = L.map('map').setView([13.8, 108.2], 9);
+L.tileLayer('https://tile.openstreetmap.org/{{z}}/{{x}}/{{y}}.png', {{maxZoom: 18, opacity: 0.5}}).addTo(map);
+var overlays = {{}};
+{layers}.forEach(function(name, i) {{
+  overlays[name] = L.tileLayer('/' + name + '/{{z}}/{{x}}/{{y}}.png', {{maxZoom: 18, opacity: 0.85}});
+  if (i === 0) overlays[name].addTo(map);
+}});
+L.control.layers(overlays, {{}}, {{collapsed: false}}).addTo(map);
+</script></body></html>""".encode('utf-8')
+
+
+def _response(status, content_type, body):
+    header = (f"HTTP/1.1 {status}\r\n"
+              f"Content-Type: {content_type}\r\n"
+              f"Content-Length: {len(body)}\r\n"
+              "Access-Control-Allow-Origin: *\r\n"
+              "Cache-Control: public, max-age=3600\r\n"
+              "Connection: keep-alive\r\n\r\n")
+    return header.encode('ascii') + body
+
+
+async def _handle_client(reader, writer, executor):
+    """Xử lý các request HTTP/1.1 (keep-alive) trên một kết nối"""
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            # Bỏ qua phần header
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+
+            parts = request_line.decode('latin-1').split()
+            path = parts[1].split('?')[0] if len(parts) >= 2 else '/'
+            segments = [s for s in path.split('/') if s]
+
+            if not segments:
+                writer.write(_response('200 OK', 'text/html; charset=utf-8', _index_html()))
+            elif segments == ['layers']:
+                writer.write(_response('200 OK', 'application/json', json.dumps(sorted(_LAYERS)).encode('utf-8')))
+            elif len(segments) == 4 and segments[0] in _LAYERS and segments[3].endswith('.png'):
+                try:
+                    z, x, y = int(segments[1]), int(segments[2]), int(segments[3][:-4])
+                    body = await loop.run_in_executor(executor, get_tile, segments[0], z, x, y)
+                    writer.write(_response('200 OK', 'image/png', body))
+                except Exception as e:
+                    writer.write(_response('500 Internal Server Error', 'text/plain', str(e).encode('utf-8')))
+            else:
+                writer.write(_response('404 Not Found', 'text/plain', b'not found'))
+            await writer.drain()
+    except (ConnectionResetError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(layers, host='127.0.0.1', port=8765, cache_dir=None, max_workers=None):
+    """
+    Chạy máy chủ tile (chạy mãi cho đến khi dừng)
+
+    Args:
+        layers: dict {tên lớp: đường dẫn GeoTIFF} (xem discover_layers)
+        host, port: Địa chỉ lắng nghe
+        cache_dir: Thư mục cache tile trên đĩa, None = chỉ cache trong bộ nhớ
+        max_workers: Số luồng render tile
+    """
+    global _CACHE_DIR
+    _LAYERS.clear()
+    _LAYERS.update(layers)
+    _CACHE_DIR = cache_dir
+    get_tile.cache_clear()
+
+    executor = ThreadPoolExecutor(max_workers=max_workers or os.cpu_count())
+    server = await asyncio.start_server(lambda r, w: _handle_client(r, w, executor), host, port)
+    print("="*60)
+    print(f"MÁY CHỦ TILE: http://{host}:{port}/")
+    print("="*60)
+    for name, path in sorted(layers.items()):
+        print(f"  /{name}/{{z}}/{{x}}/{{y}}.png  <- {path}")
+    async with server:
+        await server.serve_forever()
+
+
+# ===== ĐO HIỆU NĂNG =====
+async def _fetch(host, port, paths, latencies, errors):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for path in paths:
+            start = time.perf_counter()
+            writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode('ascii'))
+            await writer.drain()
+            status = await reader.readline()
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b''):
+                    break
+                if line.lower().startswith(b'content-length:'):
+                    length = int(line.split(b':')[1])
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - start)
+            if b' 200 ' not in status:
+                errors.append(path)
+    finally:
+        writer.close()
+
+
+async def benchmark(layer, path, zoom, host='127.0.0.1', port=8765, n_requests=500, concurrency=16, seed=42):
+    """
+    Đo tốc độ máy chủ: gửi n_requests tile ngẫu nhiên trong extent của lớp qua concurrency kết nối
+
+    Returns:
+        dict {'tiles_per_second', 'p50_ms', 'p90_ms', 'p99_ms', 'max_ms', 'errors'}
+    """
+    from basemap_cache import tile_range
+
+    with rasterio.open(path) as ds:
+        extent = [ds.bounds.left, ds.bounds.right, ds.bounds.bottom, ds.bounds.top]
+        crs = ds.crs.to_string()
+    x0, x1, y0, y1 = tile_range(extent, crs, zoom)
+    rng = random.Random(seed)
+    paths = [f"/{layer}/{zoom}/{rng.randint(x0, x1)}/{rng.randint(y0, y1)}.png" for _ in range(n_requests)]
+
+    latencies = []
+    errors = []
+    start = time.perf_counter()
+    await asyncio.gather(*[_fetch(host, port, paths[i::concurrency], latencies, errors) for i in range(concurrency)])
+    elapsed = time.perf_counter() - start
+
+    ms = np.array(latencies) * 1000
+    result = {
+        'tiles_per_second': len(latencies) / elapsed,
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p90_ms': float(np.percentile(ms, 90)),
+        'p99_ms': float(np.percentile(ms, 99)),
+        'max_ms': float(ms.max()),
+        'errors': len(errors),
+    }
+    print(f"Benchmark {layer} zoom {zoom}: {len(latencies)} tile, {concurrency} kết nối")
+    print(f"  {result['tiles_per_second']:.1f} tile/s | p50 {result['p50_ms']:.1f} ms | "
+          f"p90 {result['p90_ms']:.1f} ms | p99 {result['p99_ms']:.1f} ms | max {result['max_ms']:.1f} ms")
+    if errors:
+        print(f"  ⚠ {len(errors)} request lỗi, vd: {errors[0]}")
+    return result
+
+
+if __name__ == "__main__":
+    # Thư mục ảnh liên tục (0-1) và ảnh đã phân ngưỡng (1-5)
+    layers = discover_layers({
+        'map': r"D:\prj\results\map",
+        'threshold': r"D:\prj\results\map\threshold",
+    })
+    cache_dir = r"D:\prj\tile_cache\susceptibility"
+
+    asyncio.run(serve(layers, host='127.0.0.1', port=8765, cache_dir=cache_dir))
@@ -0,0 +1,257 @@
+"""
+Tính chỉ số kiểm định cho cả 9 mô hình (3 thuật toán tối ưu x RF, SVM, XGB) trong một lần
+
+Chín file validation_{pso,puma,rs}_{RF,SVM,XGB}.csv (cột flood, prediction, lat, lon,
+xuất từ các script .js) được đọc một lần và nối thành các mảng cột liên tục, mỗi mô hình
+là một đoạn [offsets[i], offsets[i+1]). Mọi chỉ số được tính đồng thời cho tất cả các
+đoạn bằng np.add.reduceat / np.bincount, khoảng tin cậy bootstrap chạy song song.
+"""
+
+import os
+import time
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+OPTIMIZERS = ['pso', 'puma', 'rs']
+MODELS = ['RF', 'SVM', 'XGB']
+METRICS = ['n', 'r2', 'mae', 'rmse', 'bias', 'auc', 'ece']
+N_BINS = 10
+N_BOOTSTRAP = 1000
+SEED = 42
+
+# Mảng cột của mỗi process bootstrap
+_STORE = {}
+
+
+def _init_worker(store):
+    _STORE.update(store)
+
+
+def load_validation(input_dir, optimizers=OPTIMIZERS, models=MODELS, max_workers=None):
+    """
+    Đọc các file validation_<opt>_<MODEL>.csv vào bộ nhớ dạng cột
+
+    Args:
+        input_dir: Thư mục chứa các file validation
+        optimizers, models: Danh sách thuật toán và mô hình cần đọc
+
+    Returns:
+        dict: keys [(optimizer, model)], offsets, flood, prediction, lat, lon (mảng nối liền)
+    """
+    names = [(opt, model) for opt in optimizers for model in models]
+    paths = [os.path.join(input_dir, f"validation_{opt}_{model}.csv") for opt, model in names]
+
+    def read(path):
+        if not os.path.exists(path):
+            return None
+        df = pd.read_csv(path, usecols=lambda c: c in ('flood', 'prediction', 'lat', 'lon'))
+        return df.dropna(subset=['flood', 'prediction'])
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        tables = list(executor.map(read, paths))
+
+    keys, frames = [], []
+    for name, path, df in zip(names, paths, tables):
+        if df is None:
+            print(f"⚠ Không tìm thấy file: {path}")
+        elif len(df) == 0:
+            print(f"⚠ File rỗng: {path}")
+        else:
+            keys.append(name)
+            frames.append(df)
+    if not frames:
+        raise FileNotFoundError(f"Không có file validation nào trong {input_dir}")
+
+    sizes = np.array([len(df) for df in frames])
+    store = {'keys': keys, 'offsets': np.concatenate([[0], np.cumsum(sizes)])}
+    for column in ('flood', 'prediction', 'lat', 'lon'):
+        store[column] = np.concatenate([
+            df[column].to_numpy(dtype=np.float64) if column in df else np.full(len(df), np.nan)
+            for df in frames
+        ])
+    print(f"Đã đọc {len(keys)} mô hình, {store['offsets'][-1]:,} điểm kiểm định")
+    return store
+
+
+def _segment_ids(offsets):
+    return np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+
+
+def _auc(obs, pred, seg, n_segments):
+    """ROC-AUC từng đoạn theo thống kê Mann-Whitney (hạng trung bình khi trùng giá trị)"""
+    positive = obs >= 0.5
+    order = np.lexsort((pred, seg))
+    s, p = seg[order], pred[order]
+    starts = np.concatenate([[0], np.cumsum(np.bincount(s, minlength=n_segments))[:-1]])
+    rank = np.arange(len(p)) - starts[s] + 1.0
+    # Gộp các giá trị trùng trong cùng đoạn thành hạng trung bình
+    change = np.concatenate([[True], (s[1:] != s[:-1]) | (p[1:] != p[:-1])])
+    group = np.cumsum(change) - 1
+    rank = (np.bincount(group, weights=rank) / np.bincount(group))[group]
+
+    pos_sorted = positive[order]
+    n_pos = np.bincount(s, weights=pos_sorted, minlength=n_segments)
+    n_neg = np.bincount(s, minlength=n_segments) - n_pos
+    rank_sum = np.bincount(s, weights=rank * pos_sorted, minlength=n_segments)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (rank_sum - n_pos * (n_pos + 1) / 2) / (n_pos * n_neg)
+
+
+def _calibration(obs, pred, seg, n_segments, n_bins=N_BINS):
+    """Số điểm, dự đoán trung bình, tỷ lệ quan sát trong từng bin (n_segments, n_bins)"""
+    bins = np.clip((pred * n_bins).astype(np.int64), 0, n_bins - 1)
+    index = seg * n_bins + bins
+    size = n_segments * n_bins
+    count = np.bincount(index, minlength=size).reshape(n_segments, n_bins)
+    sum_pred = np.bincount(index, weights=pred, minlength=size).reshape(n_segments, n_bins)
+    sum_obs = np.bincount(index, weights=obs, minlength=size).reshape(n_segments, n_bins)
+    return count, sum_pred, sum_obs
+
+
+def segment_metrics(obs, pred, offsets, n_bins=N_BINS):
+    """
+    Tính METRICS cho mọi đoạn cùng lúc
+
+    Returns:
+        np.ndarray (len(METRICS), số đoạn)
+    """
+    n_segments = len(offsets) - 1
+    starts = offsets[:-1]
+    n = np.diff(offsets).astype(np.float64)
+    seg = _segment_ids(offsets)
+    residual = pred - obs
+
+    mean_obs = np.add.reduceat(obs, starts) / n
+    ss_tot = np.add.reduceat((obs - mean_obs[seg]) ** 2, starts)
+    ss_res = np.add.reduceat(residual ** 2, starts)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        r2 = 1 - ss_res / ss_tot
+    mae = np.add.reduceat(np.abs(residual), starts) / n
+    rmse = np.sqrt(ss_res / n)
+    bias = np.add.reduceat(residual, starts) / n
+    auc = _auc(obs, pred, seg, n_segments)
+
+    # Expected calibration error: trung bình có trọng số |dự đoán TB - quan sát TB| của các bin
+    count, sum_pred, sum_obs = _calibration(obs, pred, seg, n_segments, n_bins)
+    ece = np.abs(sum_pred - sum_obs).sum(axis=1) / n
+    return np.vstack([n, r2, mae, rmse, bias, auc, ece])
+
+
+def _bootstrap_chunk(seed, n_reps):
+    """n_reps lần lấy mẫu lặp trong từng đoạn (chạy trong process riêng)"""
+    rng = np.random.default_rng(seed)
+    offsets = _STORE['offsets']
+    sizes = np.diff(offsets)
+    base = np.repeat(offsets[:-1], sizes)
+    length = np.repeat(sizes, sizes)
+    out = np.empty((n_reps, len(METRICS), len(sizes)))
+    for r in range(n_reps):
+        idx = base + (rng.random(base.size) * length).astype(np.int64)
+        out[r] = segment_metrics(_STORE['flood'][idx], _STORE['prediction'][idx], offsets)
+    return out
+
+
+def bootstrap(store, n_bootstrap=N_BOOTSTRAP, seed=SEED, max_workers=None, chunk=50):
+    """
+    Bootstrap song song: mỗi process xử lý một nhóm chunk lần lấy mẫu lặp
+
+    Returns:
+        np.ndarray (n_bootstrap, len(METRICS), số mô hình)
+    """
+    arrays = {k: store[k] for k in ('offsets', 'flood', 'prediction')}
+    counts = [min(chunk, n_bootstrap - i) for i in range(0, n_bootstrap, chunk)]
+    seeds = np.random.SeedSequence(seed).spawn(len(counts))
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(arrays,)) as executor:
+        results = list(executor.map(_bootstrap_chunk, seeds, counts))
+    return np.concatenate(results)
+
+
+def compute_metrics(store, n_bootstrap=N_BOOTSTRAP, confidence=0.95, seed=SEED, max_workers=None,
+                    n_bins=N_BINS):
+    """
+    Bảng chỉ số dạng tidy cho tất cả mô hình
+
+    Args:
+        store: Kết quả load_validation
+        n_bootstrap: Số lần bootstrap (0 = không tính khoảng tin cậy)
+        confidence: Mức tin cậy của khoảng percentile
+        max_workers: Số process cho bootstrap
+
+    Returns:
+        DataFrame: optimizer, model, metric, value, ci_low, ci_high
+    """
+    start = time.perf_counter()
+    values = segment_metrics(store['flood'], store['prediction'], store['offsets'], n_bins)
+    if n_bootstrap:
+        samples = bootstrap(store, n_bootstrap, seed, max_workers)
+        alpha = (1 - confidence) / 2 * 100
+        low, high = np.nanpercentile(samples, [alpha, 100 - alpha], axis=0)
+    else:
+        low = high = np.full_like(values, np.nan)
+
+    rows = []
+    for j, (opt, model) in enumerate(store['keys']):
+        for i, metric in enumerate(METRICS):
+            rows.append({
+                'optimizer': opt,
+                'model': model,
+                'metric': metric,
+                'value': values[i, j],
+                'ci_low': np.nan if metric == 'n' else low[i, j],
+                'ci_high': np.nan if metric == 'n' else high[i, j],
+            })
+    print(f"✓ Tính chỉ số cho {len(store['keys'])} mô hình ({n_bootstrap} lần bootstrap): "
+          f"{time.perf_counter() - start:.1f}s")
+    return pd.DataFrame(rows)
+
+
+def calibration_table(store, n_bins=N_BINS):
+    """
+    Bảng calibration (reliability diagram) cho tất cả mô hình
+
+    Returns:
+        DataFrame: optimizer, model, bin, bin_low, bin_high, n, mean_prediction, observed
+    """
+    offsets = store['offsets']
+    n_segments = len(offsets) - 1
+    count, sum_pred, sum_obs = _calibration(store['flood'], store['prediction'], _segment_ids(offsets),
+                                            n_segments, n_bins)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_pred, observed = sum_pred / count, sum_obs / count
+    rows = []
+    for j, (opt, model) in enumerate(store['keys']):
+        for b in range(n_bins):
+            rows.append({
+                'optimizer': opt, 'model': model, 'bin': b,
+                'bin_low': b / n_bins, 'bin_high': (b + 1) / n_bins,
+                'n': int(count[j, b]), 'mean_prediction': mean_pred[j, b], 'observed': observed[j, b],
+            })
+    return pd.DataFrame(rows)
+
+
+def print_summary(metrics):
+    """In bảng R², MAE, RMSE, bias, AUC (kèm khoảng tin cậy) theo mô hình"""
+    print(f"\n{'='*60}")
+    print("CHỈ SỐ KIỂM ĐỊNH")
+    print(f"{'='*60}")
+    for (opt, model), group in metrics.groupby(['optimizer', 'model'], sort=False):
+        values = group.set_index('metric')
+        print(f"\n{opt.upper()} + {model} ({int(values.loc['n', 'value']):,} điểm)")
+        for metric in METRICS[1:]:
+            v, lo, hi = values.loc[metric, ['value', 'ci_low', 'ci_high']]
+            ci = f"  [{lo:.4f}, {hi:.4f}]" if np.isfinite(lo) else ''
+            print(f"  {metric.upper():5s}: {v:.4f}{ci}")
+
+
+if __name__ == "__main__":
+    input_dir = r"D:\prj\results\validate"
+    output_dir = r"D:\prj\results\metrics"
+    os.makedirs(output_dir, exist_ok=True)
+
+    store = load_validation(input_dir)
+    metrics = compute_metrics(store)
+    print_summary(metrics)
+    metrics.to_csv(os.path.join(output_dir, 'validation_metrics.csv'), index=False)
+    calibration_table(store).to_csv(os.path.join(output_dir, 'calibration_bins.csv'), index=False)
+    print(f"\n✓ Đã lưu kết quả vào: {output_dir}")